@@ -3,13 +3,21 @@
 import streamlit as st # Streamlit is the framework we use to easily build the web interface
 from dotenv import load_dotenv # Used to load secret keys from a hidden '.env' file safely
 import os # Helps interact with the computer's operating system (like checking files)
+import shutil # Copies uploaded files to disk in small pieces
+import threading # Lets us load the embedding model in the background while the page renders
+import uuid # Gives every chat session its own conversation ID
 
 # This line officially loads the variables from the .env file so we can read them
 load_dotenv()
 
 from langchain_core.messages import HumanMessage # Represents a message typed by the user
-from src.graph.workflow import create_workflow # Imports our custom AI thinking process
-from src.rag.ingest import ingest_documents # Imports our function to read and understand PDFs
+from src.graph.workflow import conversation_config, create_workflow, preload, stream_events # Imports our custom AI thinking process
+from src.graph.checkpointer import get_checkpointer # Saves each conversation on disk, so only the new question is sent
+from src.agents.router import get_routing_stats # Counts how often the fast local router decided
+from src.utils import telemetry # Times every step of an answer (nodes, tools, LLM calls, retrieval)
+from src.rag.jobs import get_ingest_jobs # Background queue that indexes uploaded PDFs
+from src.rag.namespaces import SESSION_NAMESPACES, data_dir # Sessions can keep their own documents
+from src.rag.resources import NAMESPACE_PATTERN
     
 # --- 2. SETTING UP THE WEB PAGE VISUALS ---
 from PIL import Image
@@ -19,6 +27,25 @@ robo_icon = Image.open("IRA_pic.png")
 # Configure the page title and icon
 st.set_page_config(page_title="Intelligent Research Assistant", page_icon=robo_icon)
 
+# Load the embedding model, the AI model libraries and the vector database once per server process, in the
+# background, so the page shows right away and the first question doesn't have to wait for them.
+# 'cache_resource' makes sure this runs only once.
+@st.cache_resource
+def start_warm_up():
+    thread = threading.Thread(target=preload, daemon=True)
+    thread.start()
+    return thread
+
+start_warm_up()
+
+# Optionally serve Prometheus metrics (latency per step, tokens, cache hits) on another port
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get("IRA_METRICS_PORT")
+    return telemetry.start_metrics_server(int(port)) if port else None
+
+start_metrics_server()
+
 # Display the main large title on the screen
 st.title("🤖 Intelligent Research Assistant")
 st.markdown("Ask questions about your documents (RAG) or search the web for real-time information. A **Supervisor Agent** will route your request automatically.")
@@ -80,6 +107,20 @@ Overrides the .env key"""
     # --- 4. DOCUMENT UPLOAD LOGIC ---
     st.header("Document Management")
     st.markdown("Upload a PDF to add it to your research database. (Max 2 uploads, 200MB limit)")
+
+    # By default every session uses the shared collection (the one `python -m src.rag.ingest` fills).
+    # With IRA_SESSION_NAMESPACES=1 each session gets its own namespace: its uploads go into its own
+    # collection and questions search only that one. The namespace is kept in the page URL (?ns=...), so
+    # reloading the page keeps the uploads. Namespaces nobody used for a while are deleted.
+    if "namespace" not in st.session_state:
+        st.session_state.namespace = None
+        if SESSION_NAMESPACES:
+            namespace = st.query_params.get("ns")
+            if not (namespace and NAMESPACE_PATTERN.fullmatch(namespace)):
+                namespace = uuid.uuid4().hex
+                st.query_params["ns"] = namespace
+            st.session_state.namespace = namespace
+    upload_dir = data_dir(st.session_state.namespace)
     
     # 'session_state' is Streamlit's way of remembering things across page reloads.
     # Here we remember how many files the user has uploaded so far.
@@ -94,61 +135,106 @@ Overrides the .env key"""
         # Show a file upload box specifically for PDFs
         uploaded_file = st.file_uploader(f"Upload a new PDF ({st.session_state.upload_count}/2 used)", type="pdf")
     
-    # If the user successfully selected a file...
-    if uploaded_file is not None:
+    # If the user successfully selected a file (and we haven't saved this one yet - the page re-runs
+    # often, and the background job deletes the saved copy once it is indexed)...
+    if uploaded_file is not None and st.session_state.get("saved_upload") != uploaded_file.file_id:
         file_size_bytes = uploaded_file.size
         if file_size_bytes > 200 * 1024 * 1024:
             st.error("File exceeds the 200MB limit. Please upload a smaller file.")
         else:
-            os.makedirs("data", exist_ok=True)
-            save_path = os.path.join("data", uploaded_file.name)
+            os.makedirs(upload_dir, exist_ok=True)
+            save_path = os.path.join(upload_dir, uploaded_file.name)
             
+            # Copy the upload to disk 1 MB at a time instead of handing over the whole buffer at once
+            uploaded_file.seek(0)
             with open(save_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+                shutil.copyfileobj(uploaded_file, f, length=1024 * 1024)
             
             file_size = os.path.getsize(save_path)
             if file_size > 0:
                 st.success(f"Saved {uploaded_file.name} to disk! ({file_size / (1024*1024):.1f} MB)")
                 st.session_state.upload_count += 1
+                st.session_state.saved_upload = uploaded_file.file_id
             else:
                 st.error("File saved but it is empty! Something went wrong.")
             
     # --- 5. PROCESSING (INGESTING) THE PDF ---
+    # Ingesting runs as a background job, so you can keep chatting while your documents are indexed.
+    # Jobs are remembered on disk: a job still waiting when the app restarts is picked up again.
+    jobs = get_ingest_jobs()
+    if "ingest_jobs" not in st.session_state:
+        st.session_state.ingest_jobs = []
+
     # When the user clicks the "Ingest Document" button:
     if st.button("Ingest Document"):
-        # First check: Did they actually upload something into the 'data' folder yet?
-        if not os.path.exists("data") or not any(f.endswith('.pdf') for f in os.listdir("data")):
+        # Uploaded PDFs that no other job is already working on
+        active = jobs.active_files(st.session_state.namespace)
+        waiting = [] if not os.path.exists(upload_dir) else [
+            f for f in os.listdir(upload_dir) if f.lower().endswith(".pdf") and f not in active
+        ]
+        # First check: Did they actually upload something into the upload folder yet?
+        if not waiting:
             st.warning("⚠️ Please upload a PDF file using the box above FIRST, before clicking Ingest!")
         else:
-            # Show a spinning loading icon while the computer reads the file
-            with st.spinner("Processing into Vector DB... (This can take 1-2 mins to download the embeddings model the first time)"):
-                # Call our specialized function that turns the PDF into searchable math numbers (vectors)
-                result = ingest_documents()
-                
-                # If successful...
-                if result is not None:
-                    st.success("Documents Ingested Successfully! You can now ask questions.")
-                    
-                    # Cleanup: Delete the PDF from the 'data' folder to save computer space
-                    try:
-                        for filename in os.listdir("data"):
-                            file_path = os.path.join("data", filename)
-                            if os.path.isfile(file_path):
-                                os.remove(file_path)
-                        st.info("🧹 Cleared uploaded files from disk to save space.")
-                    except Exception as e:
-                        print(f"Failed to clear data folder: {e}")
-                else:
-                    st.warning("No documents found to ingest.")
+            # Only new or changed pages get embedded, and the uploads are deleted from disk once they
+            # are safely stored (see src/rag/jobs.py)
+            st.session_state.ingest_jobs.append(jobs.submit(waiting, namespace=st.session_state.namespace))
+            st.toast("Started indexing your document. You can keep asking questions meanwhile.")
+
+    # A small status box per job, refreshed every second while something is still running
+    session_jobs = [job for job in (jobs.get(job_id) for job_id in st.session_state.ingest_jobs) if job]
+    any_active = any(job["status"] in ("queued", "running") for job in session_jobs)
+
+    @st.fragment(run_every=1 if any_active else None)
+    def show_ingest_jobs():
+        still_active = False
+        for job_id in st.session_state.ingest_jobs:
+            job = jobs.get(job_id)
+            if job is None:
+                continue
+            names = ", ".join(job["files"])
+            progress = job["progress"]
+            if job["status"] == "queued":
+                still_active = True
+                st.caption(f"⏳ Waiting to index {names}...")
+            elif job["status"] == "running":
+                still_active = True
+                parsed, total = progress.get("pages_parsed", 0), progress.get("pages_total") or 0
+                st.progress(min(1.0, parsed / total) if total else 0.0,
+                            text=f"Indexing {names}: {parsed}/{total} pages read, {progress.get('chunks_embedded', 0)} chunks stored")
+            elif job["status"] == "done":
+                st.success(f"{names} ingested successfully! You can now ask questions about it.")
+            elif job["status"] == "cancelled":
+                st.info(f"Indexing of {names} was cancelled.")
+            else:
+                st.error(f"Indexing {names} failed: {job['error']}")
+            if job["status"] in ("queued", "running") and st.button("Cancel", key=f"cancel_{job_id}"):
+                jobs.cancel(job_id)
+        # Everything finished: one full rerun stops the automatic refresh
+        if any_active and not still_active:
+            st.rerun()
+
+    show_ingest_jobs()
+
+    # Shows how many questions were routed without asking the LLM supervisor (useful for tuning the router)
+    with st.expander("📊 Routing stats", expanded=False):
+        st.json(get_routing_stats())
+
+    # Shows where the time of every answer went, under the answer
+    show_timings = st.toggle("⏱️ Show timing breakdown", value=False)
 
 # --- 6. CHAT HISTORY AND SYSTEM MEMORY ---
 # Prepare the app to remember the continuing conversation and AI setup
+# The messages here are only for showing the chat on screen; the conversation the AI sees is stored
+# by the graph's checkpointer under this session's thread ID (older parts of it get summarized)
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = uuid.uuid4().hex
 if "question_count" not in st.session_state:
     st.session_state.question_count = 0
 if "graph_app" not in st.session_state:
-    st.session_state.graph_app = create_workflow()
+    st.session_state.graph_app = create_workflow(checkpointer=get_checkpointer())
 
 for message in st.session_state.messages:
     role = "user" if isinstance(message, HumanMessage) else "assistant"
@@ -161,6 +247,16 @@ if not user_gemini_key and not user_openai_key:
         st.warning("🛑 You have reached the free limit of 5 questions. Please enter your own API Key in the sidebar to continue.")
         is_rate_limited = True
 
+# What the small progress line under the answer says after each step finishes
+NODE_PROGRESS = {
+    "memory": "Recalled the conversation, routing your question...",
+    "supervisor": "Routed your question, preparing the answer...",
+    "tools": "Searching the web / reading pages...",
+    "document_agent": "Answer ready.",
+    "researcher_agent": "Answer ready.",
+    "merge": "Combined the answers from your documents and the web.",
+}
+
 # --- 7. HANDLING USER QUESTIONS ---
 # This shows the text box at the bottom. If the user types a prompt and hits enter...
 if prompt := st.chat_input("Ask a question (e.g., 'What is in my document?' or 'What is the news today?'):", disabled=is_rate_limited):
@@ -176,28 +272,58 @@ if prompt := st.chat_input("Ask a question (e.g., 'What is in my document?' or '
 
     # Now it's the AI's turn to respond...
     with st.chat_message("assistant"):
-        with st.spinner("Thinking (Routing via LangGraph)..."):
-            # We bundle up everything the AI needs to know to answer the question
-            inputs = {
-                "messages": st.session_state.messages,
-                "model_choice": selected_model,
-                "gemini_key": gemini_key, # Sending the keys over
-                "openai_key": openai_key
-            }
-            
-            try:
-                # We send the inputs to our 'graph_app' (the brain that routes to Researcher or Document Reader)
-                # 'invoke' means "run it now"
-                final_state = st.session_state.graph_app.invoke(inputs)
-                
-                # The AI's final answer will be the very last message in the returned list
-                ai_response = final_state["messages"][-1]
-                
-                # Print the AI's answer nicely on screen
-                st.markdown(ai_response.content)
+        # We only send the new question: the rest of the conversation is already saved under our thread ID.
+        # The keys go in the run config, so they are never written into the saved conversation
+        inputs = {
+            "messages": [user_msg],
+            "model_choice": selected_model,
+        }
+        config = conversation_config(st.session_state.thread_id, gemini_key=gemini_key, openai_key=openai_key,
+                                     namespace=st.session_state.namespace)
+
+        # Two empty spots we keep overwriting: a small progress line and the answer itself
+        progress_line = st.empty()
+        answer_box = st.empty()
+        progress_line.caption("Thinking (Routing via LangGraph)...")
+
+        try:
+            # We send the inputs to our 'graph_app' (the brain that routes to Researcher or Document Reader)
+            # and 'stream' the answer: each word is shown as soon as the AI writes it,
+            # instead of waiting for the whole answer to be finished
+            streamed_text = ""
+            ai_response = None
+            with telemetry.trace("chat", model=selected_model) as request_trace:
+                for kind, value in stream_events(st.session_state.graph_app, inputs, config):
+                    if kind == "node":
+                        progress_line.caption(NODE_PROGRESS.get(value, "Thinking..."))
+                    elif kind == "token":
+                        streamed_text += value
+                        answer_box.markdown(streamed_text + "▌")
+                    elif kind == "final":
+                        ai_response = value
+
+            progress_line.empty()
+            if ai_response is None:
+                st.error("The assistant didn't return an answer. Please try again.")
+            else:
+                # Print the AI's complete answer nicely on screen
+                answer_box.markdown(ai_response.content)
                 # Save the AI's answer into memory so it remembers for next time
                 st.session_state.messages.append(ai_response)
-                
-            except Exception as e:
-                # If anything fails (like a bad API key), show an error safely
-                st.error(f"An error occurred: {e}")
+
+            if show_timings:
+                with st.expander(f"⏱️ {request_trace.duration:.2f}s - timing breakdown", expanded=False):
+                    st.dataframe(
+                        [{"step": span["name"], "kind": span["kind"], "starts at (ms)": span["start_ms"],
+                          "took (ms)": span["duration_ms"],
+                          "tokens in/out": f"{span['input_tokens']}/{span['output_tokens']}" if "input_tokens" in span else ""}
+                         for span in request_trace.breakdown()],
+                        hide_index=True,
+                    )
+                    if request_trace.cache:
+                        st.caption("Cache lookups: " + ", ".join(f"{name} x{count}" for name, count in sorted(request_trace.cache.items())))
+
+        except Exception as e:
+            # If anything fails (like a bad API key), show an error safely
+            progress_line.empty()
+            st.error(f"An error occurred: {e}")
@@ -0,0 +1,165 @@
+"""
+Load test for the HTTP API (src/api/server.py), fully offline: the API runs in this process under
+uvicorn with the fake model, fake search and local web server from benchmarks/stand_ins.py, and many
+clients send questions at the same time. Each worker count in --workers gets its own run, so the
+one-question-at-a-time setup (1 worker, like a Streamlit session) can be compared with a pool.
+
+Reports answers per second, p50/p95 latency (and time to first token with --stream), and how many
+requests were turned away with 429 / 503 when more arrive than the workers and waiting line hold.
+
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --workers 1 8 --concurrency 32 --requests 96 --stream
+    python -m benchmarks.bench_api --workers 2 --queue 2 --concurrency 16     # see backpressure kick in
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.bench_suite import QUESTIONS, percentile, run_ingestion
+from benchmarks.local_server import LocalWebServer
+from benchmarks.stand_ins import FAKE_MODEL_CHOICE, install
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class BackgroundServer:
+    """Runs an ASGI app under uvicorn on a background thread of this process."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def ask(client, base_url, question, stream):
+    """Sends one question; returns (status, seconds, seconds to first token or None)."""
+    body = {"question": question, "model_choice": FAKE_MODEL_CHOICE, "stream": stream}
+    t0 = time.perf_counter()
+    if not stream:
+        response = await client.post(f"{base_url}/chat", json=body)
+        return response.status_code, time.perf_counter() - t0, None
+    first = None
+    async with client.stream("POST", f"{base_url}/chat", json=body) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return response.status_code, time.perf_counter() - t0, None
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "token" and first is None:
+                    first = time.perf_counter() - t0
+                elif event == "error":
+                    return 500, time.perf_counter() - t0, first
+    return 200, time.perf_counter() - t0, first
+
+
+async def load(base_url, server_url, requests, concurrency, stream):
+    gate = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        response = await client.post(f"{base_url}/warmup")
+        response.raise_for_status()
+
+        async def one(i):
+            question = QUESTIONS[i % len(QUESTIONS)].format(server=server_url) + f" (request {i})"
+            async with gate:
+                return await ask(client, base_url, question, stream)
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - t0
+        health = (await client.get(f"{base_url}/health")).json()
+    return results, wall, health
+
+
+def report(workers, results, wall):
+    answered = [r for r in results if r[0] == 200]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    line = {"workers": workers, "answers_per_s": round(len(answered) / wall, 2), "statuses": statuses}
+    if answered:
+        latencies = [seconds for _, seconds, _ in answered]
+        line["p50_ms"] = round(percentile(latencies, 0.5) * 1e3, 1)
+        line["p95_ms"] = round(percentile(latencies, 0.95) * 1e3, 1)
+        first = [f for _, _, f in answered if f is not None]
+        if first:
+            line["first_token_p50_ms"] = round(percentile(first, 0.5) * 1e3, 1)
+            line["first_token_p95_ms"] = round(percentile(first, 0.95) * 1e3, 1)
+    print(json.dumps(line))
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="worker pool sizes to compare")
+    parser.add_argument("--queue", type=int, default=64, help="requests allowed to wait for a worker")
+    parser.add_argument("--queue-timeout", type=float, default=60.0)
+    parser.add_argument("--requests", type=int, default=48)
+    parser.add_argument("--concurrency", type=int, default=16, help="clients sending at the same time")
+    parser.add_argument("--stream", action="store_true", help="use server-sent events and measure time to first token")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake model's time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="fake model's time per token (s)")
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--web-latency", type=float, default=0.05, help="local web server delay per page (s)")
+    parser.add_argument("--pdfs", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic PDF")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hash-based embeddings instead of the real model")
+    args = parser.parse_args()
+
+    # Everything the app writes (data/, chroma_db/, .cache/) goes to a throwaway directory
+    workdir = tempfile.mkdtemp(prefix="ira-bench-api-")
+    os.chdir(workdir)
+
+    from src.api.server import ResearchAPI
+    from src.rag import resources
+    from src.utils.response_cache import NAMESPACE_SETTINGS, ResponseCache, set_response_cache
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        resources._embeddings = DeterministicFakeEmbedding(size=384)
+    # Every request should run the graph, not come from the answer cache
+    set_response_cache(ResponseCache(settings={ns: {"ttl": 0, "similarity": None} for ns in NAMESPACE_SETTINGS}))
+
+    with LocalWebServer(delay=args.web_latency) as web:
+        install(web, first_token_latency=args.llm_latency, token_latency=args.token_latency, search_latency=args.search_latency)
+        run_ingestion(args.pdfs, args.pages)
+        print(f"{args.requests} requests, {args.concurrency} at a time, {'streaming' if args.stream else 'JSON'}; work dir {workdir}")
+        lines = []
+        for workers in args.workers:
+            api = ResearchAPI(workers=workers, max_queued=args.queue, queue_timeout=args.queue_timeout, warm_up_on_start=False)
+            with BackgroundServer(api) as base_url:
+                results, wall, _ = asyncio.run(load(base_url, web.url("").rstrip("/"), args.requests, args.concurrency, args.stream))
+            lines.append(report(workers, results, wall))
+
+    if len(lines) > 1 and lines[0]["answers_per_s"]:
+        best = max(lines, key=lambda line: line["answers_per_s"])
+        print(f"{best['workers']} workers: {best['answers_per_s'] / lines[0]['answers_per_s']:.1f}x the answers per second of {lines[0]['workers']}")
+
+
+if __name__ == "__main__":
+    main()
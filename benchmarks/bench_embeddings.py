@@ -0,0 +1,123 @@
+"""
+Compares the embedding backends (src/rag/embeddings.py) on the fixture corpus from bench_rerank:
+  - throughput: chunks per second for ingestion-sized batches, and per-question latency,
+  - retrieval quality: recall@k and MRR of plain vector search over the corpus,
+  - agreement of int8 with full precision: mean cosine between their vectors of the same text,
+    and how many of the top k results are the same,
+  - the persistent embedding cache: a first (cold) and a repeated (warm) ingest of the same corpus.
+
+It runs the real embedding model (downloaded the first time); --model takes any sentence-transformers
+model name or local directory.
+
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --parts 400 --k 5 --threads 4
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_rerank import fixture_corpus
+from src.rag.embeddings import EMBEDDING_BACKENDS, CachedEmbeddings, load_model
+from src.rag.resources import EMBEDDING_MODEL
+
+
+def rank(corpus_vectors, query_vectors, k):
+    """Indices of the k nearest corpus vectors for every query (the vectors are normalized)."""
+    scores = query_vectors @ corpus_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_backend(model_name, backend, texts, questions, answer_rows, k, batch_size):
+    t0 = time.perf_counter()
+    model = load_model(model_name, backend)
+    load_seconds = time.perf_counter() - t0
+    model.embed_documents(texts[:8])  # the first call pays for setting things up
+
+    t0 = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(model.embed_documents(texts[start:start + batch_size]))
+    embed_seconds = time.perf_counter() - t0
+
+    latencies, query_vectors = [], []
+    for question in questions:
+        t0 = time.perf_counter()
+        query_vectors.append(model.embed_query(question))
+        latencies.append(time.perf_counter() - t0)
+
+    corpus = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    top = rank(corpus, queries, k)
+    hits = [row in list(found) for row, found in zip(answer_rows, top)]
+    reciprocal_ranks = [1.0 / (list(found).index(row) + 1) if row in list(found) else 0.0 for row, found in zip(answer_rows, top)]
+    latencies.sort()
+    report = {
+        "backend": backend,
+        "load_s": round(load_seconds, 2),
+        "chunks_per_s": round(len(texts) / embed_seconds, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2] * 1e3, 2),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1e3, 2),
+        f"recall@{k}": round(sum(hits) / len(hits), 3),
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+    }
+    return report, model, corpus, top
+
+
+def run_cache(model, model_key, texts, batch_size):
+    """Ingests the corpus twice through a fresh cache; returns chunks per second for both passes."""
+    path = os.path.join(tempfile.mkdtemp(prefix="ira-bench-embeddings-"), "embeddings.sqlite")
+    cached = CachedEmbeddings(model, model_key, path=path)
+    result = {"distinct_texts": len(set(texts)), "texts": len(texts)}
+    for attempt in ("cold", "warm"):
+        t0 = time.perf_counter()
+        for start in range(0, len(texts), batch_size):
+            cached.embed_documents(texts[start:start + batch_size])
+        result[f"{attempt}_chunks_per_s"] = round(len(texts) / (time.perf_counter() - t0), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--parts", type=int, default=120)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding call, like an ingestion batch")
+    parser.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    docs, questions = fixture_corpus(args.parts)
+    texts = [doc.page_content for doc in docs]
+    row_of = {doc.metadata["chunk_id"]: i for i, doc in enumerate(docs)}
+    question_texts = [text for text, _ in questions]
+    answer_rows = [row_of[answer_id] for _, answer_id in questions]
+    print(f"{len(texts)} chunks, {len(questions)} questions, model {args.model}")
+
+    # backend -> (report, model, corpus vectors, top k per question); "torch" is the baseline
+    results = {}
+    for backend in EMBEDDING_BACKENDS:
+        report, model, corpus, top = run_backend(args.model, backend, texts, question_texts, answer_rows, args.k, args.batch_size)
+        if backend != "torch":
+            base_report, _, base_corpus, base_top = results["torch"]
+            report["cosine_to_torch"] = round(float(np.mean(np.sum(corpus * base_corpus, axis=1))), 4)
+            report[f"top{args.k}_overlap"] = round(float(np.mean(
+                [len(set(a) & set(b)) / args.k for a, b in zip(top, base_top)])), 3)
+            report["speed_up"] = round(report["chunks_per_s"] / base_report["chunks_per_s"], 2)
+        results[backend] = (report, model, corpus, top)
+        print(json.dumps(report))
+
+    cache = run_cache(results["torch"][1], f"{args.model}@torch", texts, args.batch_size)
+    cache["speed_up"] = round(cache["warm_chunks_per_s"] / cache["cold_chunks_per_s"], 1)
+    print(json.dumps({"embedding_cache": cache}))
+
+
+if __name__ == "__main__":
+    main()
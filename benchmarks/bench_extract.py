@@ -0,0 +1,138 @@
+"""
+Compares the lxml extraction engine used by scrape_website with the extraction it replaced
+(a full BeautifulSoup html.parser tree plus string splitting, cut to 8000 characters afterwards)
+over a corpus of saved HTML pages, and shows what the byte cap saves when downloading a large page.
+
+With no --corpus a mixed corpus is generated: short, long and huge articles, link-heavy portal pages
+and pages padded with inline scripts.
+
+    python -m benchmarks.bench_extract
+    python -m benchmarks.bench_extract --corpus saved_pages/ --repeat 5
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.local_server import LocalWebServer, article_html
+from src.utils.html_extract import extract_text
+from src.utils.http_fetch import AsyncFetcher
+
+TEXT_LIMIT = 8000
+# Text that only appears in navigation / sidebars / footers of the generated pages
+BOILERPLATE_MARKERS = ["Related 1", "Copyright - Privacy", "window.analytics", "Sign up for our newsletter"]
+
+
+def legacy_extract(content, limit=TEXT_LIMIT):
+    """The extraction scrape_website used before: everything through html.parser, then trimmed."""
+    soup = BeautifulSoup(content, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.extract()
+    text = soup.get_text(separator=' ')
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = '\n'.join(chunk for chunk in chunks if chunk)
+    return text[:limit]
+
+
+def portal_html(number, links=600):
+    items = "\n".join(f'<li class="menu-item"><a href="/topic/{i}">Topic {i}</a></li>' for i in range(links))
+    return f"""<html><head><title>Portal {number}</title></head><body>
+<div id="top-menu"><ul>{items}</ul></div>
+<div class="newsletter">Sign up for our newsletter</div>
+<div class="content">{''.join(f'<p>Story {i} on portal {number}: a short teaser about retrieval.</p>' for i in range(40))}</div>
+<footer>Copyright - Privacy - Terms</footer></body></html>"""
+
+
+def script_heavy_html(number, script_kb=400):
+    blob = "var x = " + "1234567890" * (script_kb * 100) + ";"
+    return article_html(number, paragraphs=60).replace("</head>", f"<script>{blob}</script></head>")
+
+
+def generate_corpus(directory):
+    pages = {}
+    for i in range(5):
+        pages[f"article_short_{i}.html"] = article_html(i, paragraphs=15)
+        pages[f"article_long_{i}.html"] = article_html(i, paragraphs=3000)
+        pages[f"portal_{i}.html"] = portal_html(i)
+        pages[f"script_heavy_{i}.html"] = script_heavy_html(i)
+    # Bigger than the default byte cap, to show what the cap saves
+    pages["article_huge.html"] = article_html(99, paragraphs=25000)
+    for name, html in pages.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(html)
+
+
+def time_engine(engine, documents, repeat):
+    per_page, outputs = [], []
+    for content in documents:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            text = engine(content, TEXT_LIMIT)
+            best = min(best, time.perf_counter() - t0)
+        per_page.append(best)
+        outputs.append(text)
+    leaks = sum(any(marker in text for marker in BOILERPLATE_MARKERS) for text in outputs)
+    return per_page, outputs, leaks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of saved .html files (default: generate one)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page, the fastest one counts")
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = tmp
+            generate_corpus(corpus)
+        paths = sorted(glob.glob(os.path.join(corpus, "*.htm*")))
+        if not paths:
+            print(f"no .html files in {corpus}")
+            return 1
+        documents = []
+        for path in paths:
+            with open(path, "rb") as f:
+                documents.append(f.read())
+
+        legacy_times, _, legacy_leaks = time_engine(legacy_extract, documents, args.repeat)
+        new_times, new_texts, new_leaks = time_engine(extract_text, documents, args.repeat)
+
+        print(f"{len(documents)} pages, {sum(map(len, documents)) / 1e6:.1f} MB of HTML")
+        print(f"  {'engine':<22}{'total':>9}{'p50':>10}{'max':>10}  pages with boilerplate")
+        for name, times, leaks in (("legacy html.parser", legacy_times, legacy_leaks), ("lxml extract_text", new_times, new_leaks)):
+            print(f"  {name:<22}{sum(times):8.3f}s{statistics.median(times) * 1e3:8.1f}ms{max(times) * 1e3:8.1f}ms  {leaks}/{len(documents)}")
+        print(f"  speed-up: {sum(legacy_times) / sum(new_times):.1f}x, "
+              f"{sum(1 for t in new_texts if t)}/{len(new_texts)} pages produced text")
+
+        # The byte cap: the biggest page served over HTTP, with and without max_bytes
+        biggest = max(paths, key=os.path.getsize)
+        with LocalWebServer(html_dir=corpus) as server:
+            url = server.url("/file/" + os.path.basename(biggest))
+            fetcher = AsyncFetcher()
+            t0 = time.perf_counter()
+            full = fetcher.fetch(url)
+            full_time = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            capped = fetcher.fetch(url, max_bytes=args.max_bytes)
+            capped_time = time.perf_counter() - t0
+            fetcher.close()
+        print(f"  largest page {os.path.basename(biggest)}: full download {len(full.content) / 1e6:.1f} MB in {full_time:.3f}s, "
+              f"capped {len(capped.content) / 1e6:.1f} MB in {capped_time:.3f}s (truncated={capped.truncated})")
+
+    if sum(new_times) > sum(legacy_times):
+        print("FAIL: the new engine was slower than the legacy extraction")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
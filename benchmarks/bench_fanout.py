@@ -0,0 +1,104 @@
+"""
+Fan-out benchmark, fully offline (fake model, fake search and local web server from benchmarks/stand_ins.py):
+a question that needs both the uploaded documents and the web ("compare my document with the latest
+news...") is answered in one turn, with both workers running in parallel and a merge step, and compared
+with what it took before - asking the document question and the web question as two separate turns.
+
+Reports p50/p95 end to end for the fan-out, for each single worker and for the two turns together.
+The fan-out should take about the slower worker plus the merge, not the sum of both.
+
+    python -m benchmarks.bench_fanout --fake-embeddings
+    python -m benchmarks.bench_fanout --runs 10 --search-latency 1.0
+    python -m benchmarks.bench_fanout --deadline 1.0      # the web worker misses its deadline and is left out
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.bench_suite import percentile, run_ingestion
+from benchmarks.local_server import LocalWebServer
+from benchmarks.stand_ins import FAKE_MODEL_CHOICE, install
+
+MIXED_QUESTION = "Compare what my document says about retrieval latency with the latest news on it (run {run})"
+DOCUMENT_QUESTION = "What does my document say about retrieval latency? (run {run})"
+WEB_QUESTION = "What is the latest news on retrieval latency? (run {run})"
+
+
+def ask(app, question):
+    """Runs one question through the graph; returns (seconds, nodes that ran, answer text)."""
+    from src.graph.workflow import stream_events
+
+    nodes, answer = [], None
+    t0 = time.perf_counter()
+    for kind, value in stream_events(app, {"messages": [HumanMessage(content=question)], "model_choice": FAKE_MODEL_CHOICE}):
+        if kind == "node":
+            nodes.append(value)
+        elif kind == "final":
+            answer = value.content if value is not None else None
+    return time.perf_counter() - t0, nodes, answer
+
+
+def summary(name, seconds):
+    return {"case": name, "p50_ms": round(percentile(seconds, 0.5) * 1e3, 1), "p95_ms": round(percentile(seconds, 0.95) * 1e3, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--deadline", type=float, help="seconds each worker gets in a fan-out (default: IRA_BRANCH_DEADLINE)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake model's time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="fake model's time per token (s)")
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--web-latency", type=float, default=0.05, help="local web server delay per page (s)")
+    parser.add_argument("--pdfs", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic PDF")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hash-based embeddings instead of the real model")
+    args = parser.parse_args()
+
+    # Everything the app writes (data/, chroma_db/, .cache/) goes to a throwaway directory
+    workdir = tempfile.mkdtemp(prefix="ira-bench-fanout-")
+    os.chdir(workdir)
+
+    from src.graph import workflow
+    from src.rag import resources
+    from src.utils.response_cache import NAMESPACE_SETTINGS, ResponseCache, set_response_cache
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        resources._embeddings = DeterministicFakeEmbedding(size=384)
+    # Every question should run the workers, not come from the answer cache
+    set_response_cache(ResponseCache(settings={ns: {"ttl": 0, "similarity": None} for ns in NAMESPACE_SETTINGS}))
+    if args.deadline is not None:
+        workflow.BRANCH_DEADLINE = args.deadline
+
+    with LocalWebServer(delay=args.web_latency) as web:
+        install(web, first_token_latency=args.llm_latency, token_latency=args.token_latency, search_latency=args.search_latency)
+        run_ingestion(args.pdfs, args.pages)
+        app = workflow.create_workflow()
+        # One question first, so loading the vector store doesn't count against either side
+        ask(app, DOCUMENT_QUESTION.format(run="warm-up"))
+
+        fan_out, document, web_only, two_turns = [], [], [], []
+        for run in range(args.runs):
+            seconds, nodes, answer = ask(app, MIXED_QUESTION.format(run=run))
+            if "merge" not in nodes:
+                raise SystemExit(f"The mixed question was not fanned out (nodes: {nodes})")
+            fan_out.append(seconds)
+            document.append(ask(app, DOCUMENT_QUESTION.format(run=run))[0])
+            web_only.append(ask(app, WEB_QUESTION.format(run=run))[0])
+            two_turns.append(document[-1] + web_only[-1])
+        print(f"last fan-out answer: {answer[:160]!r}")
+
+    lines = [summary("fan-out (one turn)", fan_out), summary("document only", document),
+             summary("web only", web_only), summary("two separate turns", two_turns)]
+    for line in lines:
+        print(json.dumps(line))
+    print(f"fan-out takes {lines[0]['p50_ms'] / lines[3]['p50_ms']:.0%} of the time of two separate turns "
+          f"(deadline {workflow.BRANCH_DEADLINE:g}s); work dir {workdir}")
+
+
+if __name__ == "__main__":
+    main()
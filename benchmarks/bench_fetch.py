@@ -0,0 +1,69 @@
+"""
+Compares fetching pages one at a time with a new connection each (the old scrape_website)
+against the shared async fetcher and the scrape_websites batch tool, all against a local
+HTTP stand-in server with artificial latency.
+
+    python -m benchmarks.bench_fetch --pages 12 --delay 0.2
+"""
+import argparse
+import sys
+import time
+
+import requests
+
+from benchmarks.local_server import LocalWebServer
+from src.utils.http_fetch import AsyncFetcher, PER_HOST_LIMIT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds the server waits before each response")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_LIMIT)
+    args = parser.parse_args()
+
+    with LocalWebServer(delay=args.delay) as server:
+        urls = [server.url(f"/page/{i}") for i in range(args.pages)]
+
+        # 1. The old way: requests.get, one after another, no session
+        t0 = time.perf_counter()
+        for url in urls:
+            requests.get(url, timeout=10).raise_for_status()
+        sequential = time.perf_counter() - t0
+        connections_before = server.connections
+
+        # 2. The shared fetcher, all at once
+        fetcher = AsyncFetcher(per_host_limit=args.per_host)
+        t0 = time.perf_counter()
+        results = fetcher.fetch_many(urls)
+        batched = time.perf_counter() - t0
+        assert all(result.ok for result in results), [r.error for r in results if not r.ok]
+
+        # 3. A second batch reuses the open keep-alive connections
+        connections_mid = server.connections
+        t0 = time.perf_counter()
+        fetcher.fetch_many(urls)
+        warm = time.perf_counter() - t0
+        new_connections_warm = server.connections - connections_mid
+        fetcher.close()
+
+        # 4. The tool the agent calls, end to end (HTML to text included)
+        from src.agents.researcher import scrape_websites
+        t0 = time.perf_counter()
+        text = scrape_websites.invoke({"urls": urls})
+        tool_time = time.perf_counter() - t0
+
+    ideal = args.delay * -(-args.pages // args.per_host)
+    print(f"{args.pages} pages, {args.delay:.2f}s server delay, {args.per_host} concurrent requests per host")
+    print(f"  sequential requests.get      : {sequential:6.2f}s  ({connections_before} connections)")
+    print(f"  AsyncFetcher.fetch_many      : {batched:6.2f}s  (ideal {ideal:.2f}s)")
+    print(f"  second batch, warm pool      : {warm:6.2f}s  ({new_connections_warm} new connections)")
+    print(f"  scrape_websites tool         : {tool_time:6.2f}s  ({len(text)} characters)")
+    if batched > sequential:
+        print("FAIL: the batch fetch was not faster than sequential fetching")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+The LLM scheduler (src/utils/llm_scheduler.py) against a fake provider that throttles: the fake model
+from benchmarks/stand_ins.py serves at most --capacity calls at once and answers the rest with a 429.
+--concurrency callers send --calls streamed questions at the same time, three ways:
+  - direct: straight to the provider, no retries (a 429 is a failed answer),
+  - retry: straight to the provider, each call retrying on its own with exponential backoff like the
+    provider SDKs do (no shared limit, no jitter),
+  - scheduled: through the scheduler (adaptive concurrency limit, jittered retries, coalescing).
+Then the same with every caller asking the identical question, where the scheduler sends one call.
+
+Reports answers, failures, calls that reached the provider and how many got a 429, p50/p95 latency,
+answers per second and the scheduler's concurrency limit at the end. With --rpm the fake provider also
+gets a requests-per-minute limit, to see the token bucket hold the rate.
+
+    python -m benchmarks.bench_llm_scheduler
+    python -m benchmarks.bench_llm_scheduler --capacity 2 --concurrency 64 --calls 256
+    python -m benchmarks.bench_llm_scheduler --rpm 600
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_suite import percentile
+from benchmarks.stand_ins import FAKE_PROVIDER, FakeChatModel
+
+RETRY_BASE = 0.5
+MAX_RETRIES = 4
+
+
+def with_retries(fn):
+    """Retries fn() on 429s like the SDKs do on their own: exponential backoff, no jitter, no shared limit."""
+    from src.utils.llm_scheduler import classify
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if classify(e) is None or attempt == MAX_RETRIES:
+                raise
+            time.sleep(RETRY_BASE * 2 ** attempt)
+
+
+def run(mode, args, questions, run_id):
+    from src.utils.llm_scheduler import ScheduledChatModel, get_scheduler
+
+    fake = FakeChatModel(first_token_latency=args.first_token_latency, token_latency=args.token_latency,
+                         capacity=args.capacity)
+    # A fresh key per run, so every scheduled run starts from a fresh limiter
+    model = ScheduledChatModel(inner=fake, provider=FAKE_PROVIDER, key_id=f"bench-{run_id}") if mode == "scheduled" else fake
+
+    def ask(question):
+        t0 = time.perf_counter()
+        try:
+            answer = lambda: "".join(chunk.content for chunk in model.stream(question))
+            with_retries(answer) if mode == "retry" else answer()
+            return time.perf_counter() - t0
+        except Exception:
+            return None
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(ask, questions))
+    wall = time.perf_counter() - t0
+    latencies = [seconds for seconds in results if seconds is not None]
+    report = {
+        "mode": mode, "answers": len(latencies), "failed": len(results) - len(latencies),
+        "provider_calls": fake.calls["generate"] + fake.calls["throttled"], "throttled": fake.calls["throttled"],
+        "p50_ms": round(percentile(latencies, 0.5) * 1e3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1e3) if latencies else None,
+        "answers_per_s": round(len(latencies) / wall, 1), "wall_s": round(wall, 2),
+    }
+    if mode == "scheduled":
+        report["final_limit"] = get_scheduler().stats()[f"{FAKE_PROVIDER}/bench-{run_id}"]["limit"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=4, help="calls the fake provider serves at once")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=128)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--rpm", type=float, help="also give the fake provider this requests-per-minute limit")
+    args = parser.parse_args()
+
+    if args.rpm:
+        os.environ[f"IRA_LLM_RPM_{FAKE_PROVIDER.upper()}"] = str(args.rpm)
+    print(f"{args.calls} calls from {args.concurrency} callers, provider capacity {args.capacity}, "
+          f"first token {args.first_token_latency * 1e3:g}ms" + (f", {args.rpm:g} requests/minute" if args.rpm else ""))
+    run_id = 0
+    for label, questions in (("distinct", [f"Question number {i} about solar panels" for i in range(args.calls)]),
+                             ("identical", ["What is the latest news about solar panels?"] * args.calls)):
+        for mode in ("direct", "retry", "scheduled"):
+            run_id += 1
+            print(json.dumps({"questions": label, **run(mode, args, questions, run_id)}))
+
+
+if __name__ == "__main__":
+    main()
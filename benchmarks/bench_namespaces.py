@@ -0,0 +1,106 @@
+"""
+Per-session namespaces vs. one shared collection, as the number of sessions grows. Every session
+ingests --chunks chunks and then asks questions about its own documents:
+  - shared: all sessions' chunks in one collection (how the app used to work), so every search
+    scans everyone's chunks and has to be filtered afterwards,
+  - namespaced: one collection per session, at most IRA_MAX_OPEN_COLLECTIONS open at once; a session
+    whose collection was closed re-opens it from disk (counted in the latency).
+
+Reports search p50/p95, resident memory after the searches and how many collections ended up open.
+Vectors are synthetic (benchmarks/bench_vectorstore.py) and handed to the stores directly, so no
+embedding model runs. Each mode runs in a fresh child process; the backend is IRA_VECTOR_STORE.
+
+    python -m benchmarks.bench_namespaces
+    python -m benchmarks.bench_namespaces --sessions 20 50 100 --chunks 1000
+    IRA_VECTOR_STORE=flat python -m benchmarks.bench_namespaces
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_suite import percentile
+from benchmarks.bench_vectorstore import Precomputed, corpus
+
+BATCH_SIZE = 500
+
+
+def child(mode, sessions, chunks, queries, k):
+    # Everything the stores write goes to a throwaway directory
+    os.chdir(tempfile.mkdtemp(prefix="ira-bench-namespaces-"))
+    from src.rag import resources
+    from src.utils.memory import current_rss_mb
+
+    vectors, questions = corpus(sessions * chunks, 384, queries)
+    resources._embeddings = Precomputed(vectors)
+    namespace_of = (lambda session: f"s{session}") if mode == "namespaced" else (lambda session: None)
+
+    t0 = time.perf_counter()
+    for session in range(sessions):
+        store = resources.get_vectorstore(create=True, namespace=namespace_of(session))
+        for start in range(session * chunks, (session + 1) * chunks, BATCH_SIZE):
+            rows = range(start, min(start + BATCH_SIZE, (session + 1) * chunks))
+            store.add_texts([f"chunk {row}" for row in rows], metadatas=[{"session": session} for _ in rows],
+                            ids=[f"c{row}" for row in rows])
+    build_seconds = time.perf_counter() - t0
+    # Start the searches cold, like after a restart
+    for session in range(sessions):
+        resources.close(namespace_of(session))
+    # Searches go by vector; the stores only need some embedding object when they are re-opened
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    resources._embeddings = DeterministicFakeEmbedding(size=384)
+    del vectors
+
+    rng = random.Random(0)
+    latencies, own = [], 0
+    for question in questions:
+        session = rng.randrange(sessions)
+        t0 = time.perf_counter()
+        store = resources.get_vectorstore(namespace=namespace_of(session))
+        if mode == "namespaced":
+            docs = store.similarity_search_by_vector(question.tolist(), k=k)
+        else:
+            # One collection for everybody: search more, then keep this session's chunks
+            docs = store.similarity_search_by_vector(question.tolist(), k=k * sessions)
+            docs = [doc for doc in docs if doc.metadata["session"] == session][:k]
+        latencies.append(time.perf_counter() - t0)
+        own += sum(doc.metadata["session"] == session for doc in docs)
+    print(json.dumps({
+        "mode": mode, "sessions": sessions, "build_s": round(build_seconds, 1),
+        "search_p50_ms": round(percentile(latencies, 0.5) * 1e3, 2),
+        "search_p95_ms": round(percentile(latencies, 0.95) * 1e3, 2),
+        "rss_mb": round(current_rss_mb(), 1), "open_collections": resources.open_collections(),
+        "own_results": round(own / (k * len(latencies)), 3),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--chunks", type=int, default=500, help="chunks per session")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.sessions[0], args.chunks, args.queries, args.k)
+        return
+
+    print(f"{args.chunks} chunks per session, {args.queries} searches, top {args.k}, "
+          f"backend {os.getenv('IRA_VECTOR_STORE', 'chroma')}")
+    for sessions in args.sessions:
+        for mode in ("shared", "namespaced"):
+            cmd = [sys.executable, "-m", "benchmarks.bench_namespaces", "--child", mode, "--sessions", str(sessions),
+                   "--chunks", str(args.chunks), "--queries", str(args.queries), "--k", str(args.k)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            # The stores may print their own lines; ours is the last one
+            print(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Measures what the retrieval stages buy on a fixture corpus with known answers: recall@k, MRR and
+per-question latency for vector-only, hybrid (vector + BM25) and hybrid + cross-encoder rerank
+with different candidate pool sizes.
+
+The corpus is generated: spec sheets for many similar-looking parts ("valve XR-2041 is rated for
+...") plus near-duplicate distractors, and questions that either paraphrase the spec or quote the
+part number. It runs the real embedding model and cross-encoder (both are downloaded the first time).
+
+    python -m benchmarks.bench_rerank
+    python -m benchmarks.bench_rerank --parts 200 --k 3 --pools 10 20 40
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from src.rag.bm25 import BM25Index, BM25Writer
+from src.rag.rerank import RERANK_MODEL, Reranker, cross_encoder_scorer
+from src.rag.resources import get_embeddings
+from src.rag.retrieve import HybridRetriever
+
+FAMILIES = ["valve", "pump", "compressor", "pressure sensor", "relay", "turbine", "heat exchanger", "actuator"]
+MATERIALS = ["stainless steel", "cast iron", "bronze", "aluminium", "titanium", "PVC"]
+
+
+def fixture_corpus(parts, seed=0):
+    """Returns (documents, questions); every question is [text, ID of the chunk that answers it]."""
+    rng = random.Random(seed)
+    docs, questions = [], []
+    for i in range(parts):
+        family = FAMILIES[i % len(FAMILIES)]
+        code = f"{rng.choice('XKRTM')}{rng.choice('RQZ')}-{1000 + i}"
+        pressure = rng.randint(5, 400)
+        hours = rng.choice([250, 500, 1000, 2000, 4000])
+        material = rng.choice(MATERIALS)
+        spec_id = f"spec-{i}"
+        docs.append(Document(
+            page_content=f"The {family} {code} is rated for {pressure} bar. It must be inspected every {hours} "
+                         f"operating hours, and its housing is made of {material}.",
+            metadata={"chunk_id": spec_id, "source": "specs.pdf", "page": i},
+        ))
+        # A distractor that talks about the same family and inspections, but not about this part
+        docs.append(Document(
+            page_content=f"General guidance for every {family}: inspections are logged in the maintenance "
+                         f"system and the rated pressure is printed on the housing.",
+            metadata={"chunk_id": f"guide-{i}", "source": "guide.pdf", "page": i},
+        ))
+        questions.append([f"How often does the {family} {code} need to be inspected?", spec_id])
+        questions.append([f"{code} pressure rating", spec_id])
+    return docs, questions
+
+
+def evaluate(retriever, questions, k):
+    latencies, hits, reciprocal_ranks = [], 0, []
+    for text, answer_id in questions:
+        t0 = time.perf_counter()
+        results = retriever.invoke(text)
+        latencies.append(time.perf_counter() - t0)
+        ids = [doc.metadata.get("chunk_id") for doc in results[:k]]
+        hits += answer_id in ids
+        reciprocal_ranks.append(1.0 / (ids.index(answer_id) + 1) if answer_id in ids else 0.0)
+    latencies.sort()
+    return {
+        "recall": hits / len(questions),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parts", type=int, default=120)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--pools", type=int, nargs="+", default=[10, 20, 40], help="rerank candidate pool sizes")
+    parser.add_argument("--model", default=RERANK_MODEL)
+    args = parser.parse_args()
+
+    docs, questions = fixture_corpus(args.parts)
+    embeddings = get_embeddings()
+    vectorstore = Chroma(collection_name="bench_rerank", embedding_function=embeddings)
+    vectorstore.add_documents(docs, ids=[doc.metadata["chunk_id"] for doc in docs])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = BM25Writer(path=os.path.join(tmp, "bm25.idx"))
+        writer.add([doc.metadata["chunk_id"] for doc in docs], [doc.page_content for doc in docs])
+        writer.commit()
+        bm25_index = BM25Index.load(writer.path)
+
+        t0 = time.perf_counter()
+        scorer = cross_encoder_scorer(args.model)
+        load_s = time.perf_counter() - t0
+
+        rows = [
+            ("vector only", HybridRetriever(vectorstore=vectorstore, k=args.k)),
+            ("hybrid (vector + BM25)", HybridRetriever(vectorstore=vectorstore, bm25_index=bm25_index, k=args.k)),
+        ]
+        for pool in args.pools:
+            reranker = Reranker(scorer)
+            rows.append((f"hybrid + rerank of {pool}", HybridRetriever(
+                vectorstore=vectorstore, bm25_index=bm25_index, reranker=reranker, k=args.k, rerank_candidates=pool)))
+
+        print(f"{len(docs)} chunks, {len(questions)} questions, top {args.k}; reranker {args.model} loaded in {load_s:.1f}s")
+        print(f"  {'retriever':<32}{'recall@k':>9}{'MRR':>7}{'p50':>10}{'p95':>10}")
+        for name, retriever in rows:
+            result = evaluate(retriever, questions, args.k)
+            print(f"  {name:<32}{result['recall']:9.3f}{result['mrr']:7.3f}{result['p50_ms']:8.1f}ms{result['p95_ms']:8.1f}ms")
+
+        # Same questions again: every (question, chunk) score now comes from the cache
+        name, retriever = rows[-1]
+        result = evaluate(retriever, questions, args.k)
+        print(f"  {name + ' (cached)':<32}{result['recall']:9.3f}{result['mrr']:7.3f}{result['p50_ms']:8.1f}ms{result['p95_ms']:8.1f}ms")
+    vectorstore.delete_collection()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
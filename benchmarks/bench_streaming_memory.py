@@ -0,0 +1,105 @@
+"""
+Measures peak memory of streaming ingestion for PDFs of growing size and fails if it isn't flat.
+
+Every size runs in a fresh child process (so peak memory isn't shared between runs). The
+chunks go to a no-op writer by default so the numbers show the pipeline itself; pass --embed
+to also run the real embedding model (downloads it the first time).
+
+    python -m benchmarks.bench_streaming_memory
+    python -m benchmarks.bench_streaming_memory --pages 200 800 3200 --tolerance-mb 20 --eager
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic_pdf import write_pdf
+
+
+def child(path, mode, embed):
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from src.rag import pipeline
+    from src.utils.memory import current_rss_mb, peak_rss_mb
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    embeddings = None
+    if embed:
+        from src.rag.resources import get_embeddings
+        embeddings = get_embeddings()
+        embeddings.embed_query("warm up")
+
+    counted = {"chunks": 0}
+
+    def write_batch(chunks):
+        if embeddings is not None:
+            embeddings.embed_documents([c.page_content for c in chunks])
+        counted["chunks"] += len(chunks)
+
+    baseline = current_rss_mb()
+    if mode == "eager":
+        # What ingestion used to do: every page and every chunk in memory before anything is stored
+        pages = PyPDFLoader(path).load()
+        chunks = splitter.split_documents(pages)
+        for start in range(0, len(chunks), pipeline.EMBED_BATCH_SIZE):
+            write_batch(chunks[start:start + pipeline.EMBED_BATCH_SIZE])
+    else:
+        pipeline.run_pipeline(
+            [("bench.pdf", path)],
+            lambda name, pages, final: splitter.split_documents(pages),
+            write_batch,
+            parse_workers=1,
+            page_window=8,
+            batch_size=64,
+        )
+    print(json.dumps({"baseline_mb": baseline, "peak_mb": peak_rss_mb(), "chunks": counted["chunks"]}))
+
+
+def measure(path, mode, embed):
+    cmd = [sys.executable, "-m", "benchmarks.bench_streaming_memory", "--child", path, "--mode", mode]
+    if embed:
+        cmd.append("--embed")
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    # The pipeline prints its own report lines; ours is the last one
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 400, 1600])
+    parser.add_argument("--image-kb", type=int, default=64, help="size of the filler image on every page")
+    parser.add_argument("--tolerance-mb", type=float, default=15.0, help="allowed growth of peak memory from the smallest to the largest PDF")
+    parser.add_argument("--embed", action="store_true", help="embed chunks with the real model")
+    parser.add_argument("--eager", action="store_true", help="also measure the old load-everything approach for comparison")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="streaming", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.mode, args.embed)
+        return 0
+
+    modes = ["streaming", "eager"] if args.eager else ["streaming"]
+    growth = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = write_pdf(os.path.join(tmp, f"synthetic_{pages}.pdf"), pages, image_kb=args.image_kb)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            for mode in modes:
+                result = measure(path, mode, args.embed)
+                used = result["peak_mb"] - result["baseline_mb"]
+                growth.setdefault(mode, []).append(used)
+                print(f"{mode:>9} | {pages:>6} pages | {size_mb:7.1f} MB file | {result['chunks']:>7} chunks | peak {result['peak_mb']:7.1f} MB | +{used:6.1f} MB over baseline")
+
+    spread = max(growth["streaming"]) - min(growth["streaming"])
+    if spread > args.tolerance_mb:
+        print(f"FAIL: streaming peak memory grew by {spread:.1f} MB across sizes (tolerance {args.tolerance_mb} MB)")
+        return 1
+    print(f"OK: streaming peak memory stayed within {spread:.1f} MB across sizes (tolerance {args.tolerance_mb} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Offline end-to-end benchmark: ingests synthetic PDFs, then runs the real create_workflow() graph
+on a mix of document, web-search and URL questions. The LLM, DuckDuckGo and the web are replaced by
+local stand-ins (benchmarks/stand_ins.py, benchmarks/local_server.py), so runs are repeatable and free.
+
+Reports ingestion throughput and peak memory, and p50/p95 latency per graph node, time to first
+answer token and end to end. Every run is appended to a history file; metrics that got worse than
+the median of the last runs with the same settings by more than --tolerance are flagged, and the
+exit code is 1 when there is a regression.
+
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --questions 30 --llm-latency 0.5 --tolerance 0.15
+    python -m benchmarks.bench_suite --fake-embeddings      # no embedding model download either
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.local_server import LocalWebServer
+from benchmarks.stand_ins import FAKE_MODEL_CHOICE, install
+from benchmarks.synthetic_pdf import write_pdf
+from src.utils import telemetry
+
+HISTORY_PATH = os.path.join(".cache", "bench_history.jsonl")
+# How many earlier comparable runs the baseline is the median of
+BASELINE_RUNS = 5
+# Differences smaller than this are noise, whatever the percentage (milliseconds / MB / pages per second)
+ABSOLUTE_FLOOR = {"ms": 5.0, "mb": 20.0, "per_s": 5.0}
+
+QUESTIONS = [
+    "What does the uploaded report say about embedding latency?",
+    "Summarize the section on cache throughput in my document.",
+    "What are the latest developments in retrieval augmented generation?",
+    "Who won the most recent chess world championship?",
+    "Summarize this page: {server}/page/7",
+    "What is on {server}/page/12 ?",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_ingestion(pdfs, pages):
+    from src.rag.ingest import DATA_DIR, ingest_documents
+    from src.utils.memory import peak_rss_mb
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for i in range(pdfs):
+        write_pdf(os.path.join(DATA_DIR, f"bench_{i}.pdf"), pages, seed=i)
+    t0 = time.perf_counter()
+    ingest_documents()
+    wall = time.perf_counter() - t0
+    return {"ingest_pages_per_s": pdfs * pages / wall, "ingest_wall_ms": wall * 1e3, "ingest_peak_rss_mb": peak_rss_mb()}
+
+
+def run_questions(server, count, warm_caches):
+    from src.graph.workflow import create_workflow, stream_events
+    from src.utils.web_cache import get_web_cache
+
+    app = create_workflow()
+    node_durations = {}
+    end_to_end, first_token = [], []
+    for i in range(count):
+        question = QUESTIONS[i % len(QUESTIONS)].format(server=server.url("").rstrip("/"))
+        if not warm_caches:
+            # Make every question different and every page a fresh download
+            question = f"{question} (run {i})"
+            get_web_cache().clear()
+        inputs = {"messages": [HumanMessage(content=question)], "model_choice": FAKE_MODEL_CHOICE,
+                  "gemini_key": None, "openai_key": None}
+        t0 = time.perf_counter()
+        first = None
+        with telemetry.trace("bench") as request_trace:
+            for kind, _ in stream_events(app, inputs):
+                if kind == "token" and first is None:
+                    first = time.perf_counter() - t0
+        # Graph nodes (and the researcher's inner agent / tools steps) come from the app's own telemetry
+        for span in request_trace.breakdown():
+            if span["kind"] == "node":
+                node_durations.setdefault(span["name"], []).append(span["duration_ms"] / 1e3)
+        end_to_end.append(time.perf_counter() - t0)
+        first_token.append(first if first is not None else end_to_end[-1])
+
+    metrics = {
+        "end_to_end_p50_ms": percentile(end_to_end, 0.5) * 1e3,
+        "end_to_end_p95_ms": percentile(end_to_end, 0.95) * 1e3,
+        "first_token_p50_ms": percentile(first_token, 0.5) * 1e3,
+        "first_token_p95_ms": percentile(first_token, 0.95) * 1e3,
+    }
+    for node, durations in sorted(node_durations.items()):
+        metrics[f"node_{node}_p50_ms"] = percentile(durations, 0.5) * 1e3
+        metrics[f"node_{node}_p95_ms"] = percentile(durations, 0.95) * 1e3
+    return metrics
+
+
+def _lower_is_better(metric):
+    return not metric.endswith("_per_s")
+
+
+def _floor(metric):
+    for suffix, floor in ABSOLUTE_FLOOR.items():
+        if metric.endswith(suffix):
+            return floor
+    return 0.0
+
+
+def compare(metrics, history, tolerance):
+    """Returns [(metric, value, baseline, change)] for metrics that regressed against the baseline."""
+    regressions = []
+    for metric, value in metrics.items():
+        previous = [run["metrics"][metric] for run in history if metric in run["metrics"]][-BASELINE_RUNS:]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        worse = value - baseline if _lower_is_better(metric) else baseline - value
+        if baseline and worse > abs(baseline) * tolerance and worse > _floor(metric):
+            regressions.append((metric, value, baseline, worse / abs(baseline)))
+    return regressions
+
+
+def load_history(path, params):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    return [run for run in runs if run.get("params") == params]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=18)
+    parser.add_argument("--pdfs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=40, help="pages per synthetic PDF")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake model's time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="fake model's time per token (s)")
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--web-latency", type=float, default=0.05, help="local web server delay per page (s)")
+    parser.add_argument("--warm-caches", action="store_true", help="keep the answer and web caches (default: measure cold paths)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hash-based embeddings instead of the real model")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slow-down against the baseline (0.2 = 20%%)")
+    parser.add_argument("--no-record", action="store_true", help="don't append this run to the history")
+    args = parser.parse_args()
+
+    params = {key: getattr(args, key) for key in
+              ("questions", "pdfs", "pages", "llm_latency", "token_latency", "search_latency", "web_latency",
+               "warm_caches", "fake_embeddings")}
+    history_path = os.path.abspath(args.history)
+    commit = git_commit()
+
+    # Everything the app writes (data/, chroma_db/, .cache/) goes to a throwaway directory
+    workdir = tempfile.mkdtemp(prefix="ira-bench-")
+    os.chdir(workdir)
+
+    from src.rag import resources
+    from src.utils.response_cache import NAMESPACE_SETTINGS, ResponseCache, set_response_cache
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        resources._embeddings = DeterministicFakeEmbedding(size=384)
+    if not args.warm_caches:
+        set_response_cache(ResponseCache(settings={ns: {"ttl": 0, "similarity": None} for ns in NAMESPACE_SETTINGS}))
+
+    with LocalWebServer(delay=args.web_latency) as server:
+        model, search = install(server, first_token_latency=args.llm_latency, token_latency=args.token_latency,
+                                search_latency=args.search_latency)
+        metrics = run_ingestion(args.pdfs, args.pages)
+        metrics.update(run_questions(server, args.questions, args.warm_caches))
+        pages_served = sum(server.requests.values())
+
+    print(f"\n{args.questions} questions, {model.calls['generate'] + model.calls['structured']} model calls, "
+          f"{search.queries} searches, {pages_served} pages served; work dir {workdir}")
+    history = load_history(history_path, params)
+    regressions = {metric: (baseline, change) for metric, _, baseline, change in compare(metrics, history, args.tolerance)}
+    for metric, value in metrics.items():
+        note = ""
+        if metric in regressions:
+            baseline, change = regressions[metric]
+            note = f"  REGRESSION: {change:+.0%} vs {baseline:.1f}"
+        print(f"  {metric:<44}{value:10.1f}{note}")
+    if history:
+        print(f"compared with the median of the last {min(len(history), BASELINE_RUNS)} comparable runs in {history_path}")
+
+    if not args.no_record:
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+        with open(history_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "params": params, "metrics": metrics}) + "\n")
+
+    if regressions:
+        print(f"FAIL: {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
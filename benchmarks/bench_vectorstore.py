@@ -0,0 +1,156 @@
+"""
+Compares the vector store backends (IRA_VECTOR_STORE): Chroma and the memory-mapped flat store
+(src/rag/flat_store.py) with float32 and with float16 vectors, on the same synthetic corpus:
+  - build: seconds to add all chunks in ingestion-sized batches, size on disk,
+  - open: seconds to open the existing store in a fresh process (what every app start pays),
+  - query: p50/p95 latency of a top-k search by vector,
+  - memory: resident memory after opening and after the queries, and the peak,
+  - recall@k against an exact float32 search (Chroma's index is approximate, float16 rounds).
+
+Vectors are random (clustered, so neighbours exist) and handed to the stores directly, so no
+embedding model runs and the numbers are the store alone. Every backend and phase runs in a fresh
+child process, so memory isn't shared between them.
+
+    python -m benchmarks.bench_vectorstore
+    python -m benchmarks.bench_vectorstore --chunks 200000 --dim 384 --queries 200
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# name -> (IRA_VECTOR_STORE backend, flat store dtype)
+BACKENDS = {"chroma": ("chroma", None), "flat-float32": ("flat", "float32"), "flat-float16": ("flat", "float16")}
+BATCH_SIZE = 500
+
+
+def corpus(chunks, dim, queries, seed=0):
+    """Returns (chunk vectors, query vectors), float32 and normalized; every query is near some chunk."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(chunks // 50, 1), dim), dtype=np.float32)
+    vectors = centers[rng.integers(len(centers), size=chunks)] + 0.5 * rng.standard_normal((chunks, dim), dtype=np.float32)
+    questions = vectors[rng.integers(chunks, size=queries)] + 0.3 * rng.standard_normal((queries, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    questions /= np.linalg.norm(questions, axis=1, keepdims=True)
+    return vectors, questions
+
+
+class Precomputed(Embeddings):
+    """Embeddings that look up the vector of "chunk <row>" texts instead of running a model."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(text.split()[1])].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def open_store(backend, directory, embeddings):
+    kind, dtype = BACKENDS[backend]
+    if kind == "flat":
+        from src.rag.flat_store import FlatVectorStore
+        return FlatVectorStore(directory, embeddings, dtype=dtype)
+    from src.rag.resources import VECTOR_STORES
+    return VECTOR_STORES[kind](directory, embeddings)
+
+
+def child(args):
+    from src.utils.memory import current_rss_mb, peak_rss_mb
+
+    vectors, questions = corpus(args.chunks, args.dim, args.queries)
+    embeddings = Precomputed(vectors)
+    baseline = current_rss_mb()
+    if args.child == "build":
+        t0 = time.perf_counter()
+        store = open_store(args.backend, args.dir, embeddings)
+        for start in range(0, args.chunks, BATCH_SIZE):
+            rows = range(start, min(start + BATCH_SIZE, args.chunks))
+            store.add_texts([f"chunk {row}" for row in rows], metadatas=[{"row": row} for row in rows],
+                            ids=[f"c{row}" for row in rows])
+        seconds = time.perf_counter() - t0
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(args.dir) for name in names)
+        report = {"build_s": round(seconds, 2), "disk_mb": round(size / 2 ** 20, 1)}
+    else:
+        # The corpus itself is only needed by the build; leave it out of the memory numbers
+        del embeddings, vectors
+        baseline = current_rss_mb()
+        t0 = time.perf_counter()
+        store = open_store(args.backend, args.dir, None)
+        open_seconds = time.perf_counter() - t0
+        open_rss = current_rss_mb()
+        store.similarity_search_by_vector(questions[0].tolist(), k=args.k)  # the first search loads what it needs
+        latencies, found = [], []
+        for question in questions:
+            t0 = time.perf_counter()
+            docs = store.similarity_search_by_vector(question.tolist(), k=args.k)
+            latencies.append(time.perf_counter() - t0)
+            found.append([doc.metadata["row"] for doc in docs])
+        latencies.sort()
+        report = {
+            "open_s": round(open_seconds, 3),
+            "query_p50_ms": round(latencies[len(latencies) // 2] * 1e3, 2),
+            "query_p95_ms": round(latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1e3, 2),
+            "open_rss_mb": round(open_rss - baseline, 1),
+            "query_rss_mb": round(current_rss_mb() - baseline, 1),
+            "found": found,
+        }
+    report["peak_rss_mb"] = round(peak_rss_mb() - baseline, 1)
+    print(json.dumps(report))
+
+
+def run_child(args, phase, backend, directory):
+    cmd = [sys.executable, "-m", "benchmarks.bench_vectorstore", "--child", phase, "--backend", backend, "--dir", directory,
+           "--chunks", str(args.chunks), "--dim", str(args.dim), "--queries", str(args.queries), "--k", str(args.k)]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    # Chroma may print its own lines; ours is the last one
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384, help="vector size (384 for all-MiniLM-L6-v2)")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    vectors, questions = corpus(args.chunks, args.dim, args.queries)
+    exact = np.argsort(-(questions @ vectors.T), axis=1)[:, :args.k]
+    del vectors
+    print(f"{args.chunks} chunks of {args.dim} dimensions, {args.queries} queries, top {args.k}")
+
+    workdir = tempfile.mkdtemp(prefix="ira-bench-vectorstore-")
+    try:
+        for backend in args.backends:
+            directory = os.path.join(workdir, backend)
+            report = {"backend": backend, **run_child(args, "build", backend, directory)}
+            report.update(run_child(args, "query", backend, directory))
+            found = report.pop("found")
+            report[f"recall@{args.k}"] = round(statistics.mean(
+                len(set(rows) & set(truth.tolist())) / args.k for rows, truth in zip(found, exact)), 3)
+            print(json.dumps(report))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cold-start check: imports the app's entry points in fresh Python processes and fails (exit code 1)
+when one takes longer than its budget, or when one imports a heavy library (torch, the embedding
+model, Chroma, the LLM SDKs...) at import time instead of on first use / in the background warm-up.
+
+    python -m benchmarks.check_startup
+    python -m benchmarks.check_startup --runs 5 --budget 2.0      # one budget for every entry point
+    python -m benchmarks.check_startup --profile                    # also list the slowest imports
+
+Run it in CI (or before a release) so a new top-level import can't quietly slow down every cold start.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> seconds allowed for the import (about twice what it takes on a laptop)
+BUDGETS = {
+    "src.graph.workflow": 2.5,
+    "src.api.server": 2.5,
+    "app": 3.0,
+}
+# Libraries that take seconds to import and must only load on first use or in the background warm-up
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "chromadb",
+    "langchain_google_genai",
+    "langchain_openai",
+    "langgraph.prebuilt",
+    "langchain_text_splitters",
+    "pypdf",
+]
+# app.py starts the warm-up thread while it is still being imported, so heavy modules may legitimately
+# appear there; its import time is still checked
+SKIP_HEAVY_CHECK = {"app"}
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print("\\n" + json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module):
+    """Imports `module` in a new interpreter; returns (seconds, heavy modules that got imported)."""
+    result = subprocess.run([sys.executable, "-c", CHILD.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=ROOT, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report["seconds"], report["heavy"]
+
+
+def slowest_imports(module, top):
+    """The `top` imports with the longest cumulative time, from python -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, timeout=300)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per entry point (the fastest counts)")
+    parser.add_argument("--budget", type=float, help="seconds allowed for every entry point (default: per entry point)")
+    parser.add_argument("--profile", action="store_true", help="list the slowest imports of every entry point")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget in BUDGETS.items():
+        budget = args.budget or budget
+        runs = [measure(module) for _ in range(args.runs)]
+        times = [seconds for seconds, _ in runs]
+        # The fastest run is the least disturbed by whatever else the machine was doing
+        best = min(times)
+        heavy = sorted({name for _, names in runs for name in names}) if module not in SKIP_HEAVY_CHECK else []
+        status = "ok"
+        if best > budget:
+            status = "OVER BUDGET"
+            failures.append(f"{module} took {best:.2f}s (budget {budget:.2f}s)")
+        if heavy:
+            status = "HEAVY IMPORTS"
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+        print(f"  {module:<22} best {best:5.2f}s  median {statistics.median(times):5.2f}s  budget {budget:4.1f}s  {status}")
+        if args.profile or status != "ok":
+            for cumulative, name in slowest_imports(module, args.top):
+                print(f"      {cumulative / 1e6:6.2f}s {name}")
+
+    if failures:
+        print("FAIL:\n  " + "\n  ".join(failures))
+        return 1
+    print("Cold start within budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+A local stand-in for the web: a threaded HTTP server on 127.0.0.1 that serves generated
+article pages (or saved HTML files) with an optional artificial delay.
+
+    from benchmarks.local_server import LocalWebServer
+    with LocalWebServer(delay=0.2) as server:
+        url = server.url("/page/1")
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def article_html(number, paragraphs=20):
+    body = "\n".join(
+        f"<p>Paragraph {i} of article {number}: research assistants combine retrieval with web search "
+        f"to answer questions about documents and current events.</p>"
+        for i in range(paragraphs)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><title>Article {number}</title><style>body {{ font-family: sans-serif; }}</style>
+<script>window.analytics = {{ page: {number} }};</script></head>
+<body>
+<nav><a href="/">Home</a> | <a href="/news">News</a> | <a href="/about">About</a></nav>
+<header><h1>Site header</h1></header>
+<main><article><h2>Article {number}</h2>
+{body}
+</article></main>
+<aside class="sidebar"><ul><li><a href="/page/1">Related 1</a></li><li><a href="/page/2">Related 2</a></li></ul></aside>
+<footer>Copyright - Privacy - Terms</footer>
+</body></html>"""
+
+
+class LocalWebServer:
+    """
+    Serves /page/<n> (a generated article with an ETag), /file/<name> (a file from html_dir),
+    /status/<code> (an empty response with that status), and counts requests per path.
+    Every response waits `delay` seconds first, to imitate network latency.
+    """
+
+    def __init__(self, delay=0.0, html_dir=None, host="127.0.0.1", port=0):
+        self.delay = delay
+        self.html_dir = html_dir
+        self.requests = {}
+        self.connections = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse can be observed
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="text/html; charset=utf-8", extra_headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (extra_headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                if server.delay:
+                    time.sleep(server.delay)
+                handled = server.handle(self)
+                if handled is None:
+                    self._send(404, b"not found", "text/plain")
+                else:
+                    self._send(*handled)
+
+            do_HEAD = do_GET
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                self.do_GET()
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def handle(self, request):
+        """Returns (status, body, content_type[, headers]) for a request, or None for 404."""
+        path = request.path.split("?")[0]
+        if path.startswith("/page/"):
+            # Pages carry an ETag and answer a matching If-None-Match with 304, like real servers
+            etag = f'"page-{path.rsplit("/", 1)[-1]}"'
+            if request.headers.get("If-None-Match") == etag:
+                return 304, b"", "text/html; charset=utf-8", {"ETag": etag}
+            return 200, article_html(path.rsplit("/", 1)[-1]).encode("utf-8"), "text/html; charset=utf-8", {"ETag": etag}
+        if path.startswith("/status/"):
+            return int(path.rsplit("/", 1)[-1]), b"", "text/plain"
+        if path.startswith("/file/") and self.html_dir:
+            file_path = os.path.join(self.html_dir, os.path.basename(path))
+            if os.path.isfile(file_path):
+                with open(file_path, "rb") as f:
+                    return 200, f.read()
+        return None
+
+    def url(self, path="/"):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,206 @@
+"""
+Local stand-ins for everything the graph normally reaches over the network, so it can be measured
+offline and repeatably:
+
+  FakeChatModel - a deterministic chat model with configurable latency (time to first token and
+                  per token). It answers routing questions, drives the researcher's tool loop
+                  (search -> read the result pages -> answer) and streams its answers. With a
+                  capacity it also throttles like a real provider: calls beyond it get a 429.
+  FakeSearch    - replaces DuckDuckGo; every result links to pages on a LocalWebServer.
+
+    from benchmarks.stand_ins import install
+    install(server, first_token_latency=0.2)   # then use model_choice=FAKE_MODEL_CHOICE
+"""
+import json
+import re
+import threading
+import time
+import zlib
+from typing import Any, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+FAKE_PROVIDER = "fake"
+FAKE_MODEL_CHOICE = "Fake model (offline)"
+
+URL_PATTERN = re.compile(r"https?://[^\s\]\),'\"]+")
+DOCUMENT_WORDS = re.compile(r"\b(document|pdf|report|uploaded|file|context|paper)\b", re.IGNORECASE)
+WEB_WORDS = re.compile(r"\b(news|web|online|latest)\b", re.IGNORECASE)
+
+
+class FakeRateLimitError(Exception):
+    """What FakeChatModel raises when it is over capacity, shaped like the provider SDKs' 429 errors."""
+
+    status_code = 429
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+class FakeChatModel(BaseChatModel):
+    """A deterministic chat model: same input, same output, with a configurable simulated latency."""
+
+    model: str = "fake-chat"
+    first_token_latency: float = 0.2
+    token_latency: float = 0.005
+    answer_tokens: int = 60
+    tool_names: List[str] = []
+    # Calls it serves at the same time (0: no limit); more get a FakeRateLimitError, like a provider's 429
+    capacity: int = 0
+    calls: Any = None  # shared counter dict, so copies made by bind_tools count into the same place
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.calls is None:
+            self.calls = {"generate": 0, "structured": 0, "throttled": 0, "in_flight": 0, "lock": threading.Lock()}
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _count(self, kind):
+        with self.calls["lock"]:
+            self.calls[kind] += 1
+
+    def _start(self):
+        """Takes one of the capacity's slots, or raises FakeRateLimitError when they are all taken."""
+        with self.calls["lock"]:
+            if self.capacity and self.calls["in_flight"] >= self.capacity:
+                self.calls["throttled"] += 1
+                raise FakeRateLimitError("429 Too Many Requests: over the fake provider's capacity")
+            self.calls["in_flight"] += 1
+
+    def _finish(self):
+        with self.calls["lock"]:
+            self.calls["in_flight"] -= 1
+
+    # --- tools and structured output -------------------------------------------------------------
+
+    def bind_tools(self, tools, **kwargs):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    def with_structured_output(self, schema, **kwargs):
+        # Only the supervisor uses structured output: pick a worker from the words in the question
+        def route(prompt):
+            self._start()
+            self._count("structured")
+            try:
+                time.sleep(self.first_token_latency)
+            finally:
+                self._finish()
+            text = prompt if isinstance(prompt, str) else _text(getattr(prompt, "content", "")) or str(prompt)
+            question = text.rsplit("User Query:", 1)[-1]
+            if DOCUMENT_WORDS.search(question):
+                next_node = "both" if WEB_WORDS.search(question) else "document_agent"
+            else:
+                next_node = "researcher_agent"
+            return schema(next_node=next_node)
+
+        return RunnableLambda(route)
+
+    # --- answering -------------------------------------------------------------------------------
+
+    def _respond(self, messages):
+        """Returns (text, tool_call or None) for the conversation so far."""
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        question = _text(messages[last_human].content) if messages else ""
+        tool_results = [m for m in messages[last_human + 1:] if isinstance(m, ToolMessage)]
+
+        if self.tool_names:
+            step = len(tool_results)
+            urls = URL_PATTERN.findall(question)
+            if step == 0 and urls and "scrape_website" in self.tool_names:
+                return "", {"name": "scrape_website", "args": {"url": urls[0]}}
+            if step == 0 and "duckduckgo_search" in self.tool_names:
+                return "", {"name": "duckduckgo_search", "args": {"query": question[:200]}}
+            if step == 1 and tool_results[0].name == "duckduckgo_search" and "scrape_websites" in self.tool_names:
+                found = URL_PATTERN.findall(_text(tool_results[0].content))[:3]
+                if found:
+                    return "", {"name": "scrape_websites", "args": {"urls": found}}
+
+        # A final answer built from the words it was given, so it looks like a real summary
+        source = " ".join(_text(m.content) for m in tool_results) or _text(messages[-1].content)
+        words = re.findall(r"[A-Za-z][A-Za-z0-9'-]*", source)[:self.answer_tokens] or ["No", "information", "found."]
+        return f"Answer ({len(source)} characters read): " + " ".join(words), None
+
+    def _tool_call(self, call):
+        return {"name": call["name"], "args": call["args"], "id": f"call_{call['name']}_{zlib.crc32(json.dumps(call['args']).encode('utf-8'))}"}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._start()
+        self._count("generate")
+        text, call = self._respond(messages)
+        try:
+            time.sleep(self.first_token_latency + self.token_latency * len(text.split()))
+        finally:
+            self._finish()
+        message = AIMessage(content=text, tool_calls=[self._tool_call(call)] if call else [])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._start()
+        try:
+            yield from self._stream_answer(messages, run_manager)
+        finally:
+            self._finish()
+
+    def _stream_answer(self, messages, run_manager):
+        self._count("generate")
+        text, call = self._respond(messages)
+        time.sleep(self.first_token_latency)
+        if call:
+            tool_call = self._tool_call(call)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": tool_call["name"], "args": json.dumps(tool_call["args"]), "id": tool_call["id"], "index": 0}
+            ]))
+            return
+        for i, word in enumerate(text.split(" ")):
+            token = word if i == 0 else " " + word
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeSearch:
+    """Stands in for DuckDuckGoSearchRun: returns results that link to pages on the local server."""
+
+    def __init__(self, server, latency=0.1, results=3):
+        self.server = server
+        self.latency = latency
+        self.results = results
+        self.queries = 0
+
+    def invoke(self, query, *args, **kwargs):
+        self.queries += 1
+        time.sleep(self.latency)
+        # The same query always lists the same pages
+        first = sum(map(ord, query)) % 50
+        return " ".join(
+            f"[snippet: Result {n} about {query[:40]}, title: Article {n}, link: {self.server.url(f'/page/{n}')}]"
+            for n in range(first, first + self.results)
+        )
+
+
+def install(server, first_token_latency=0.2, token_latency=0.005, search_latency=0.1, capacity=0):
+    """
+    Points the app at the stand-ins: the fake model is registered under FAKE_MODEL_CHOICE and web
+    searches go to FakeSearch. Returns (model, search) so callers can read their counters.
+    """
+    from src.agents import researcher
+    from src.utils.llm_factory import register_provider
+
+    model = FakeChatModel(first_token_latency=first_token_latency, token_latency=token_latency, capacity=capacity)
+    register_provider(FAKE_PROVIDER, lambda name, temperature, api_key: model, {FAKE_MODEL_CHOICE: model.model})
+    search = FakeSearch(server, latency=search_latency)
+    researcher._ddg = search
+    return model, search
@@ -0,0 +1,75 @@
+"""
+Writes simple text-only PDFs of any size, so benchmarks don't need real documents.
+
+    python -m benchmarks.synthetic_pdf out.pdf 500
+"""
+import random
+import sys
+
+WORDS = (
+    "research assistant document retrieval vector embedding chunk page model query answer "
+    "supervisor agent graph search web context latency throughput memory cache index token "
+    "report analysis figure table method result dataset experiment baseline evaluation"
+).split()
+
+
+def page_lines(rng, page_number, lines_per_page):
+    lines = [f"Page {page_number + 1} - section {page_number // 10 + 1}"]
+    for _ in range(lines_per_page - 1):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, lines_per_page=40, seed=0, text_for_page=None, image_kb=0):
+    """
+    Writes a PDF with the given number of pages straight to disk (never held in memory).
+    text_for_page(page_number) -> list of lines can be passed to control the content.
+    image_kb attaches an uncompressed image of about that size to every page, to get
+    realistic file sizes (most of a big PDF is usually images, not text).
+    """
+    rng = random.Random(seed)
+    offsets = {}
+
+    with open(path, "wb") as f:
+        def write_object(number, body):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode("latin-1"))
+            f.write(body)
+            f.write(b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content, image) triple for every page
+        kids = " ".join(f"{4 + 3 * i} 0 R" for i in range(pages))
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode("latin-1"))
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        for i in range(pages):
+            lines = text_for_page(i) if text_for_page else page_lines(rng, i, lines_per_page)
+            stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+            stream_bytes = stream.encode("latin-1", errors="replace")
+            resources = f"/Font << /F1 3 0 R >> /XObject << /Im1 {6 + 3 * i} 0 R >>"
+            write_object(4 + 3 * i, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << {resources} >> /Contents {5 + 3 * i} 0 R >>".encode("latin-1"))
+            write_object(5 + 3 * i, f"<< /Length {len(stream_bytes)} >>\nstream\n".encode("latin-1") + stream_bytes + b"\nendstream")
+            # A grey-scale image that is never drawn: it only makes the file as big as a scanned one
+            side = max(1, int((image_kb * 1024) ** 0.5))
+            pixels = rng.randbytes(side * side) if image_kb else b"\x00"
+            side = side if image_kb else 1
+            write_object(6 + 3 * i, f"<< /Type /XObject /Subtype /Image /Width {side} /Height {side} /ColorSpace /DeviceGray /BitsPerComponent 8 /Length {len(pixels)} >>\nstream\n".encode("latin-1") + pixels + b"\nendstream")
+
+        xref_offset = f.tell()
+        count = 3 + 3 * pages + 1
+        f.write(f"xref\n0 {count}\n".encode("latin-1"))
+        f.write(b"0000000000 65535 f \n")
+        for number in range(1, count):
+            f.write(f"{offsets[number]:010d} 00000 n \n".encode("latin-1"))
+        f.write(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1"))
+    return path
+
+
+if __name__ == "__main__":
+    write_pdf(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 10, image_kb=int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -1,40 +1,61 @@
 from typing import Annotated, Literal
-import operator
+from langgraph.graph.message import add_messages
 from typing_extensions import TypedDict
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from src.rag.retrieve import get_retriever
+from src.rag.context import PACK_CANDIDATES, cited_sources, pack_context
 
+from src.rag import namespaces
+from src.rag.manifest import store_revision
+from src.rag.resources import collection_dir
+from src.agents.memory import api_keys
 from src.utils.llm_factory import get_llm
+from src.utils.response_cache import get_response_cache
+from src.utils import telemetry
 
 class AgentState(TypedDict):
-    messages: Annotated[list, operator.add]
+    messages: Annotated[list, add_messages]
+    history: str
     model_choice: str
     gemini_key: str
     openai_key: str
 
-def document_node(state: AgentState):
-    """Answers questions based on retrieved local PDF documents."""
+def document_node(state: AgentState, config=None):
+    """Answers questions based on retrieved local PDF documents - only the caller's namespace (from the run config)."""
     messages = state["messages"]
     question = messages[-1].content
     
-    retriever = get_retriever()
+    # Summary + recent messages, built once per turn by the memory node
+    conversation_history = state.get("history", "")
+
+    model_choice = state.get("model_choice", "Gemini 2.5 Flash")
+    gemini_key, openai_key = api_keys(state, config)
+    namespace = namespaces.from_config(config)
+    namespaces.touch(namespace)
+
+    # The same question about the same documents was answered before - skip retrieval and the LLM.
+    # The store revision changes on every ingest, so answers about older documents never come back,
+    # and the namespace is part of the key, so nobody gets an answer about someone else's documents.
+    cache = get_response_cache()
+    cache_context = f"{model_choice}\n{namespace}\n{conversation_history}"
+    revision = store_revision(collection_dir(namespace))
+    cached = cache.lookup("document_agent", question, cache_context, revision)
+    if cached is not None:
+        return {"messages": [AIMessage(content=cached)]}
+
+    retriever = get_retriever(k=PACK_CANDIDATES, namespace=namespace)
     
     if retriever:
-        # Fetch relevant documents
+        # Fetch relevant documents, then merge overlapping chunks, drop repeats and fit them into CONTEXT_BUDGET
         docs = retriever.invoke(question)
-        context = "\n\n".join([doc.page_content for doc in docs])
+        with telemetry.span("pack_context", kind="retrieval", chunks=len(docs)):
+            context, citations = pack_context(docs)
     else:
-        context = "No documents have been loaded into the database yet."
-        
-    history_msgs = messages[-5:-1] if len(messages) > 1 else []
-    conversation_history = ""
-    if history_msgs:
-        history_str = "\n".join([f"{msg.type}: {msg.content}" for msg in history_msgs])
-        conversation_history = f"Recent Conversation:\n{history_str}\n"
+        context, citations = "No documents have been loaded into the database yet.", []
 
     prompt = f"""You are a helpful research assistant. Answer the user's question based strictly on the provided context. 
     If the context doesn't contain the answer, say that you don't know based on the provided documents.
+    Each context passage starts with a number and its source, like [1] report.pdf, page 4. Cite the passages you use as [1], [2], ...
     
     Context:
     {context}
@@ -43,10 +64,12 @@ def document_node(state: AgentState):
     Question: {question}
     """
     
-    model_choice = state.get("model_choice", "Gemini 2.5 Flash")
-    gemini_key = state.get("gemini_key")
-    openai_key = state.get("openai_key")
-    
     llm = get_llm(model_choice, temperature=0.2, google_api_key=gemini_key, openai_api_key=openai_key)
     response = llm.invoke(prompt)
+    # List where the cited passages come from under the answer, so "[2]" can be looked up
+    sources = cited_sources(response.content, citations) if isinstance(response.content, str) else []
+    if sources:
+        response = response.model_copy(update={"content": response.content + "\n\nSources:\n" + "\n".join(sources)})
+    if retriever and isinstance(response.content, str):
+        cache.store("document_agent", question, response.content, cache_context, revision)
     return {"messages": [response]}
@@ -0,0 +1,79 @@
+from langchain_core.messages import RemoveMessage
+from src.utils.llm_factory import get_llm
+
+# How many earlier messages (2 per question + answer) the agents see word for word
+RECENT_MESSAGES = 4
+# Older messages are folded into the summary in batches, so the summary isn't rewritten every turn
+SUMMARY_BATCH = 6
+# The summary is cut to this length if the model doesn't keep it short itself
+MAX_SUMMARY_CHARS = 2000
+# Each message is shortened to this when it goes into the summary prompt (or the fallback summary)
+MAX_MESSAGE_CHARS = 1500
+
+
+def api_keys(state, config):
+    """The user's API keys: from the run config (never checkpointed to disk), or from the state for old callers."""
+    configurable = (config or {}).get("configurable", {})
+    return (configurable.get("gemini_key") or state.get("gemini_key"),
+            configurable.get("openai_key") or state.get("openai_key"))
+
+
+def _line(message, limit=None):
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    return f"{message.type}: {text[:limit] if limit else text}"
+
+
+def _summarize(summary, messages, state, config):
+    """Folds messages into the running summary with the user's model; a plain excerpt if that fails."""
+    transcript = "\n".join(_line(m, MAX_MESSAGE_CHARS) for m in messages)
+    gemini_key, openai_key = api_keys(state, config)
+    try:
+        llm = get_llm(state.get("model_choice", "Gemini 2.5 Flash"), temperature=0.0,
+                      google_api_key=gemini_key, openai_api_key=openai_key)
+        prompt = f"""Update the summary of a conversation between a user and a research assistant with the new messages below.
+Keep the facts, names, documents and decisions a follow-up question might refer to. At most 150 words, no preamble.
+
+Current summary:
+{summary or "(none yet)"}
+
+New messages:
+{transcript}"""
+        response = llm.invoke(prompt)
+        new_summary = response.content if isinstance(response.content, str) else str(response.content)
+    except Exception as e:
+        print(f"Summarizing the conversation failed ({e}), keeping an excerpt instead.")
+        new_summary = f"{summary}\n{transcript}".strip()
+    # Keep the newest part if it is still too long
+    return new_summary.strip()[-MAX_SUMMARY_CHARS:]
+
+
+def memory_node(state, config=None):
+    """
+    Runs once at the start of every turn, before the supervisor. Keeps the conversation state bounded
+    and builds the history text that all agents put in their prompts (so none of them re-derives it):
+
+    - the last RECENT_MESSAGES earlier messages are kept word for word,
+    - anything older is folded into a rolling summary (one LLM call every SUMMARY_BATCH / 2 turns)
+      and removed from the state, so long conversations don't get slower or heavier.
+    """
+    messages = state["messages"]
+    earlier = messages[:-1]
+    summary = state.get("summary") or ""
+    update = {}
+
+    if len(earlier) >= RECENT_MESSAGES + SUMMARY_BATCH:
+        old, earlier = earlier[:-RECENT_MESSAGES], earlier[-RECENT_MESSAGES:]
+        summary = _summarize(summary, old, state, config)
+        update["summary"] = summary
+        # Messages from the caller may not have IDs yet (the graph gives them one when they are stored)
+        update["messages"] = [RemoveMessage(id=m.id) for m in old if m.id]
+
+    # The agents see at most RECENT_MESSAGES messages word for word, even while a batch builds up
+    recent = earlier[-RECENT_MESSAGES:]
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}\n")
+    if recent:
+        parts.append("Recent Conversation:\n" + "\n".join(_line(m) for m in recent) + "\n")
+    update["history"] = "\n".join(parts)
+    return update
@@ -1,22 +1,160 @@
 from typing import Annotated
-import operator
+from langgraph.graph.message import add_messages
 from typing_extensions import TypedDict
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.tools import DuckDuckGoSearchRun
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
-import requests
-from bs4 import BeautifulSoup
+import json
+import threading
 
+from src.utils.html_extract import extract_text
+from src.utils.http_fetch import get_fetcher
+from src.agents.memory import api_keys
 from src.utils.llm_factory import get_llm
+from src.utils.response_cache import get_response_cache
+from src.utils.web_cache import get_web_cache
 
 class AgentState(TypedDict):
-    messages: Annotated[list, operator.add]
+    messages: Annotated[list, add_messages]
+    history: str
     model_choice: str
     gemini_key: str
     openai_key: str
 
-search = DuckDuckGoSearchRun()
+# The DuckDuckGo client is only built on the first search, so importing this module stays cheap
+_ddg = None
+_ddg_lock = threading.Lock()
+
+
+def _search_backend():
+    global _ddg
+    if _ddg is None:
+        with _ddg_lock:
+            if _ddg is None:
+                from langchain_community.tools import DuckDuckGoSearchRun
+                _ddg = DuckDuckGoSearchRun()
+    return _ddg
+
+@tool("duckduckgo_search")
+def search(query: str) -> str:
+    """
+    A wrapper around DuckDuckGo Search. Useful for when you need to answer questions
+    about current events. Input should be a search query.
+    """
+    # Repeated searches come from the on-disk cache, which also keeps us under DuckDuckGo's rate limits
+    cache = get_web_cache()
+    cached = cache.get_fresh("search", query)
+    if cached is not None:
+        return cached.decode("utf-8")
+    results = _search_backend().invoke(query)
+    if results:
+        cache.put("search", query, results)
+    return results
+
+LEETCODE_QUERY = """
+query leetcodeProfileInfo($username: String!) {
+  matchedUser(username: $username) {
+    profile {
+      ranking
+      reputation
+    }
+    submitStatsGlobal {
+      acSubmissionNum {
+        difficulty
+        count
+      }
+    }
+  }
+}
+"""
+
+# Truncate page text to avoid massive token usage
+TEXT_LIMIT = 8000
+# Never download more than this much of a page; 8000 characters of text are almost always in the first 2 MB
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+def _leetcode_profile(url):
+    """
+    LeetCode blocks normal bots, so we use their secret 'GraphQL API' to get the data instead.
+    """
+    username = url.rstrip('/').split('/')[-1]
+    cache = get_web_cache()
+    cached = cache.get_fresh("leetcode", username)
+    if cached is not None:
+        return cached.decode("utf-8")
+    try:
+        payload = {
+            "query": LEETCODE_QUERY,
+            "variables": {"username": username},
+            "operationName": "leetcodeProfileInfo"
+        }
+        
+        result = get_fetcher().fetch("https://leetcode.com/graphql/", method="POST", json=payload, headers={"Content-Type": "application/json"})
+        if not result.ok:
+            raise RuntimeError(result.error)
+        res = json.loads(result.content)
+        
+        user_data = res.get('data', {}).get('matchedUser', {})
+        profile = user_data.get('profile', {}) if user_data else {}
+        stats = user_data.get('submitStatsGlobal', {}).get('acSubmissionNum', []) if user_data else []
+        
+        text = f"LeetCode Profile Data for {username}:\n"
+        text += f"Ranking: {profile.get('ranking')}\n"
+        text += f"Reputation: {profile.get('reputation')}\n"
+        for stat in stats:
+            text += f"{stat.get('difficulty')} Problems Solved: {stat.get('count')}\n"
+        cache.put("leetcode", username, text)
+        return text
+    except Exception as e:
+        return f"Failed to fetch LeetCode profile: {str(e)}"
+
+def _fetch_pages(urls, limit=TEXT_LIMIT):
+    """
+    Returns {url: page text} for normal web pages, going through the on-disk web cache.
+    Fresh text is returned without touching the network; stale pages are re-validated with
+    their ETag / Last-Modified, so an unchanged page costs a tiny 304 answer instead of a download.
+    """
+    cache = get_web_cache()
+    texts = {}
+    to_fetch, headers, stale_pages = [], [], {}
+    for url in dict.fromkeys(urls):
+        cached = cache.get_fresh("text", url)
+        if cached is not None:
+            texts[url] = cached.decode("utf-8")[:limit]
+            continue
+        page = cache.get("page", url)
+        conditional = {}
+        if page is not None:
+            stale_pages[url] = page
+            if page["etag"]:
+                conditional["If-None-Match"] = page["etag"]
+            if page["last_modified"]:
+                conditional["If-Modified-Since"] = page["last_modified"]
+        to_fetch.append(url)
+        headers.append(conditional or None)
+
+    if to_fetch:
+        # Everything that wasn't cached is downloaded at the same time
+        for url, result in zip(to_fetch, get_fetcher().fetch_many(to_fetch, headers=headers, max_bytes=MAX_PAGE_BYTES)):
+            if result.status == 304 and url in stale_pages:
+                # Not modified: our copy is still good, so only its age is reset
+                cache.refresh("page", url)
+                content = stale_pages[url]["value"]
+            elif result.ok and result.status != 304:
+                cache.put("page", url, result.content,
+                          etag=result.headers.get("etag"), last_modified=result.headers.get("last-modified"))
+                content = result.content
+            else:
+                # If the website is down or gives a 404 error, we tell the AI instead of crashing
+                texts[url] = f"Failed to scrape the website: {result.error or f'HTTP {result.status}'}"
+                continue
+            try:
+                text = extract_text(content, TEXT_LIMIT)
+            except Exception as e:
+                texts[url] = f"Failed to scrape the website: {str(e)}"
+                continue
+            cache.put("text", url, text)
+            texts[url] = text[:limit]
+    return texts
 
 @tool
 def scrape_website(url: str) -> str:
@@ -27,83 +165,33 @@ def scrape_website(url: str) -> str:
     """
     
     # --- SPECIAL CASE: LEETCODE PROFILES ---
-    # LeetCode blocks normal bots, so we use their secret 'GraphQL API' to get the data instead.
     if "leetcode.com/u/" in url:
-        try:
-            username = url.rstrip('/').split('/')[-1]
-            graphql_url = "https://leetcode.com/graphql/"
-            payload = {
-                "query": """
-                query leetcodeProfileInfo($username: String!) {
-                  matchedUser(username: $username) {
-                    profile {
-                      ranking
-                      reputation
-                    }
-                    submitStatsGlobal {
-                      acSubmissionNum {
-                        difficulty
-                        count
-                      }
-                    }
-                  }
-                }
-                """,
-                "variables": {"username": username},
-                "operationName": "leetcodeProfileInfo"
-            }
-            
-            headers = {"Content-Type": "application/json"}
-            res = requests.post(graphql_url, json=payload, headers=headers).json()
-            
-            user_data = res.get('data', {}).get('matchedUser', {})
-            profile = user_data.get('profile', {}) if user_data else {}
-            stats = user_data.get('submitStatsGlobal', {}).get('acSubmissionNum', []) if user_data else []
-            
-            result = f"LeetCode Profile Data for {username}:\n"
-            result += f"Ranking: {profile.get('ranking')}\n"
-            result += f"Reputation: {profile.get('reputation')}\n"
-            for stat in stats:
-                result += f"{stat.get('difficulty')} Problems Solved: {stat.get('count')}\n"
-            return result
-        except Exception as e:
-            return f"Failed to fetch LeetCode profile: {str(e)}"
+        return _leetcode_profile(url)
             
     # --- NORMAL WEBSITES ---
-    try:
-        # We pretend to be a normal web browser (Chrome) so websites don't block us for being a bot
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.5",
-        }
-        
-        # Go to the URL and download the webpage content
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status() # If the website is down or gives a 404 error, this stops the process
-        
-        # BeautifulSoup is a library that helps us read the messy HTML code of a webpage easily
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # We don't want Javascript code or CSS styles in our text, so we remove those tags
-        for script in soup(["script", "style"]):
-            script.extract()
-            
-        text = soup.get_text(separator=' ')
-        # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        
-        # Truncate to avoid massive token usage
-        return text[:8000]
-    except Exception as e:
-        return f"Failed to scrape the website: {str(e)}"
+    # Go to the URL and download the webpage content (over a shared, already-open connection when possible),
+    # unless we read the same page recently
+    return _fetch_pages([url])[url]
+
+@tool
+def scrape_websites(urls: list[str]) -> str:
+    """
+    Reads several web pages at once. Use this instead of calling scrape_website again and again
+    when you need more than one URL: all pages are downloaded at the same time.
+    Returns the text of every page, each under a '### <url>' heading.
+    """
+    # Share the text budget between the pages so the answer doesn't blow up the prompt
+    limit = max(2000, TEXT_LIMIT // max(1, len(urls)))
+    web_urls = [url for url in urls if "leetcode.com/u/" not in url]
+    fetched = _fetch_pages(web_urls, limit)
 
-# We use create_react_agent to let the LLM decide which tools to use
-from langgraph.prebuilt import create_react_agent
+    sections = []
+    for url in urls:
+        text = _leetcode_profile(url) if url not in fetched else fetched[url]
+        sections.append(f"### {url}\n{text}")
+    return "\n\n".join(sections)
 
-def researcher_node(state: AgentState):
+def researcher_node(state: AgentState, config=None):
     """
     This is the 'brain' of the Research Agent. 
     It takes the user's question, decides whether it needs to search the web or read a link, 
@@ -112,28 +200,37 @@ def researcher_node(state: AgentState):
     # Get the history of messages and user's API keys
     messages = state["messages"]
     model_choice = state.get("model_choice", "Gemini 2.5 Flash")
-    gemini_key = state.get("gemini_key")
-    openai_key = state.get("openai_key")
+    gemini_key, openai_key = api_keys(state, config)
+    
+    # Get the latest question the user asked
+    question = messages[-1].content
     
+    # Summary + recent messages, built once per turn by the memory node
+    conversation_history = state.get("history", "")
+
+    # If the exact same question was researched a few minutes ago, reuse that answer
+    # (only exact repeats, and not for long - web answers go out of date quickly)
+    cache = get_response_cache()
+    cache_context = f"{model_choice}\n{conversation_history}"
+    cached = cache.lookup("researcher_agent", question, cache_context)
+    if cached is not None:
+        return {"messages": [AIMessage(content=cached)]}
+
     # 1. Get the requested AI model (like Gemini or GPT)
     llm = get_llm(model_choice, temperature=0.7, google_api_key=gemini_key, openai_api_key=openai_key)
     
     # 2. Create the Agent - we give it a 'brain' (the LLM) and 'tools' (search the web, read a website).
     # 'create_react_agent' automatically loops through: Thought -> Action (Tool) -> Observation -> Repeat!
-    agent_executor = create_react_agent(llm, tools=[search, scrape_website])
-    
-    # Get the latest question the user asked
-    question = messages[-1].content
-    
-    history_msgs = messages[-5:-1] if len(messages) > 1 else []
-    conversation_history = ""
-    if history_msgs:
-        history_str = "\n".join([f"{msg.type}: {msg.content}" for msg in history_msgs])
-        conversation_history = f"Recent Conversation:\n{history_str}\n"
+    # (Imported here, not at the top: it loads LangChain's model classes, which take seconds to import.
+    # The background warm-up usually has it loaded before the first question - see preload() in workflow.py)
+    from langgraph.prebuilt import create_react_agent
+    # checkpointer=False: the tool loop is scratch work, only the conversation itself is checkpointed
+    agent_executor = create_react_agent(llm, tools=[search, scrape_website, scrape_websites], checkpointer=False)
 
     system_prompt = SystemMessage(content=f"""You are a helpful AI research assistant.
 You have tools to search the web (DuckDuckGo) and scrape specific URLs. 
 If the user provides a specific link, you should ALWAYS use the scrape_website tool to read it first before answering.
+If you need to read several links, use scrape_websites with all of them in one call - it reads them in parallel.
 If search results are missing, failed, or irrelevant, fallback to your own general knowledge.
 
 {conversation_history}""")
@@ -143,4 +240,7 @@ If search results are missing, failed, or irrelevant, fallback to your own gener
     result = agent_executor.invoke(inputs)
     
     # Return the final message
-    return {"messages": [result["messages"][-1]]}
+    answer = result["messages"][-1]
+    if isinstance(answer.content, str) and answer.content:
+        cache.store("researcher_agent", question, answer.content, cache_context)
+    return {"messages": [answer]}
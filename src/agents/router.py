@@ -0,0 +1,173 @@
+import re
+import threading
+import numpy as np
+from src.utils import telemetry
+
+# Example questions for each worker. New questions are compared against these with the
+# MiniLM embedding model; add more examples here to make local routing smarter.
+ROUTE_EXEMPLARS = {
+    "document_agent": [
+        "What is this document about?",
+        "Summarize the PDF I uploaded",
+        "What does the report say about the results?",
+        "According to the paper, what method was used?",
+        "List the key findings in the text",
+        "What does section 3 of the document explain?",
+        "Give me a summary of the uploaded file",
+        "What are the conclusions of the study in my PDF?",
+        "Explain the table on page 5",
+        "Who are the authors of the paper?",
+        "What does the contract say about termination?",
+        "Find the definition of this term in the document",
+    ],
+    "researcher_agent": [
+        "What is the news today?",
+        "What is the weather in London right now?",
+        "Who won the match yesterday?",
+        "What is the latest version of Python?",
+        "Search the web for recent AI breakthroughs",
+        "What is the current stock price of Apple?",
+        "Who is the president of France?",
+        "Find information about the population of Japan",
+        "What are the top trending topics this week?",
+        "Look up the release date of the new iPhone",
+        "Explain how photosynthesis works",
+        "What happened in the world this morning?",
+    ],
+}
+
+# The best worker must score at least MIN_SIMILARITY and beat the other one by MARGIN,
+# otherwise the question is left to the LLM supervisor. Tune these with get_routing_stats().
+MIN_SIMILARITY = 0.45
+MARGIN = 0.08
+# Follow-up questions depend on earlier turns, so they need a clearer lead to be routed locally
+FOLLOW_UP_MARGIN = 0.15
+# How many nearest examples per worker are averaged into its score
+TOP_K = 3
+
+URL_PATTERN = re.compile(r"https?://|www\.\S+", re.IGNORECASE)
+# Asks for news or the web; together with a document phrase the question needs both workers
+WEB_PHRASE = re.compile(
+    r"\b(news|headlines|current events|on the (web|internet)|online|search the web|right now|this (week|month))\b",
+    re.IGNORECASE,
+)
+# Only wording that says the document is the user's own: "the report" or "this article" may just as well
+# be something on the web, so those are left to the example questions and the LLM
+DOCUMENT_PHRASE = re.compile(
+    r"\b(my|uploaded|attached)\s+(document|doc|pdf|file|paper|report|text|context|contract|article)s?\b",
+    re.IGNORECASE,
+)
+
+
+class LocalRouter:
+    """
+    Decides between the two workers without calling the LLM when the answer is obvious:
+      - a URL in the question -> researcher_agent (it has the scraping tool)
+      - no documents ingested yet -> researcher_agent (even for "my document": there is nothing to read)
+      - "my document" together with "news" / "on the web" style phrasing -> both
+      - "my document" / "the uploaded pdf" style phrasing -> document_agent
+      - otherwise, the nearest example questions decide, if they agree clearly enough
+    route() returns None when unsure, and the supervisor falls back to the LLM.
+    """
+
+    def __init__(self, embed_documents=None, embed_query=None, store_is_empty=None):
+        self._embed_documents = embed_documents
+        self._embed_query = embed_query
+        self._store_is_empty = store_is_empty
+        self._exemplars = None
+        self._lock = threading.Lock()
+        self.stats = {"url": 0, "mixed": 0, "phrase": 0, "empty_store": 0, "embedding": 0, "llm": 0}
+
+    def _embedding_functions(self):
+        if self._embed_documents is None or self._embed_query is None:
+            # Reuse the warm MiniLM model from the RAG resource pool
+            from src.rag.resources import get_embeddings
+            embeddings = get_embeddings()
+            self._embed_documents = self._embed_documents or embeddings.embed_documents
+            self._embed_query = self._embed_query or embeddings.embed_query
+        return self._embed_documents, self._embed_query
+
+    def _exemplar_matrices(self):
+        """Embeds the example questions once, on first use."""
+        if self._exemplars is None:
+            with self._lock:
+                if self._exemplars is None:
+                    embed_documents, _ = self._embedding_functions()
+                    self._exemplars = {
+                        label: _normalize(np.asarray(embed_documents(examples), dtype=np.float32))
+                        for label, examples in ROUTE_EXEMPLARS.items()
+                    }
+        return self._exemplars
+
+    def _is_store_empty(self, namespace):
+        if self._store_is_empty is None:
+            from src.rag.resources import store_is_empty
+            self._store_is_empty = store_is_empty
+        return self._store_is_empty(namespace)
+
+    def scores(self, question):
+        """Returns {worker: similarity} - the mean of the TOP_K closest examples for each worker."""
+        _, embed_query = self._embedding_functions()
+        query = _normalize(np.asarray(embed_query(question), dtype=np.float32))
+        result = {}
+        for label, matrix in self._exemplar_matrices().items():
+            similarities = np.sort(matrix @ query)[::-1][:TOP_K]
+            result[label] = float(similarities.mean())
+        return result
+
+    def route(self, question, has_history=False, namespace=None):
+        """
+        Returns "document_agent", "researcher_agent", "both", or None if the LLM should decide.
+        namespace is whose documents the question is about (None: the shared collection).
+        """
+        with telemetry.span("route:local", kind="routing") as attrs:
+            attrs["decision"] = self._route(question, has_history, namespace)
+        return attrs["decision"]
+
+    def _route(self, question, has_history, namespace):
+        if URL_PATTERN.search(question):
+            return self._hit("url", "researcher_agent")
+        # Without documents there is nothing for the document worker to answer from
+        if self._is_store_empty(namespace):
+            return self._hit("empty_store", "researcher_agent")
+        if DOCUMENT_PHRASE.search(question):
+            if WEB_PHRASE.search(question):
+                return self._hit("mixed", "both")
+            return self._hit("phrase", "document_agent")
+
+        scores = self.scores(question)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+        margin = FOLLOW_UP_MARGIN if has_history else MARGIN
+        if best_score >= MIN_SIMILARITY and best_score - runner_up >= margin:
+            return self._hit("embedding", best)
+
+        self.stats["llm"] += 1
+        return None
+
+    def _hit(self, tier, node):
+        self.stats[tier] += 1
+        return node
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+_router = None
+
+
+def get_router():
+    global _router
+    if _router is None:
+        _router = LocalRouter()
+    return _router
+
+
+def get_routing_stats():
+    """How many questions each routing tier decided, plus the share decided without the LLM."""
+    stats = dict(get_router().stats)
+    total = sum(stats.values())
+    local = total - stats["llm"]
+    return {"counts": stats, "total": total, "local_hit_rate": local / total if total else 0.0}
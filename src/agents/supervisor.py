@@ -1,14 +1,20 @@
 from typing import Annotated, Literal
-import operator
+from langgraph.graph.message import add_messages
 from typing_extensions import TypedDict
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
+from src.agents.memory import api_keys
+from src.agents.router import get_router
+from src.rag import namespaces
+from src.rag.manifest import store_revision
+from src.rag.resources import collection_dir
 from src.utils.llm_factory import get_llm
+from src.utils.response_cache import get_response_cache
 
 class AgentState(TypedDict):
-    messages: Annotated[list, operator.add]
+    messages: Annotated[list, add_messages]
+    history: str
     model_choice: str
     gemini_key: str
     openai_key: str
@@ -16,34 +22,50 @@ class AgentState(TypedDict):
 
 # Pydantic model for structured output routing
 class RouteSchema(BaseModel):
-    next_node: Literal["document_agent", "researcher_agent"] = Field(
-        description="The next agent to route the query to."
+    next_node: Literal["document_agent", "researcher_agent", "both"] = Field(
+        description="The next agent to route the query to, or 'both' if the query needs the documents and the web."
     )
 
-def supervisor_node(state: AgentState):
+def supervisor_node(state: AgentState, config=None):
     """Analyzes the user request and routes it to the appropriate worker agent."""
     messages = state["messages"]
     model_choice = state.get("model_choice", "Gemini 2.5 Flash")
-    gemini_key = state.get("gemini_key")
-    openai_key = state.get("openai_key")
+    gemini_key, openai_key = api_keys(state, config)
     
+    question = messages[-1].content
+    
+    # Summary + recent messages, built once per turn by the memory node
+    conversation_history = state.get("history", "")
+
+    namespace = namespaces.from_config(config)
+
+    # Obvious cases (a URL, "my document", nothing ingested yet, or a close match with known
+    # example questions) are routed locally in milliseconds instead of asking the LLM. These run
+    # before the cache: they look at the store as it is now, which a cached decision can't know.
+    local_decision = get_router().route(question, has_history=bool(conversation_history), namespace=namespace)
+    if local_decision is not None:
+        return {"next_agent": local_decision}
+
+    # A question like this one was routed before - reuse that decision. The namespace and the store
+    # revision are part of the key (as for the document agent), so a decision made for another
+    # session's documents, or before the last ingest, is not reused.
+    cache = get_response_cache()
+    cache_context = f"{namespace}\n{conversation_history}"
+    revision = store_revision(collection_dir(namespace))
+    cached = cache.lookup("supervisor", question, cache_context, revision)
+    if cached is not None:
+        return {"next_agent": cached}
+
     # Initialize LLM inside the node so it matches the state's choice and keys
     llm = get_llm(model_choice, temperature=0.0, google_api_key=gemini_key, openai_api_key=openai_key)
     router_llm = llm.with_structured_output(RouteSchema)
-    
-    question = messages[-1].content
-    
-    history_msgs = messages[-5:-1] if len(messages) > 1 else []
-    conversation_history = ""
-    if history_msgs:
-        history_str = "\n".join([f"{msg.type}: {msg.content}" for msg in history_msgs])
-        conversation_history = f"Recent Conversation:\n{history_str}\n"
 
     prompt = f"""You are the supervisor of a research assistant system. Your job is to route the user's question to the correct specialist.
     
     Available specialists:
     1. 'document_agent': Use this IF the user is asking about a specific PDF they uploaded, a document provided to you, or asking to summarize "my document", "the given context", or "the text".
     2. 'researcher_agent': Use this IF the question requires up-to-date information, facts from the internet, current events, or general knowledge not contained in a specific local document.
+    3. 'both': Use this ONLY IF the question clearly needs both the user's document and information from the web, for example "compare my PDF with current news". Both specialists then answer in parallel and their answers are combined.
     
     {conversation_history}
     User Query: {question}
@@ -51,6 +73,7 @@ def supervisor_node(state: AgentState):
     
     # Get the routing decision using structured output
     decision = router_llm.invoke(prompt)
+    cache.store("supervisor", question, decision.next_node, cache_context, revision)
     
     # Store the decision in the state so the graph can route
     return {"next_agent": decision.next_node}
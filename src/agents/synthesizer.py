@@ -0,0 +1,55 @@
+from langchain_core.messages import AIMessage
+from src.agents.memory import api_keys
+from src.utils.llm_factory import get_llm
+
+# What the user is told when one of the two workers had no answer in time
+MISSING_BRANCH_NOTES = {
+    "document_agent": "Your documents couldn't be searched in time, so this answer is based on the web only.",
+    "researcher_agent": "The web research didn't finish in time, so this answer is based on your documents only.",
+}
+
+
+def _text(message):
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+def merge_node(state, config=None):
+    """
+    Combines the answers of both workers after a fan-out (the supervisor chose "both"): one from the
+    uploaded documents, one from the web. With both answers the LLM writes a single answer; when a
+    worker missed its deadline or failed, the other answer is returned as it is, with a short note.
+    """
+    answers = state.get("branch_answers") or {}
+    document_answer = answers.get("document_agent")
+    web_answer = answers.get("researcher_agent")
+    # Clear the answers, so a saved conversation doesn't carry them into the next question
+    update = {"branch_answers": None}
+
+    if document_answer is None and web_answer is None:
+        update["messages"] = [AIMessage(content="Sorry, neither your documents nor the web gave an answer in time. Please try again.")]
+        return update
+    if document_answer is None or web_answer is None:
+        missing = "document_agent" if document_answer is None else "researcher_agent"
+        update["messages"] = [AIMessage(content=f"_{MISSING_BRANCH_NOTES[missing]}_\n\n{document_answer or web_answer}")]
+        return update
+
+    question = _text(state["messages"][-1])
+    model_choice = state.get("model_choice", "Gemini 2.5 Flash")
+    gemini_key, openai_key = api_keys(state, config)
+    prompt = f"""You are a helpful research assistant. The user's question needs both their uploaded documents and up-to-date information from the web.
+    Two specialists answered it separately. Combine their answers into one clear answer to the question:
+    compare or connect the two where the question asks for it, say which facts come from the documents and which from the web,
+    and keep the citations ([1], [2], ... for document passages, links for web pages).
+
+    Answer based on the documents:
+    {document_answer}
+
+    Answer based on the web:
+    {web_answer}
+
+    {state.get("history", "")}
+    Question: {question}
+    """
+    llm = get_llm(model_choice, temperature=0.2, google_api_key=gemini_key, openai_api_key=openai_key)
+    update["messages"] = [llm.invoke(prompt)]
+    return update
@@ -0,0 +1,507 @@
+"""
+Headless HTTP API for the research graph, written as a plain ASGI app (no web framework needed):
+
+    uvicorn src.api.server:app --port 8000
+    python -m src.api.server --port 8000
+
+  GET  /health   - is the server up, how busy is it, has warm-up finished (?ready=1 answers 503 until it has)
+  POST /warmup   - loads the LLM libraries, embedding model, vector store and BM25 index now instead of on the first question
+  POST /chat     - answers a question, as one JSON response or as server-sent events ("stream": true)
+  GET  /metrics  - Prometheus metrics (see src/utils/telemetry.py)
+
+A /chat body looks like:
+    {"question": "...", "messages": [{"role": "user" | "assistant", "content": "..."}],
+     "model_choice": "Gemini 2.5 Flash", "gemini_key": "...", "openai_key": "...", "stream": false, "timings": false,
+     "thread_id": "..."}
+"messages" is the earlier conversation and is optional; keys default to GOOGLE_API_KEY / OPENAI_API_KEY.
+With a "thread_id" (any string the client picks, e.g. a UUID) the server remembers the conversation itself
+(see src/graph/checkpointer.py): send only the new "question" each time. One question at a time per thread.
+
+Without IRA_API_KEYS the server is single-tenant: every caller searches the shared collection, and a
+"namespace" in the body is refused. With IRA_API_KEYS="key1=tenant-a,key2=tenant-b,key3=" every /chat
+request needs one of the keys (Authorization: Bearer <key>, or X-API-Key: <key>), and the key decides
+which tenant's documents are searched: the namespace after "=" (ingested with
+python -m src.rag.ingest --namespace ..., see src/rag/namespaces.py), or the shared collection when it
+is empty. A "namespace" in the body, if sent, must be the key's own.
+
+Graph runs block (LLM clients, Chroma, the embedding model), so they run on a bounded thread pool:
+at most IRA_API_WORKERS questions are answered at once and IRA_API_QUEUE more may wait for a worker.
+Beyond that the server answers 429 straight away instead of piling up work, and a request that waited
+IRA_API_QUEUE_TIMEOUT seconds without getting a worker gets 503. Both come with a Retry-After header.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.graph.checkpointer import get_checkpointer
+from src.graph.workflow import conversation_config, create_workflow, preload, stream_events
+from src.rag.resources import NAMESPACE_PATTERN
+from src.utils import telemetry
+
+load_dotenv()
+
+WORKERS = int(os.getenv("IRA_API_WORKERS", "4"))
+MAX_QUEUED = int(os.getenv("IRA_API_QUEUE", "16"))
+QUEUE_TIMEOUT = float(os.getenv("IRA_API_QUEUE_TIMEOUT", "30"))
+# Set IRA_API_WARMUP=0 to skip loading the models when the server starts
+WARM_UP_ON_START = os.getenv("IRA_API_WARMUP", "1").lower() not in ("0", "false", "no")
+DEFAULT_MODEL = "Gemini 2.5 Flash"
+MAX_BODY_BYTES = 1024 * 1024
+MAX_THREAD_ID_CHARS = 128
+# Stream events buffered per request; when a client reads slower than the graph writes, the graph waits
+STREAM_BUFFER = 256
+
+
+def parse_api_keys(value):
+    """Turns IRA_API_KEYS ("key=namespace,..."; an empty namespace is the shared collection) into {key: namespace}."""
+    keys = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        key, separator, namespace = (part.strip() for part in item.partition("="))
+        if not key or not separator or (namespace and not NAMESPACE_PATTERN.fullmatch(namespace)):
+            raise ValueError(f"IRA_API_KEYS entries look like key=namespace (namespace: 1 to 64 letters, digits, '-' or '_'), not {item.strip()!r}")
+        keys[key] = namespace or None
+    return keys
+
+
+# API key -> the namespace its caller searches (None: the shared collection); empty means single-tenant
+API_KEYS = parse_api_keys(os.getenv("IRA_API_KEYS"))
+
+_DONE = object()
+
+
+class Overloaded(Exception):
+    """Raised when a request can't get a worker: 429 (waiting line full) or 503 (waited too long)."""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AccessDenied(Exception):
+    """Raised when a /chat request may not search the documents it asks for: 401 (no valid key) or 403."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def request_namespace(headers, body, api_keys):
+    """
+    The namespace a /chat request searches (None: the shared collection), from its API key, never from
+    the body alone: anyone can write any namespace there. Raises AccessDenied.
+    """
+    asked = body.get("namespace") if isinstance(body, dict) else None
+    if not api_keys:
+        if asked is not None:
+            raise AccessDenied(403, 'This server is single-tenant: "namespace" needs IRA_API_KEYS to be set')
+        return None
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    key = authorization[7:].strip() if authorization[:7].lower() == "bearer " else headers.get(b"x-api-key", b"").decode("latin-1")
+    # compare_digest against every key, so the time taken doesn't tell how much of a key was right
+    matches = [namespace for known, namespace in api_keys.items() if hmac.compare_digest(known.encode(), key.encode())]
+    if not key or not matches:
+        raise AccessDenied(401, "Send a valid API key (Authorization: Bearer <key>)")
+    if asked is not None and asked != matches[0]:
+        raise AccessDenied(403, "This API key can't search that namespace")
+    return matches[0]
+
+
+class WorkerPool:
+    """A fixed number of threads for graph runs, with a bounded waiting line in front of them."""
+
+    def __init__(self, workers=WORKERS, max_queued=MAX_QUEUED, queue_timeout=QUEUE_TIMEOUT):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ira-graph")
+        self._slots = asyncio.Semaphore(workers)
+        # Only touched from the event loop, so no lock is needed
+        self.running = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._slots.locked() and self.waiting >= self.max_queued:
+            raise Overloaded(429, "Too many requests are waiting, try again shortly", retry_after=1)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(503, "No worker became free in time, try again shortly", retry_after=5) from None
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {"workers": self.workers, "running": self.running, "queued": self.waiting, "max_queued": self.max_queued}
+
+
+def parse_chat_request(body, namespace=None):
+    """
+    Turns a /chat JSON body into the graph's input state and run config (thread ID, API keys and the
+    namespace to search, which comes from request_namespace()). Raises ValueError if the body is not valid.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("The body must be a JSON object")
+    thread_id = body.get("thread_id")
+    if thread_id is not None:
+        if not isinstance(thread_id, str) or not thread_id.strip() or len(thread_id) > MAX_THREAD_ID_CHARS:
+            raise ValueError(f'"thread_id" must be a non-empty string of at most {MAX_THREAD_ID_CHARS} characters')
+        if body.get("messages"):
+            raise ValueError('With a "thread_id" the server keeps the conversation: send only the new "question"')
+    messages = []
+    for item in body.get("messages") or []:
+        role = item.get("role") if isinstance(item, dict) else None
+        content = item.get("content") if isinstance(item, dict) else None
+        if role not in ("user", "assistant") or not isinstance(content, str):
+            raise ValueError('Every entry of "messages" needs a "role" ("user" or "assistant") and a text "content"')
+        messages.append(HumanMessage(content=content) if role == "user" else AIMessage(content=content))
+    question = body.get("question")
+    if question is not None:
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError('"question" must be a non-empty string')
+        messages.append(HumanMessage(content=question))
+    if not messages or not isinstance(messages[-1], HumanMessage):
+        raise ValueError('Send a "question", or "messages" ending with a user message')
+    inputs = {"messages": messages, "model_choice": body.get("model_choice") or DEFAULT_MODEL}
+    config = conversation_config(
+        thread_id,
+        gemini_key=body.get("gemini_key") or os.environ.get("GOOGLE_API_KEY"),
+        openai_key=body.get("openai_key") or os.environ.get("OPENAI_API_KEY"),
+        namespace=namespace,
+    )
+    return inputs, config
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("The body is too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _drain(events):
+    while await events.get() is not _DONE:
+        pass
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def sse_event(event, data):
+    """One server-sent event; data is sent as JSON on a single line."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+class ResearchAPI:
+    """The ASGI application. Every instance has its own worker pool; `app` below is the default one."""
+
+    def __init__(self, workers=WORKERS, max_queued=MAX_QUEUED, queue_timeout=QUEUE_TIMEOUT, warm_up_on_start=WARM_UP_ON_START,
+                 api_keys=None):
+        self.pool = WorkerPool(workers, max_queued, queue_timeout)
+        self.warm_up_on_start = warm_up_on_start
+        self.api_keys = API_KEYS if api_keys is None else api_keys
+        self._graph = None
+        self._threaded_graph = None
+        self._graph_lock = threading.Lock()
+        self._busy_threads = set()
+        self._warm_task = None
+        self.warm_seconds = None
+
+    def get_graph(self, threaded=False):
+        """
+        The compiled workflow, built once and shared by all workers. The plain one keeps no state between
+        runs; the threaded one saves every conversation under its thread ID.
+        """
+        if self._graph is None:
+            with self._graph_lock:
+                if self._graph is None:
+                    self._graph = create_workflow()
+                    self._threaded_graph = create_workflow(checkpointer=get_checkpointer())
+        return self._threaded_graph if threaded else self._graph
+
+    def _warm_up_blocking(self):
+        t0 = time.perf_counter()
+        preload()
+        self.get_graph()
+        return time.perf_counter() - t0
+
+    async def warm_up(self):
+        """Runs the warm-up once, off the graph workers; callers arriving meanwhile wait for the same run."""
+        if self._warm_task is None:
+            loop = asyncio.get_running_loop()
+            self._warm_task = asyncio.ensure_future(loop.run_in_executor(None, self._warm_up_blocking))
+        try:
+            self.warm_seconds = await asyncio.shield(self._warm_task)
+        except Exception:
+            # Let the next call try again (for example once the model can be downloaded)
+            self._warm_task = None
+            raise
+        return self.warm_seconds
+
+    @property
+    def is_warm(self):
+        return self.warm_seconds is not None
+
+    # --- running questions ---
+
+    async def run_question(self, inputs, config, receive, on_event):
+        """
+        Answers one question on a worker thread. Each stream event is handed to `await on_event(kind, value)`
+        on the event loop through a small buffer, so a slow client slows the graph down instead of
+        filling memory, and when the client disconnects the run stops after the step in progress
+        (an LLM call that already started can't be interrupted).
+        Returns the telemetry trace of the run.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue(STREAM_BUFFER)
+        cancelled = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(events.put(item), loop).result()
+
+        def work():
+            try:
+                with telemetry.trace("api_chat", model=inputs["model_choice"]) as request_trace:
+                    threaded = config["configurable"].get("thread_id") is not None
+                    stream = stream_events(self.get_graph(threaded), inputs, config)
+                    try:
+                        for event in stream:
+                            if cancelled.is_set():
+                                request_trace.attrs["cancelled"] = True
+                                break
+                            put(event)
+                    finally:
+                        stream.close()
+                return request_trace
+            finally:
+                put((_DONE, None))
+
+        future = loop.run_in_executor(self.pool.executor, work)
+        watcher = asyncio.ensure_future(_wait_for_disconnect(receive))
+        finished = False
+        try:
+            while True:
+                kind, value = await events.get()
+                if kind is _DONE:
+                    finished = True
+                    break
+                if watcher.done():
+                    cancelled.set()
+                if not cancelled.is_set():
+                    await on_event(kind, value)
+        finally:
+            watcher.cancel()
+            if not finished:
+                # Left early (error, or the server is shutting down): let the worker finish without a reader
+                cancelled.set()
+                asyncio.ensure_future(_drain(events))
+        return await future
+
+    async def chat(self, scope, receive, send):
+        try:
+            body = json.loads(await _read_body(receive) or b"{}")
+            namespace = request_namespace(dict(scope["headers"]), body, self.api_keys)
+            inputs, config = parse_chat_request(body, namespace)
+        except AccessDenied as e:
+            await send_json(send, e.status, {"error": str(e)})
+            return
+        except (ValueError, UnicodeDecodeError) as e:
+            await send_json(send, 400, {"error": str(e)})
+            return
+        except ConnectionError:
+            return
+
+        accept = dict(scope["headers"]).get(b"accept", b"").decode("latin-1")
+        streaming = bool(body.get("stream")) or "text/event-stream" in accept
+        thread_id = config["configurable"]["thread_id"]
+        # Two questions answered at once on one thread would both start from the same saved conversation
+        if thread_id is not None:
+            if thread_id in self._busy_threads:
+                await send_json(send, 409, {"error": "This thread is still answering a question"}, [(b"retry-after", b"1")])
+                return
+            self._busy_threads.add(thread_id)
+        try:
+            async with self.pool.slot():
+                if streaming:
+                    await self._chat_stream(inputs, config, receive, send, body.get("timings"))
+                else:
+                    await self._chat_json(inputs, config, receive, send, body.get("timings"))
+        except Overloaded as e:
+            telemetry.metrics.inc("ira_api_rejected_total", 1, "Requests turned away because all workers were busy", status=str(e.status))
+            await send_json(send, e.status, {"error": str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+        finally:
+            self._busy_threads.discard(thread_id)
+
+    async def _chat_json(self, inputs, config, receive, send, timings):
+        nodes = []
+        final = {}
+
+        async def on_event(kind, value):
+            if kind == "node":
+                nodes.append(value)
+            elif kind == "final":
+                final["message"] = value
+
+        try:
+            request_trace = await self.run_question(inputs, config, receive, on_event)
+        except Exception as e:
+            await send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        message = final.get("message")
+        if message is None:
+            await send_json(send, 500, {"error": "The assistant didn't return an answer"})
+            return
+        payload = {"answer": message.content, "nodes": nodes, "trace_id": request_trace.trace_id,
+                   "duration_ms": round(request_trace.duration * 1e3, 2)}
+        if config["configurable"]["thread_id"] is not None:
+            payload["thread_id"] = config["configurable"]["thread_id"]
+        if timings:
+            payload["timings"] = request_trace.breakdown()
+        await send_json(send, 200, payload)
+
+    async def _chat_stream(self, inputs, config, receive, send, timings):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no")]})
+        final = {}
+
+        async def on_event(kind, value):
+            if kind == "node":
+                await send({"type": "http.response.body", "body": sse_event("node", {"name": value}), "more_body": True})
+            elif kind == "token":
+                await send({"type": "http.response.body", "body": sse_event("token", {"text": value}), "more_body": True})
+            elif kind == "final":
+                final["message"] = value
+
+        try:
+            request_trace = await self.run_question(inputs, config, receive, on_event)
+            message = final.get("message")
+            if message is None:
+                last = sse_event("error", {"error": "The assistant didn't return an answer"})
+            else:
+                payload = {"answer": message.content, "trace_id": request_trace.trace_id,
+                           "duration_ms": round(request_trace.duration * 1e3, 2)}
+                if config["configurable"]["thread_id"] is not None:
+                    payload["thread_id"] = config["configurable"]["thread_id"]
+                if timings:
+                    payload["timings"] = request_trace.breakdown()
+                last = sse_event("final", payload)
+        except Exception as e:
+            last = sse_event("error", {"error": f"{type(e).__name__}: {e}"})
+        await send({"type": "http.response.body", "body": last, "more_body": False})
+
+    # --- the other endpoints ---
+
+    async def health(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        payload = {"status": "ok", "warm": self.is_warm, **self.pool.stats()}
+        ready_check = query.get("ready", ["0"])[0] not in ("0", "false", "")
+        await send_json(send, 503 if ready_check and not self.is_warm else 200, payload)
+
+    async def warmup(self, scope, receive, send):
+        try:
+            seconds = await self.warm_up()
+        except Exception as e:
+            await send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        await send_json(send, 200, {"status": "warm", "seconds": round(seconds, 3)})
+
+    async def metrics(self, scope, receive, send):
+        body = telemetry.render_prometheus().encode("utf-8")
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def lifespan(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.warm_up_on_start:
+                    # In the background: the server accepts requests (and /health) right away
+                    asyncio.ensure_future(self._warm_up_quietly())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.pool.executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _warm_up_quietly(self):
+        try:
+            seconds = await self.warm_up()
+            print(f"Warm-up finished in {seconds:.1f}s")
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+
+    ROUTES = {
+        ("GET", "/health"): "health",
+        ("POST", "/warmup"): "warmup",
+        ("POST", "/chat"): "chat",
+        ("GET", "/metrics"): "metrics",
+    }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        handler = self.ROUTES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if handler is None:
+            known = {path for _, path in self.ROUTES}
+            status = 405 if scope["path"].rstrip("/") in known else 404
+            await send_json(send, status, {"error": "Method not allowed" if status == 405 else "Not found"})
+            return
+        await getattr(self, handler)(scope, receive, send)
+
+
+app = ResearchAPI()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the research graph over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+CHECKPOINT_PATH = os.getenv("IRA_CHECKPOINT_PATH", os.path.join(".cache", "checkpoints.sqlite"))
+# Checkpoints kept per conversation; older ones are never needed because we don't go back in time
+KEEP_CHECKPOINTS = 2
+# Conversations nobody continued for this long (seconds) are deleted
+THREAD_TTL = 7 * 24 * 3600
+# Expired conversations are looked for once every this many saved checkpoints
+PRUNE_EVERY = 200
+# LangGraph copies the run config's values into the checkpoint metadata; these must never be written to disk
+SECRET_CONFIG_KEYS = ("gemini_key", "openai_key")
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """
+    Saves LangGraph checkpoints (the graph state after every step) in one SQLite file, keyed by
+    thread ID. A conversation then continues where it left off, also after a restart, and callers
+    send only the new message instead of the whole history.
+
+    Unlike a general-purpose checkpointer it keeps only the last KEEP_CHECKPOINTS checkpoints of a
+    conversation and forgets conversations after THREAD_TTL, so the file stays small however long
+    people chat.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, keep=KEEP_CHECKPOINTS, thread_ttl=THREAD_TTL, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep = keep
+        self.thread_ttl = thread_ttl
+        self._local = threading.local()
+        self._puts = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT, ns TEXT, id TEXT, parent_id TEXT, type TEXT, checkpoint BLOB,
+                metadata_type TEXT, metadata BLOB, versions TEXT, updated_at REAL,
+                PRIMARY KEY (thread_id, ns, id))"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT, ns TEXT, channel TEXT, version TEXT, type TEXT, value BLOB,
+                PRIMARY KEY (thread_id, ns, channel, version))"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT, ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER, channel TEXT,
+                type TEXT, value BLOB, task_path TEXT,
+                PRIMARY KEY (thread_id, ns, checkpoint_id, task_id, idx))"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints (updated_at)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # --- reading ---
+
+    def _tuple(self, thread_id, ns, row):
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata, versions = row
+        conn = self._conn()
+        channel_values = {}
+        for channel, version in json.loads(versions).items():
+            blob = conn.execute(
+                "SELECT type, value FROM blobs WHERE thread_id = ? AND ns = ? AND channel = ? AND version = ?",
+                (thread_id, ns, channel, str(version))).fetchone()
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed((blob[0], blob[1]))
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx", (thread_id, ns, checkpoint_id)).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**self.serde.loads_typed((type_, checkpoint)), "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "id, parent_id, type, checkpoint, metadata_type, metadata, versions"
+        if checkpoint_id := get_checkpoint_id(config):
+            row = self._conn().execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND ns = ? AND id = ?",
+                (thread_id, ns, checkpoint_id)).fetchone()
+        else:
+            row = self._conn().execute(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND ns = ? ORDER BY id DESC LIMIT 1",
+                (thread_id, ns)).fetchone()
+        return self._tuple(thread_id, ns, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = "SELECT thread_id, ns, id, parent_id, type, checkpoint, metadata_type, metadata, versions FROM checkpoints"
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                conditions.append("ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append("id < ?")
+            params.append(before_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self._conn().execute(query + " ORDER BY id DESC", params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            thread_id, ns = row[0], row[1]
+            metadata = self.serde.loads_typed((row[6], row[7]))
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield self._tuple(thread_id, ns, row[2:])
+
+    # --- writing ---
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+        conn = self._conn()
+        type_, data = self.serde.dumps_typed(checkpoint)
+        metadata = {key: value for key, value in get_checkpoint_metadata(config, metadata).items()
+                    if key not in SECRET_CONFIG_KEYS}
+        metadata_type, metadata_data = self.serde.dumps_typed(metadata)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for channel, version in new_versions.items():
+                blob_type, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+                conn.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                             (thread_id, ns, channel, str(version), blob_type, blob))
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"), type_, data,
+                 metadata_type, metadata_data, json.dumps({k: str(v) for k, v in checkpoint["channel_versions"].items()}),
+                 time.time()))
+            self._prune_thread(conn, thread_id, ns)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._puts += 1
+        if self._puts % PRUNE_EVERY == 0:
+            self.prune_expired()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def _prune_thread(self, conn, thread_id, ns):
+        """Drops all but the newest `keep` checkpoints of a thread, with their writes and unused blobs."""
+        old = [row[0] for row in conn.execute(
+            "SELECT id FROM checkpoints WHERE thread_id = ? AND ns = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (thread_id, ns, self.keep))]
+        if not old:
+            return
+        conn.executemany("DELETE FROM checkpoints WHERE thread_id = ? AND ns = ? AND id = ?",
+                         [(thread_id, ns, checkpoint_id) for checkpoint_id in old])
+        conn.executemany("DELETE FROM writes WHERE thread_id = ? AND ns = ? AND checkpoint_id = ?",
+                         [(thread_id, ns, checkpoint_id) for checkpoint_id in old])
+        used = set()
+        for (versions,) in conn.execute("SELECT versions FROM checkpoints WHERE thread_id = ? AND ns = ?", (thread_id, ns)):
+            used.update(json.loads(versions).items())
+        stale = [(thread_id, ns, channel, version) for channel, version in conn.execute(
+            "SELECT channel, version FROM blobs WHERE thread_id = ? AND ns = ?", (thread_id, ns))
+            if (channel, version) not in used]
+        conn.executemany("DELETE FROM blobs WHERE thread_id = ? AND ns = ? AND channel = ? AND version = ?", stale)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, data = self.serde.dumps_typed(value)
+            rows.append((thread_id, ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, value_type, data, task_path))
+        # Regular writes are stored once; special ones (errors, interrupts) replace the earlier value
+        if all(WRITES_IDX_MAP.get(channel, 0) >= 0 for channel, _ in writes):
+            sql = "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        else:
+            sql = "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        self._conn().executemany(sql, rows)
+
+    def delete_thread(self, thread_id):
+        conn = self._conn()
+        for table in ("checkpoints", "blobs", "writes"):
+            conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def prune_expired(self):
+        """Deletes conversations that nobody continued within thread_ttl."""
+        cutoff = time.time() - self.thread_ttl
+        expired = [row[0] for row in self._conn().execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?", (cutoff,))]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        return len(expired)
+
+    def get_next_version(self, current, channel):
+        # Same scheme as LangGraph's in-memory saver: a zero-padded counter (so versions sort) plus a random part
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # The async API (ainvoke / astream) uses the same SQLite calls; they are short
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        self.delete_thread(thread_id)
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """Returns the shared conversation checkpointer."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SqliteCheckpointer()
+    return _checkpointer
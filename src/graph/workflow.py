@@ -1,55 +1,247 @@
+import contextvars
+import os
+import threading
+import time
 from typing import Annotated, Literal, TypedDict
-import operator
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables.config import merge_configs, var_child_runnable_config
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from src.utils import telemetry
 
 # Import the nodes
+from src.agents.memory import memory_node
 from src.agents.supervisor import supervisor_node
 from src.agents.document_agent import document_node
 from src.agents.researcher import researcher_node
+from src.agents.synthesizer import merge_node
+
+# When both workers answer one question, each gets this many seconds; a worker that takes longer is
+# left out of the merged answer instead of holding it up
+BRANCH_DEADLINE = float(os.getenv("IRA_BRANCH_DEADLINE", "60"))
+
+
+def _collect_branches(current, update):
+    """Reducer for branch_answers: both workers add their answer in the same step; None clears them."""
+    if update is None:
+        return {}
+    return {**(current or {}), **update}
 
 # Define the overall state for the graph
 class GraphState(TypedDict):
-    messages: Annotated[list, operator.add]
-    next_agent: str # Used by supervisor to route
+    # add_messages appends new messages and lets the memory node remove old ones (by message ID)
+    messages: Annotated[list, add_messages]
+    summary: str # Rolling summary of the messages that were folded away
+    history: str # Summary + recent messages as prompt text, built once per turn by the memory node
+    next_agent: str # Used by supervisor to route: "document_agent", "researcher_agent" or "both"
+    branch_answers: Annotated[dict, _collect_branches] # Worker name -> answer text (None if it missed its deadline), for the merge node
     model_choice: str # The user selected LLM
+    # Old callers put the API keys here; conversation_config() passes them in the run config instead,
+    # so they are never written into a checkpoint
     gemini_key: str
     openai_key: str
 
 
-def router(state: GraphState) -> Literal["document_agent", "researcher_agent"]:
-    """Routing function that reads the supervisor's decision."""
+def router(state: GraphState):
+    """Routing function that reads the supervisor's decision. "both" starts the two workers in parallel."""
+    if state["next_agent"] == "both":
+        return ["document_agent", "researcher_agent"]
     return state["next_agent"]
 
-def create_workflow():
-    """Builds and compiles the LangGraph workflow."""
+
+def after_worker(state: GraphState) -> Literal["merge", "__end__"]:
+    """After a fan-out both workers go on to the merge node (which runs once, when both are done)."""
+    return "merge" if state.get("next_agent") == "both" else END
+
+
+class BranchCancelled(Exception):
+    """Raised inside a fan-out worker that is past its BRANCH_DEADLINE, at its next LLM, tool or retriever call."""
+
+
+class _DeadlineCallbackHandler(BaseCallbackHandler):
+    """
+    Stops a late fan-out worker: every LLM, tool and retriever call it starts (and every token it streams)
+    first checks the deadline and raises BranchCancelled past it. raise_error makes LangChain pass the
+    exception on instead of only logging it.
+    """
+    raise_error = True
+
+    def __init__(self, name, deadline):
+        self.name = name
+        self.deadline = deadline
+
+    def _check(self, *args, **kwargs):
+        if time.perf_counter() > self.deadline:
+            raise BranchCancelled(f"{self.name} is past its {BRANCH_DEADLINE:g}s deadline")
+
+    on_chat_model_start = on_llm_start = on_llm_new_token = on_tool_start = on_retriever_start = _check
+
+
+def fan_out_branch(name, node):
+    """
+    Wraps a worker node for fan-out. On its own it runs as usual. When the supervisor chose "both",
+    it runs on a helper thread with BRANCH_DEADLINE, and its answer goes to branch_answers for the
+    merge node instead of into the conversation. A worker that is too slow or fails gives None there,
+    so the other worker's answer is still used. A late worker is stopped at its next LLM, tool or
+    retriever call (or streamed token), so it doesn't keep using the provider after it was given up on.
+    """
+    def run(state, config):
+        if state.get("next_agent") != "both":
+            return node(state, config)
+
+        outcome = {}
+        started = time.perf_counter()
+        branch_config = merge_configs(config, {"callbacks": [_DeadlineCallbackHandler(name, started + BRANCH_DEADLINE)]})
+
+        def work():
+            # The workers call their LLMs without passing the config on; those calls pick up the
+            # callbacks from here instead
+            var_child_runnable_config.set(branch_config)
+            try:
+                outcome["update"] = node(state, branch_config)
+            except Exception as e:
+                outcome["error"] = e
+
+        # copy_context() keeps the run's callbacks (streaming, telemetry) working on the helper thread
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(work,), name=f"fan-out-{name}", daemon=True)
+        thread.start()
+        thread.join(BRANCH_DEADLINE)
+
+        answer = None
+        if thread.is_alive():
+            print(f"{name} missed its {BRANCH_DEADLINE:g}s deadline; answering without it.")
+        elif "error" in outcome:
+            print(f"{name} failed ({outcome['error']}); answering without it.")
+        elif outcome["update"].get("messages"):
+            message = outcome["update"]["messages"][-1]
+            answer = message.content if isinstance(message.content, str) else str(message.content)
+        telemetry.metrics.observe("ira_fan_out_branch_seconds", time.perf_counter() - started,
+                                  "Time of each worker when both answer one question", node=name, answered=str(answer is not None))
+        return {"branch_answers": {name: answer}}
+
+    return run
+
+
+def create_workflow(checkpointer=None):
+    """
+    Builds and compiles the LangGraph workflow.
+
+    With a checkpointer (see get_checkpointer() in src/graph/checkpointer.py) the conversation is stored
+    per thread ID: run it with conversation_config(thread_id, ...) and send only the new message.
+    Without one, every run starts from the messages it is given.
+    """
     
     # Initialize the graph
     workflow = StateGraph(GraphState)
     
     # Add nodes
+    workflow.add_node("memory", memory_node)
     workflow.add_node("supervisor", supervisor_node)
-    workflow.add_node("document_agent", document_node)
-    workflow.add_node("researcher_agent", researcher_node)
+    workflow.add_node("document_agent", fan_out_branch("document_agent", document_node))
+    workflow.add_node("researcher_agent", fan_out_branch("researcher_agent", researcher_node))
+    workflow.add_node("merge", merge_node)
     
     # Define the edges
-    # Start at the supervisor
-    workflow.add_edge(START, "supervisor")
+    # Start by bounding the conversation and building its history text, then go to the supervisor
+    workflow.add_edge(START, "memory")
+    workflow.add_edge("memory", "supervisor")
     
     # Add conditional edges from supervisor to the workers based on router function
+    # (to one of them, or to both at once for questions that need the documents and the web)
     workflow.add_conditional_edges(
         "supervisor",
         router,
-        {
-            "document_agent": "document_agent",
-            "researcher_agent": "researcher_agent"
-        }
+        ["document_agent", "researcher_agent"]
     )
     
-    # Both workers lead to the END
-    workflow.add_edge("document_agent", END)
-    workflow.add_edge("researcher_agent", END)
+    # A single worker leads to the END; after a fan-out both lead to the merge node, then to the END
+    workflow.add_conditional_edges("document_agent", after_worker)
+    workflow.add_conditional_edges("researcher_agent", after_worker)
+    workflow.add_edge("merge", END)
     
     # Compile the graph
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
     
     return app
+
+
+def conversation_config(thread_id, gemini_key=None, openai_key=None, namespace=None):
+    """
+    The run config for one conversation: its thread ID, the API keys (kept out of the checkpoints),
+    and the namespace whose documents it searches (None: the shared collection).
+    """
+    return {"configurable": {"thread_id": thread_id, "gemini_key": gemini_key, "openai_key": openai_key,
+                             "namespace": namespace}}
+
+
+def preload():
+    """
+    Loads everything the first answer needs but showing the app doesn't: LangGraph's prebuilt agent,
+    the LLM provider SDKs, the embedding model and the vector store. Slow (seconds), so run it on a
+    background thread at startup; the modules above import none of this at the top.
+    """
+    import langgraph.prebuilt  # noqa: F401
+    from src.rag.resources import warm_up
+    from src.utils.llm_factory import preload_providers
+
+    preload_providers()
+    warm_up()
+
+
+# Only the workers (or, after a fan-out, the merge node) write the answer; the supervisor's LLM call
+# is a routing decision and is not shown
+ANSWER_NODES = {"document_agent", "researcher_agent", "merge"}
+
+
+def _chunk_text(chunk):
+    """Returns the plain text of a streamed message chunk (some models send a list of content blocks)."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if isinstance(block, dict))
+
+
+def stream_events(app, inputs, config=None):
+    """
+    Runs the compiled workflow and yields events as they happen, instead of waiting for the end:
+      ("node", name)     - a step finished ("memory", "supervisor", "document_agent", "researcher_agent", "merge",
+                           or "tools" inside the researcher)
+      ("token", text)    - the next piece of the answer, as the LLM writes it
+      ("final", message) - the complete answer message (also sent when nothing was streamed, e.g. a cached answer)
+    """
+    final_message = None
+    # After a fan-out only the merged answer is streamed, not the two workers' answers mixed together
+    fan_out = False
+    # Time every node, tool, LLM and retriever call (into the caller's telemetry trace, if it opened one)
+    config = dict(config or {})
+    callbacks = config.get("callbacks") or []
+    if isinstance(callbacks, list):
+        config["callbacks"] = callbacks + [telemetry.callback_handler()]
+    # subgraphs=True also streams from inside the researcher's ReAct agent, which runs as a graph of its own
+    for namespace, mode, chunk in app.stream(inputs, config=config, stream_mode=["updates", "messages"], subgraphs=True):
+        if mode == "messages":
+            message, metadata = chunk
+            top_node = metadata.get("langgraph_checkpoint_ns", "").split(":")[0]
+            if top_node not in ANSWER_NODES or not isinstance(message, AIMessageChunk):
+                continue
+            if fan_out and top_node != "merge":
+                continue
+            # Inside the ReAct agent, only the model's own text is part of the answer (not tool calls)
+            if namespace and metadata.get("langgraph_node") != "agent":
+                continue
+            text = _chunk_text(message)
+            if text:
+                yield "token", text
+        else:
+            for node, update in chunk.items():
+                if namespace:
+                    if node == "tools":
+                        yield "node", "tools"
+                    continue
+                yield "node", node
+                if node == "supervisor" and update:
+                    fan_out = update.get("next_agent") == "both"
+                if node in ANSWER_NODES and update and update.get("messages"):
+                    final_message = update["messages"][-1]
+    yield "final", final_message
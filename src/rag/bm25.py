@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import hashlib
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+from src.rag.resources import DB_DIR
+
+BM25_NAME = "bm25.idx"
+# The shared collection's index; every namespace has its own file in its collection directory
+BM25_PATH = os.path.join(DB_DIR, BM25_NAME)
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# The index is a single file: an 8 byte magic, a 4 byte header length, a JSON header describing
+# the arrays, then the raw arrays (8 byte aligned) so they can be used straight from a memory map:
+#   term_hashes  uint64 (V,)   64-bit hash of every term, sorted
+#   offsets      int64  (V+1,) postings of term i are postings[offsets[i]:offsets[i+1]]
+#   postings     int32  (P,)   document numbers
+#   tfs          uint16 (P,)   how often the term appears in that document
+#   doc_len      int32  (N,)   number of terms in each document
+#   doc_ids      bytes  (N,)   the chunk ID of each document (same IDs as in the vector store)
+MAGIC = b"IRABM25\x01"
+ALIGN = 8
+
+# Words like "the" or "of" match everything and only slow the search down
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were what when "
+    "where which who why will with how do does did can you your i me my we our".split()
+)
+# Identifiers like "XR-200", "v2.1" or "snake_case" are kept whole (and their parts are indexed too)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+SPLIT_PATTERN = re.compile(r"[._\-/]")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        tokens.append(token)
+        parts = SPLIT_PATTERN.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part and part not in STOP_WORDS)
+    return tokens
+
+
+@lru_cache(maxsize=200_000)
+def term_hash(term):
+    # A stable 64-bit hash (Python's own hash() changes between processes), so no vocabulary has to be stored
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _term_counts(text):
+    """Returns (unique term hashes, their counts, document length) for one chunk of text."""
+    counts = Counter(term_hash(t) for t in tokenize(text))
+    if not counts:
+        return np.empty(0, np.uint64), np.empty(0, np.uint16), 0
+    hashes = np.fromiter(counts.keys(), dtype=np.uint64, count=len(counts))
+    tfs = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    return hashes, np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16), int(tfs.sum())
+
+
+class BM25Index:
+    """
+    A read-only BM25 (keyword) index over the ingested chunks, loaded from BM25_PATH with a memory map:
+    opening it costs almost nothing, and only the postings of the query's terms are ever read from disk.
+    """
+
+    def __init__(self, arrays, k1=K1, b=B):
+        self.term_hashes = arrays["term_hashes"]
+        self.offsets = arrays["offsets"]
+        self.postings = arrays["postings"]
+        self.tfs = arrays["tfs"]
+        self.doc_len = arrays["doc_len"]
+        self.doc_ids = arrays["doc_ids"]
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def load(cls, path=BM25_PATH):
+        """Opens the index file, or returns None if there isn't one (or it can't be read)."""
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.memmap(path, dtype=np.uint8, mode="r")
+            if bytes(data[:len(MAGIC)]) != MAGIC:
+                raise ValueError("not a BM25 index file")
+            header_len = int(data[len(MAGIC):len(MAGIC) + 4].view(np.uint32)[0])
+            start = len(MAGIC) + 4
+            header = json.loads(bytes(data[start:start + header_len]))
+            data_start = _aligned(start + header_len)
+            arrays = {}
+            for name, (dtype, length, offset) in header["arrays"].items():
+                dtype = np.dtype(dtype)
+                offset += data_start
+                arrays[name] = data[offset:offset + dtype.itemsize * length].view(dtype)
+            return cls(arrays, **header.get("params", {}))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable BM25 index ({e}).")
+            return None
+
+    def search(self, query, k=10):
+        """Returns up to k (chunk_id, score) pairs, best first."""
+        if not len(self.doc_ids) or not len(self.term_hashes):
+            return []
+        query_hashes = np.unique(np.fromiter((term_hash(t) for t in tokenize(query)), dtype=np.uint64))
+        if not len(query_hashes):
+            return []
+        positions = np.searchsorted(self.term_hashes, query_hashes)
+        positions = positions[positions < len(self.term_hashes)]
+        positions = positions[np.isin(self.term_hashes[positions], query_hashes)]
+
+        n_docs = len(self.doc_ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for position in positions:
+            start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+            docs = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.doc_ids[i].decode("ascii"), float(scores[i])) for i in matched]
+
+
+class BM25Writer:
+    """
+    Collects the changes of one ingest run and merges them into the index file in one go.
+
+    Chunks are tokenized as soon as they are added, so only compact term-hash arrays are kept
+    in memory (never the chunk text). commit() folds the existing index, minus deleted or
+    re-written chunks, together with the new ones and atomically replaces the file.
+    """
+
+    def __init__(self, path=BM25_PATH):
+        self.path = path
+        self._added = {}
+        self._deleted = set()
+
+    def __bool__(self):
+        return bool(self._added or self._deleted)
+
+    def add(self, chunk_ids, texts):
+        for cid, text in zip(chunk_ids, texts):
+            self._deleted.discard(cid)
+            self._added[cid] = _term_counts(text)
+
+    def delete(self, chunk_ids):
+        for cid in chunk_ids:
+            self._added.pop(cid, None)
+            self._deleted.add(cid)
+
+    def backfill(self, vectorstore, page_size=5000):
+        """Indexes every chunk already in the vector store (for stores built before the BM25 index existed)."""
+        offset = 0
+        while True:
+            batch = vectorstore.get(include=["documents"], limit=page_size, offset=offset)
+            if not batch["ids"]:
+                break
+            self.add(batch["ids"], [text or "" for text in batch["documents"]])
+            offset += len(batch["ids"])
+
+    def commit(self):
+        """Writes the merged index. Returns the number of documents in it."""
+        old = BM25Index.load(self.path)
+        term_parts, doc_parts, tf_parts = [], [], []
+        doc_ids, doc_len = [], []
+
+        if old is not None and len(old):
+            # Expand the old postings back into (term, doc, tf) triples, keeping only untouched documents
+            removed = np.array(sorted(self._deleted | set(self._added)), dtype=old.doc_ids.dtype)
+            keep = ~np.isin(old.doc_ids, removed) if len(removed) else np.ones(len(old), dtype=bool)
+            renumber = np.cumsum(keep) - 1
+            terms = np.repeat(np.asarray(old.term_hashes), np.diff(np.asarray(old.offsets)))
+            keep_posting = keep[old.postings]
+            term_parts.append(terms[keep_posting])
+            doc_parts.append(renumber[old.postings[keep_posting]].astype(np.int32))
+            tf_parts.append(np.asarray(old.tfs)[keep_posting])
+            doc_ids.extend(old.doc_ids[keep].astype(object))
+            doc_len.append(np.asarray(old.doc_len)[keep])
+            del old
+
+        next_doc = len(doc_ids)
+        new_len = []
+        for cid, (hashes, tfs, length) in self._added.items():
+            term_parts.append(hashes)
+            doc_parts.append(np.full(len(hashes), next_doc, dtype=np.int32))
+            tf_parts.append(tfs)
+            doc_ids.append(cid.encode("ascii"))
+            new_len.append(length)
+            next_doc += 1
+        doc_len.append(np.array(new_len, dtype=np.int32))
+
+        terms = np.concatenate(term_parts) if term_parts else np.empty(0, np.uint64)
+        docs = np.concatenate(doc_parts) if doc_parts else np.empty(0, np.int32)
+        tfs = np.concatenate(tf_parts) if tf_parts else np.empty(0, np.uint16)
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        unique_terms, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+
+        id_width = max((len(cid) for cid in doc_ids), default=1)
+        arrays = {
+            "term_hashes": unique_terms.astype(np.uint64),
+            "offsets": offsets,
+            "postings": docs.astype(np.int32),
+            "tfs": tfs.astype(np.uint16),
+            "doc_len": np.concatenate(doc_len).astype(np.int32),
+            "doc_ids": np.array(doc_ids, dtype=f"S{id_width}"),
+        }
+        self._write(arrays)
+        self._added.clear()
+        self._deleted.clear()
+        return len(arrays["doc_ids"])
+
+    def _write(self, arrays):
+        # Array offsets are relative to the (aligned) end of the header
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            layout[name] = [array.dtype.str, len(array), offset]
+            offset += _aligned(array.nbytes)
+        header = json.dumps({"arrays": layout, "params": {"k1": K1, "b": B}}).encode("utf-8")
+        data_start = _aligned(len(MAGIC) + 4 + len(header))
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.uint32(len(header)).tobytes())
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name][2])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+        # os.replace is atomic: readers see either the old index or the new one, never half of it
+        os.replace(tmp_path, self.path)
+
+
+def _aligned(size):
+    return -(-size // ALIGN) * ALIGN
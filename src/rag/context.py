@@ -0,0 +1,176 @@
+import re
+from langchain_core.documents import Document
+
+# Roughly how many tokens of document context go into the prompt (instructions and history come on top).
+# One value for every model: it is about what the three ~1000-character chunks sent before packing cost,
+# and packing is meant to fill the same room with better text, not to make the prompt longer. All the
+# models have far more context than that, so their limits don't make a per-model value worth having.
+CONTEXT_BUDGET = 750
+# How many retrieved chunks the packer chooses from
+PACK_CANDIDATES = 8
+# Chunks sharing at least this fraction of their word 3-grams are treated as the same text
+NEAR_DUPLICATE = 0.8
+# MMR trade-off: 1.0 = only relevance, 0.0 = only diversity
+MMR_LAMBDA = 0.7
+# The splitter overlaps neighbouring chunks by up to 200 characters; look a bit further to be safe
+MAX_OVERLAP = 300
+
+_WORD = re.compile(r"\w+")
+_CITE = re.compile(r"\[(\d+)\]")
+
+
+def _count_tokens_estimate(text):
+    # About 4 characters per token for English text
+    return max(1, len(text) // 4)
+
+
+def _load_token_counter():
+    """Uses tiktoken when it is installed (and its vocabulary is available), otherwise an estimate."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return _count_tokens_estimate
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+_count_tokens = None
+
+
+def count_tokens(text):
+    global _count_tokens
+    if _count_tokens is None:
+        _count_tokens = _load_token_counter()
+    return _count_tokens(text)
+
+
+def _overlap(left, right):
+    """Length of the longest end of `left` that is also the start of `right` (0 if none)."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), 20, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_adjacent(docs):
+    """
+    Joins chunks that continue each other (same file and page, and the end of one is the start of
+    the next) into one passage, so the overlapping text is only sent once. Keeps the rank of the
+    best chunk in each merged passage.
+    """
+    # Chunk 2 can arrive after chunks 1 and 3, joining them only on a second pass
+    while True:
+        merged = _merge_pass(docs)
+        if len(merged) == len(docs):
+            return merged
+        docs = merged
+
+
+def _merge_pass(docs):
+    merged = []
+    for doc in docs:
+        for i, passage in enumerate(merged):
+            if (passage.metadata.get("source"), passage.metadata.get("page")) != (doc.metadata.get("source"), doc.metadata.get("page")):
+                continue
+            if doc.page_content in passage.page_content:
+                break
+            size = _overlap(passage.page_content, doc.page_content)
+            if size:
+                merged[i] = Document(page_content=passage.page_content + doc.page_content[size:], metadata=passage.metadata)
+                break
+            size = _overlap(doc.page_content, passage.page_content)
+            if size:
+                merged[i] = Document(page_content=doc.page_content + passage.page_content[size:], metadata=passage.metadata)
+                break
+        else:
+            merged.append(doc)
+    return merged
+
+
+def _shingles(text, size=3):
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_passages(passages, mmr_lambda=MMR_LAMBDA, near_duplicate=NEAR_DUPLICATE):
+    """
+    Orders passages with maximal marginal relevance: each pick balances its retrieval rank against
+    how much it repeats what was already picked. Near-duplicates of a picked passage are dropped.
+    Similarity is word 3-gram overlap, so no extra embedding calls are needed.
+    """
+    shingles = [_shingles(p.page_content) for p in passages]
+    # Retrieval order is the relevance signal: the first passage scores 1.0, the last close to 0
+    relevance = [1.0 - i / len(passages) for i in range(len(passages))]
+    remaining = list(range(len(passages)))
+    chosen = []
+    while remaining:
+        best, best_score = None, None
+        for i in list(remaining):
+            redundancy = max((_similarity(shingles[i], shingles[j]) for j in chosen), default=0.0)
+            if redundancy >= near_duplicate:
+                remaining.remove(i)
+                continue
+            score = mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        chosen.append(best)
+        remaining.remove(best)
+    return [passages[i] for i in chosen]
+
+
+def _citation(doc):
+    source = str(doc.metadata.get("source", "document")).replace("\\", "/").rsplit("/", 1)[-1]
+    page = doc.metadata.get("page")
+    # pypdf counts pages from 0, people count from 1
+    if isinstance(page, int) or str(page).isdigit():
+        return f"{source}, page {int(page) + 1}"
+    return source
+
+
+def pack_context(docs, budget=CONTEXT_BUDGET):
+    """
+    Turns retrieved chunks into the prompt's context block, within `budget` tokens:
+    merges overlapping neighbours, drops near-duplicates, orders by MMR, then adds passages until
+    the budget is used up (the last one is cut to fit). Every passage is numbered with its source,
+    e.g. "[1] report.pdf, page 4", so the answer can cite it.
+
+    Returns (context text, list of citation strings in the same numbering).
+    """
+    passages = select_passages(merge_adjacent(docs))
+    blocks, citations, used = [], [], 0
+    for doc in passages:
+        header = f"[{len(blocks) + 1}] {_citation(doc)}"
+        cost = count_tokens(header) + count_tokens(doc.page_content) + 2
+        if used + cost > budget:
+            room = budget - used - count_tokens(header) - 2
+            # Only worth including a partial passage if a reasonable piece of it fits
+            if room < 50:
+                break
+            # Cut until the piece (with its "...") fits, so the total never goes over the budget
+            text = doc.page_content[:room * 4]
+            while text and count_tokens(text + "...") > room:
+                text = text[:int(len(text) * 0.9)]
+            if text:
+                blocks.append(f"{header}\n{text}...")
+                citations.append(header)
+            break
+        blocks.append(f"{header}\n{doc.page_content}")
+        citations.append(header)
+        used += cost
+    return "\n\n".join(blocks), citations
+
+
+def cited_sources(answer, citations):
+    """The citations (from pack_context) of the passages the answer refers to as [1], [2], ..., in that order."""
+    numbers = dict.fromkeys(int(n) for n in _CITE.findall(answer))
+    return [citations[n - 1] for n in numbers if 1 <= n <= len(citations)]
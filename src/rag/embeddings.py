@@ -0,0 +1,172 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.utils import telemetry
+
+# "torch" runs the model in full precision; "int8" quantizes its linear layers to 8-bit integers,
+# which is faster on CPU-only hosts and gives vectors very close to the full-precision ones
+# (python -m benchmarks.bench_embeddings measures both). Ingestion and retrieval always use the same one.
+EMBEDDING_BACKEND = os.getenv("IRA_EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_BACKENDS = ("torch", "int8")
+EMBEDDING_CACHE_PATH = os.getenv("IRA_EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite"))
+# Set IRA_EMBEDDING_CACHE=0 to always run the model
+EMBEDDING_CACHE_ENABLED = os.getenv("IRA_EMBEDDING_CACHE", "1").lower() not in ("0", "false", "no")
+# About 1.5 KB per cached 384-dimension vector; the least recently used are dropped beyond this
+MAX_CACHED_VECTORS = 200_000
+# A hit writes the vector's last-use time at most this often (seconds), so repeat lookups stay reads
+TOUCH_EVERY = 3600
+# How often (in stored vectors) the size limit is checked
+PRUNE_EVERY = 5_000
+# SQLite limits how many values one query may have
+LOOKUP_BATCH = 500
+
+
+def load_model(model_name, backend=EMBEDDING_BACKEND):
+    """Loads a sentence-transformers embedding model with the chosen backend (see EMBEDDING_BACKEND)."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, use one of {', '.join(EMBEDDING_BACKENDS)}")
+    # Imported here and not at the top: sentence-transformers pulls in torch, which takes seconds
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    import torch
+    embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
+    with warnings.catch_warnings():
+        # PyTorch marks eager-mode quantization as deprecated (in favour of the separate torchao package);
+        # it still works and needs nothing beyond torch
+        warnings.simplefilter("ignore")
+        from torch.ao.quantization import quantize_dynamic
+        # Weights are stored as int8 and activations quantized on the fly, so there is no calibration step
+        quantize_dynamic(embeddings.client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embeddings
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a persistent cache keyed by (model, text hash), in one SQLite file.
+
+    Re-ingesting a document, ingesting a copy of one, the same boilerplate chunk on every page, and
+    questions asked before (also in earlier runs of the app) then skip the model. Identical texts in
+    one batch are embedded once. The model key includes the backend, so full-precision and int8
+    vectors are never mixed up. Queries and documents share the cache: the models used here embed
+    both the same way. Beyond max_vectors the least recently used vectors are dropped.
+    """
+
+    def __init__(self, inner, model_key, path=EMBEDDING_CACHE_PATH, max_vectors=MAX_CACHED_VECTORS):
+        self.inner = inner
+        self.model_key = model_key
+        self.path = path
+        self.max_vectors = max_vectors
+        self._local = threading.local()
+        self._stored = 0
+        self._stored_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (model TEXT, hash TEXT, vector BLOB, last_used REAL, PRIMARY KEY (model, hash))"
+        )
+        # Cache files from before last_used was recorded: their vectors count as least recently used
+        if "last_used" not in [row[1] for row in conn.execute("PRAGMA table_info(vectors)")]:
+            conn.execute("ALTER TABLE vectors ADD COLUMN last_used REAL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _lookup(self, keys):
+        found = {}
+        stale = []
+        now = time.time()
+        conn = self._conn()
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[start:start + LOOKUP_BATCH]
+            rows = conn.execute(
+                f"SELECT hash, vector, last_used FROM vectors WHERE model = ? AND hash IN ({', '.join('?' * len(batch))})",
+                (self.model_key, *batch)).fetchall()
+            for key, blob, last_used in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if (last_used or 0) < now - TOUCH_EVERY:
+                    stale.append(key)
+        if stale:
+            self._touch(conn, stale, now)
+        return found
+
+    def _touch(self, conn, keys, now):
+        """Marks cached vectors as just used, so prune() keeps them."""
+        try:
+            conn.executemany("UPDATE vectors SET last_used = ? WHERE model = ? AND hash = ?",
+                             [(now, self.model_key, key) for key in keys])
+        except sqlite3.Error as e:
+            # Only the eviction order suffers: the vectors were found all the same
+            print(f"Could not update the embedding cache ({e}).")
+
+    def _store(self, vectors):
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN")
+            now = time.time()
+            conn.executemany("INSERT OR IGNORE INTO vectors (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                             [(self.model_key, key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                              for key, vector in vectors.items()])
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            # The cache is only a shortcut: if it can't be written, the vectors are still returned
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Could not write to the embedding cache ({e}).")
+            return
+        with self._stored_lock:
+            self._stored += len(vectors)
+            prune = self._stored >= PRUNE_EVERY
+            if prune:
+                self._stored = 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drops the least recently used vectors when the cache holds more than max_vectors."""
+        conn = self._conn()
+        extra = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0] - self.max_vectors
+        if extra > 0:
+            conn.execute("DELETE FROM vectors WHERE rowid IN (SELECT rowid FROM vectors ORDER BY last_used LIMIT ?)", (extra,))
+
+    def embed_documents(self, texts):
+        keys = [text_key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        # Every distinct text that isn't cached yet, embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        telemetry.cache_event("embeddings", "vectors", "hit", len(texts) - sum(key in missing for key in keys))
+        telemetry.cache_event("embeddings", "vectors", "miss", sum(key in missing for key in keys))
+        if missing:
+            fresh = dict(zip(missing, self.inner.embed_documents(list(missing.values()))))
+            self._store(fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = text_key(text)
+        found = self._lookup([key])
+        telemetry.cache_event("embeddings", "vectors", "hit" if found else "miss")
+        if found:
+            return found[key]
+        vector = self.inner.embed_query(text)
+        self._store({key: vector})
+        return vector
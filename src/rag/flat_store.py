@@ -0,0 +1,370 @@
+import json
+import os
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# float16 halves the file (and the memory it maps) at a tiny cost in precision
+FLAT_STORE_DTYPE = os.getenv("IRA_FLAT_STORE_DTYPE", "float32")
+FLAT_STORE_DTYPES = ("float32", "float16")
+HEADER_NAME = "header.json"
+FORMAT_VERSION = 1
+# The files are rewritten without deleted / overwritten rows once they are more than this share of all rows
+COMPACT_RATIO = 0.5
+COMPACT_MIN_ROWS = 256
+# Rows scored at once: float16 vectors are converted to float32 a block at a time, which keeps
+# the temporary copy small (6 MB for 384 dimensions) and in the CPU cache
+SEARCH_BLOCK = 4_096
+
+# A store is a directory of append-only files plus a small header that says how much of them is committed:
+#   header.json           {"generation", "dim", "dtype", "rows", "tombstones", "docs_bytes", "ids_bytes"}
+#   vectors.<gen>.bin     (rows, dim) float32 / float16, L2-normalized, memory-mapped for search
+#   ids.<gen>.txt         one chunk ID per line, row by row
+#   docs.<gen>.jsonl      one {"text", "metadata"} line per row, read only for the rows a search returns
+#   offsets.<gen>.bin     int64 byte offset of every row's line in docs.<gen>.jsonl
+#   tombstones.<gen>.bin  int64 numbers of rows that were deleted or overwritten
+# Writers append to the files and then atomically replace the header; anything past the header's counts
+# (a write that crashed half way) is ignored and cut off before the next append. Compaction writes the
+# next generation of files and switches the header to it.
+
+
+class FlatVectorStore(VectorStore):
+    """
+    A small vector store without a database: vectors in one memory-mapped file, searched by brute force
+    with one matrix product. Opening it reads only the chunk IDs, so it starts in milliseconds and uses
+    little memory, and for the corpora this app sees (up to a few hundred thousand chunks) an exact
+    scan is as fast as an approximate index.
+
+    Writes are append-only: add_documents() with an existing ID adds a new row and marks the old one
+    as deleted, like delete() does. Other processes see the changes on their next search.
+    Implements the LangChain VectorStore methods the app uses, plus Chroma-style get().
+    """
+
+    def __init__(self, directory, embedding_function, dtype=FLAT_STORE_DTYPE):
+        if dtype not in FLAT_STORE_DTYPES:
+            raise ValueError(f"Unknown flat store dtype {dtype!r}, use one of {', '.join(FLAT_STORE_DTYPES)}")
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.new_dtype = dtype
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    # --- files ---
+
+    def _path(self, name, generation=None):
+        if generation is None:
+            return os.path.join(self.directory, name)
+        stem, extension = name.split(".")
+        return os.path.join(self.directory, f"{stem}.{generation}.{extension}")
+
+    def _header_stamp(self):
+        try:
+            stat = os.stat(self._path(HEADER_NAME))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """Reads the committed state from disk."""
+        header_path = self._path(HEADER_NAME)
+        stamp = self._header_stamp()
+        header = {"generation": 0, "dim": None, "dtype": self.new_dtype, "rows": 0, "tombstones": 0,
+                  "docs_bytes": 0, "ids_bytes": 0}
+        if stamp is not None:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header.update(json.load(f))
+        generation, rows = header["generation"], header["rows"]
+
+        if rows:
+            with open(self._path("ids.txt", generation), "rb") as f:
+                ids = f.read(header["ids_bytes"]).decode("utf-8").split("\n")[:rows]
+            offsets = np.fromfile(self._path("offsets.bin", generation), dtype=np.int64, count=rows)
+            tombstones = np.fromfile(self._path("tombstones.bin", generation), dtype=np.int64, count=header["tombstones"]) \
+                if header["tombstones"] else np.empty(0, np.int64)
+            vectors = np.memmap(self._path("vectors.bin", generation), dtype=header["dtype"], mode="r", shape=(rows, header["dim"]))
+        else:
+            ids, offsets, tombstones = [], np.empty(0, np.int64), np.empty(0, np.int64)
+            vectors = np.empty((0, header["dim"] or 0), dtype=header["dtype"])
+        alive = np.ones(rows, dtype=bool)
+        alive[tombstones] = False
+        self._header = header
+        self._stamp = stamp
+        self._ids = ids
+        self._row_of = {cid: row for row, cid in enumerate(ids) if alive[row]}
+        self._publish(vectors, offsets, alive)
+
+    def _publish(self, vectors, offsets, alive):
+        # Readers take everything from one snapshot, so a write landing mid-search can't mix two states.
+        # The arrays in a snapshot are never changed afterwards: a write makes new ones. The ID list only
+        # grows (a snapshot never reads past its own rows) and the ID -> row map is only read under _lock.
+        self._offsets = offsets
+        self._alive = alive
+        self._vectors = vectors
+        self._snapshot = (self._header["generation"], vectors, alive, offsets, self._ids, len(self._row_of))
+
+    def _refresh(self):
+        """Picks up writes made by another process (one stat call when nothing changed)."""
+        if self._header_stamp() != self._stamp:
+            with self._lock:
+                if self._header_stamp() != self._stamp:
+                    self._load()
+
+    def _append(self, name, data, committed):
+        """Appends bytes to one of the current generation's files, cutting off anything uncommitted first."""
+        path = self._path(name, self._header["generation"])
+        with open(path, "ab") as f:
+            if f.tell() != committed:
+                f.truncate(committed)
+                f.seek(committed)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_header(self, header):
+        tmp_path = self._path(HEADER_NAME) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # os.replace is atomic: readers see the old state or the new one, never half a write
+        os.replace(tmp_path, self._path(HEADER_NAME))
+
+    def _commit(self, header, new_ids=(), new_offsets=(), dead_rows=()):
+        """
+        Writes the header (which makes the appended rows count) and brings the in-memory state up to
+        date with just the change: new_ids / new_offsets of the appended rows, and the rows now dead.
+        Nothing already loaded is read again, so a batched ingest stays linear in its size.
+        """
+        self._write_header(header)
+        first_row = self._header["rows"]
+        self._header = header
+        self._stamp = self._header_stamp()
+        for row in dead_rows:
+            if row < first_row and self._row_of.get(self._ids[row]) == row:
+                del self._row_of[self._ids[row]]
+        self._ids.extend(new_ids)
+        for row, cid in enumerate(new_ids, first_row):
+            self._row_of[cid] = row
+        # New arrays (the snapshot readers hold is never changed); an ID repeated in the batch keeps its
+        # last row in the map, its earlier rows are among dead_rows
+        alive = np.concatenate([self._alive, np.ones(len(new_ids), dtype=bool)])
+        alive[list(dead_rows)] = False
+        offsets = np.concatenate([self._offsets, np.asarray(new_offsets, dtype=np.int64)]) if len(new_offsets) else self._offsets
+        # Only the mapping of the file is redone (the new rows are at its end), nothing is read
+        vectors = self._vectors if not len(new_ids) else np.memmap(
+            self._path("vectors.bin", header["generation"]), dtype=header["dtype"], mode="r", shape=(header["rows"], header["dim"]))
+        self._publish(vectors, offsets, alive)
+
+    # --- writing ---
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        if ids is None:
+            import uuid
+            ids = [uuid.uuid4().hex for _ in texts]
+        ids = [str(cid) for cid in ids]
+        if any("\n" in cid for cid in ids):
+            raise ValueError("Chunk IDs can't contain line breaks")
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        return self._add_vectors(texts, metadatas, ids, vectors)
+
+    def _add_vectors(self, texts, metadatas, ids, vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._refresh()
+            header = dict(self._header)
+            if header["dim"] is None:
+                header["dim"] = vectors.shape[1]
+            elif vectors.shape[1] != header["dim"]:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, the store has {header['dim']}")
+
+            # Rows that these IDs replace, including repeats inside this batch (the last one wins)
+            first_row = header["rows"]
+            replaced = [self._row_of[cid] for cid in dict.fromkeys(ids) if cid in self._row_of]
+            last_position = {cid: i for i, cid in enumerate(ids)}
+            replaced += [first_row + i for i, cid in enumerate(ids) if last_position[cid] != i]
+
+            lines, offsets, position = [], [], header["docs_bytes"]
+            for text, metadata in zip(texts, metadatas):
+                line = (json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False) + "\n").encode("utf-8")
+                offsets.append(position)
+                position += len(line)
+                lines.append(line)
+            id_bytes = "".join(cid + "\n" for cid in ids).encode("utf-8")
+
+            self._append("vectors.bin", vectors.astype(header["dtype"]).tobytes(),
+                         header["rows"] * header["dim"] * np.dtype(header["dtype"]).itemsize)
+            self._append("docs.jsonl", b"".join(lines), header["docs_bytes"])
+            self._append("ids.txt", id_bytes, header["ids_bytes"])
+            self._append("offsets.bin", np.asarray(offsets, dtype=np.int64).tobytes(), header["rows"] * 8)
+            if replaced:
+                self._append("tombstones.bin", np.asarray(replaced, dtype=np.int64).tobytes(), header["tombstones"] * 8)
+            header.update(rows=header["rows"] + len(ids), tombstones=header["tombstones"] + len(replaced),
+                          docs_bytes=position, ids_bytes=header["ids_bytes"] + len(id_bytes))
+            self._commit(header, ids, offsets, replaced)
+            self._maybe_compact()
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self._lock:
+            self._refresh()
+            rows = [self._row_of[cid] for cid in dict.fromkeys(ids) if cid in self._row_of]
+            if rows:
+                header = dict(self._header)
+                self._append("tombstones.bin", np.asarray(rows, dtype=np.int64).tobytes(), header["tombstones"] * 8)
+                header["tombstones"] += len(rows)
+                self._commit(header, dead_rows=rows)
+                self._maybe_compact()
+        return True
+
+    def _maybe_compact(self):
+        rows = self._header["rows"]
+        dead = rows - len(self._row_of)
+        if rows >= COMPACT_MIN_ROWS and dead > COMPACT_RATIO * rows:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the files without deleted rows, as the next generation, and switches to it."""
+        with self._lock:
+            self._refresh()
+            header = dict(self._header)
+            old_generation, new_generation = header["generation"], header["generation"] + 1
+            keep = np.flatnonzero(self._alive)
+            offsets, position = [], 0
+            with open(self._path("docs.jsonl", old_generation), "rb") as source, \
+                    open(self._path("docs.jsonl", new_generation), "wb") as target:
+                for row in keep:
+                    source.seek(int(self._offsets[row]))
+                    line = source.readline()
+                    offsets.append(position)
+                    position += len(line)
+                    target.write(line)
+            id_bytes = "".join(self._ids[row] + "\n" for row in keep).encode("utf-8")
+            with open(self._path("vectors.bin", new_generation), "wb") as f:
+                for start in range(0, len(keep), SEARCH_BLOCK):
+                    f.write(np.ascontiguousarray(self._vectors[keep[start:start + SEARCH_BLOCK]]).tobytes())
+            with open(self._path("ids.txt", new_generation), "wb") as f:
+                f.write(id_bytes)
+            with open(self._path("offsets.bin", new_generation), "wb") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            open(self._path("tombstones.bin", new_generation), "wb").close()
+            header.update(generation=new_generation, rows=len(keep), tombstones=0, docs_bytes=position, ids_bytes=len(id_bytes))
+            self._write_header(header)
+            # Every row moved: read the new generation from disk
+            self._load()
+            for name in ("vectors.bin", "ids.txt", "docs.jsonl", "offsets.bin", "tombstones.bin"):
+                try:
+                    os.remove(self._path(name, old_generation))
+                except OSError:
+                    # Missing, or still open in another process on Windows; it is never read again
+                    pass
+
+    # --- reading ---
+
+    def _documents(self, snapshot, rows):
+        generation, _, _, offsets, _, _ = snapshot
+        documents = []
+        with open(self._path("docs.jsonl", generation), "rb") as f:
+            for row in rows:
+                f.seek(int(offsets[row]))
+                record = json.loads(f.readline())
+                documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return documents
+
+    def _read(self, read):
+        """Runs read(snapshot) on the latest state; again if another process compacted the files meanwhile."""
+        self._refresh()
+        try:
+            return read(self._snapshot)
+        except FileNotFoundError:
+            with self._lock:
+                self._load()
+            return read(self._snapshot)
+
+    def __len__(self):
+        self._refresh()
+        return self._snapshot[5]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, **kwargs):
+        if kwargs.get("filter"):
+            raise NotImplementedError("The flat vector store doesn't support metadata filters")
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        def read(snapshot):
+            _, vectors, alive, _, _, live = snapshot
+            if not live:
+                return []
+            scores = np.empty(len(vectors), dtype=np.float32)
+            for start in range(0, len(vectors), SEARCH_BLOCK):
+                block = vectors[start:start + SEARCH_BLOCK]
+                scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+            scores[~alive] = -np.inf
+            top = np.argpartition(-scores, min(k, live) - 1)[:min(k, live)]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            # Scores are cosine similarities: higher is closer
+            return list(zip(self._documents(snapshot, top), (float(scores[row]) for row in top)))
+
+        return self._read(read)
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0, where=None, **kwargs):
+        """Chroma-style lookup: by ID, or a page of all chunks. Returns {"ids", "documents", "metadatas"}."""
+        if where:
+            raise NotImplementedError("The flat vector store doesn't support metadata filters")
+
+        def read(snapshot):
+            _, vectors, alive, _, all_ids, _ = snapshot
+            if ids is not None:
+                # The ID -> row map always follows the latest state, so look it up with the snapshot taken at
+                # the same time (under the lock) instead of the one read() was given
+                with self._lock:
+                    snapshot = self._snapshot
+                    rows = [self._row_of[cid] for cid in ids if cid in self._row_of]
+                _, vectors, alive, _, all_ids, _ = snapshot
+            else:
+                rows = np.flatnonzero(alive)[offset:None if limit is None else offset + limit].tolist()
+            result = {"ids": [all_ids[row] for row in rows]}
+            if "documents" in include or "metadatas" in include:
+                documents = self._documents(snapshot, rows)
+                if "documents" in include:
+                    result["documents"] = [doc.page_content for doc in documents]
+                if "metadatas" in include:
+                    result["metadatas"] = [doc.metadata for doc in documents]
+            if "embeddings" in include:
+                result["embeddings"] = [np.asarray(vectors[row], dtype=np.float32) for row in rows]
+            return result
+
+        return self._read(read)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory=None, **kwargs):
+        if persist_directory is None:
+            raise ValueError("FlatVectorStore needs a persist_directory")
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
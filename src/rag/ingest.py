@@ -1,50 +1,221 @@
 import os
-from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from src.rag import namespaces, resources
+from src.rag.bm25 import BM25Writer, BM25_NAME
+from src.rag.pipeline import count_pages, run_pipeline
+from src.utils.response_cache import get_response_cache
+from src.rag.manifest import load_manifest, save_manifest, file_hash, text_hash, chunk_id, all_chunk_ids
 
 DATA_DIR = "data"
-DB_DIR = "chroma_db"
 
-def ingest_documents():
-    """Loads PDFs from the data directory, splits them, and stores them in ChromaDB."""
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        print(f"Created {DATA_DIR} directory. Please add some PDFs.")
+# Settings for streaming mode, used for very large PDFs
+STREAMING_THRESHOLD_MB = 50
+STREAMING_PAGE_WINDOW = 8
+STREAMING_BATCH_SIZE = 64
+STREAMING_MAX_MEMORY_MB = 1024
+
+class IngestCancelled(Exception):
+    """Raised inside ingest_documents() when should_stop() says to stop. Nothing is committed."""
+
+
+def _list_pdfs(data_dir):
+    return sorted(f for f in os.listdir(data_dir) if f.lower().endswith(".pdf") and os.path.isfile(os.path.join(data_dir, f)))
+
+def _split_page(text_splitter, name, page_number, page):
+    """Splits one page into chunks and gives every chunk its stable ID."""
+    chunks = text_splitter.split_documents([page])
+    for index, chunk in enumerate(chunks):
+        chunk.metadata["chunk_id"] = chunk_id(name, page_number, index, chunk.page_content)
+    return chunks
+
+def ingest_documents(incremental=True, prune_missing=True, streaming=None, max_memory_mb=None,
+                     files=None, progress=None, should_stop=None, namespace=None):
+    """
+    Loads PDFs from the data directory, splits them, and stores them in the vector store (ChromaDB by default).
+    With a namespace, its own uploads are stored in its own collection (see src/rag/namespaces.py)
+    instead of data/ in the shared one.
+
+    With incremental=True (the default) a manifest of file and page hashes is used so that
+    only new or changed pages are embedded. Chunks are written with stable IDs, so re-ingesting
+    the same content overwrites it instead of duplicating it. With prune_missing=True, chunks
+    belonging to PDFs that are no longer in the data directory are deleted.
+
+    With streaming=True pages are read lazily a few at a time and written to the store in small
+    batches, keeping peak memory under max_memory_mb (STREAMING_MAX_MEMORY_MB by default) no matter
+    how big the PDF is. streaming=None picks it automatically for files over STREAMING_THRESHOLD_MB.
+
+    files limits the run to these file names in the data directory (nothing else is pruned then).
+    progress(dict) is called as pages are parsed and chunks embedded, with "pages_parsed",
+    "pages_total", "chunks_embedded" and "chunks_total" (chunks found so far). should_stop() is
+    checked between batches; when it returns True, IngestCancelled is raised. Until the final
+    commit nothing is visible: if the run fails or is cancelled, the chunks it already wrote are
+    deleted again, so the store still matches the manifest.
+    """
+    # Ingestion writes through the collection's open store, so it must not be closed to make room meanwhile
+    with resources.pinned(namespace):
+        return _ingest(incremental, prune_missing, streaming, max_memory_mb, files, progress, should_stop, namespace)
+
+
+def _ingest(incremental, prune_missing, streaming, max_memory_mb, files, progress, should_stop, namespace):
+    data_dir = namespaces.data_dir(namespace)
+    directory = resources.collection_dir(namespace)
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+        print(f"Created {data_dir} directory. Please add some PDFs.")
         return None
 
-    print(f"Loading PDFs from {DATA_DIR}...")
-    loader = PyPDFDirectoryLoader(DATA_DIR)
-    documents = loader.load()
-    
-    if not documents:
-        print(f"No documents found in {DATA_DIR}.")
+    pdf_files = _list_pdfs(data_dir)
+    if files is not None:
+        wanted = set(files)
+        pdf_files = [name for name in pdf_files if name in wanted]
+    if not pdf_files:
+        print(f"No documents found in {data_dir}.")
         return None
 
-    print(f"Loaded {len(documents)} document pages.")
-    
+    namespaces.touch(namespace)
+    manifest = load_manifest(directory)
+    old_files = manifest["files"] if incremental else {}
+
     # Split documents into chunks
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200
     )
-    splits = text_splitter.split_documents(documents)
-    print(f"Split into {len(splits)} chunks.")
-
-    # Use free HuggingFace embeddings
-    print("Initializing HuggingFace embeddings...")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    print("Storing in ChromaDB...")
-    vectorstore = Chroma.from_documents(
-        documents=splits, 
-        embedding=embeddings, 
-        persist_directory=DB_DIR
-    )
-    
+
+    # Only files whose bytes changed since the last ingest need to be parsed at all
+    to_parse = []
+    hashes = {}
+    for name in pdf_files:
+        path = os.path.join(data_dir, name)
+        hashes[name] = file_hash(path)
+        old_entry = old_files.get(name)
+        if not (old_entry and old_entry.get("hash") == hashes[name]):
+            to_parse.append((name, path))
+
+    stale_ids = []
+    counts = {"pages": 0, "chunks": 0, "embedded": 0}
+    pages_total = sum(count_pages(path) for _, path in to_parse) if progress is not None else None
+
+    def check_stop():
+        if should_stop is not None and should_stop():
+            raise IngestCancelled("Ingestion was cancelled")
+
+    def report_progress():
+        if progress is not None:
+            progress({"pages_parsed": counts["pages"], "pages_total": pages_total,
+                      "chunks_embedded": counts["embedded"], "chunks_total": counts["chunks"]})
+    # Page entries of files that are still being processed (they arrive window by window)
+    partial_pages = {}
+
+    def split_window(name, pages, final):
+        """Split stage: keeps unchanged pages as they are and splits only new or changed ones."""
+        check_stop()
+        old_entry = old_files.get(name) or {}
+        old_pages = old_entry.get("pages", {})
+        new_pages = partial_pages.setdefault(name, {})
+        chunks = []
+        for page in pages:
+            page_number = str(page.metadata.get("page", 0))
+            page_digest = text_hash(page.page_content)
+            old_page = old_pages.get(page_number)
+            if old_page and old_page.get("hash") == page_digest:
+                # Only this page is unchanged - keep its existing chunks
+                new_pages[page_number] = old_page
+                continue
+            page_chunks = _split_page(text_splitter, name, page_number, page)
+            chunks.extend(page_chunks)
+            new_pages[page_number] = {"hash": page_digest, "chunk_ids": [c.metadata["chunk_id"] for c in page_chunks]}
+        counts["pages"] += len(pages)
+        counts["chunks"] += len(chunks)
+        report_progress()
+
+        if final:
+            # Chunks from pages that changed or disappeared from this file
+            kept_ids = set(all_chunk_ids({"pages": new_pages}))
+            stale_ids.extend(cid for cid in all_chunk_ids(old_entry) if cid not in kept_ids)
+            manifest["files"][name] = {"hash": hashes[name], "pages": partial_pages.pop(name)}
+        return chunks
+
+    # Borrow the shared embedding model and vector store instead of loading new ones
+    vectorstore = resources.get_vectorstore(create=True, namespace=namespace)
+
+    # The keyword index is kept in step with the vector store: same chunk IDs, same adds and deletes
+    bm25 = BM25Writer(os.path.join(directory, BM25_NAME))
+    if manifest["files"] and not os.path.exists(bm25.path):
+        print("Building the keyword index for chunks that are already stored...")
+        bm25.backfill(vectorstore)
+
+    # Chunks already in the store before this run; anything else written is taken back if the run fails
+    committed_ids = {cid for entry in manifest["files"].values() for cid in all_chunk_ids(entry)}
+    written_ids = []
+
+    def write_batch(chunks):
+        """Embed stage: upsert by stable ID, so a re-run never creates duplicates."""
+        check_stop()
+        ids = [c.metadata["chunk_id"] for c in chunks]
+        vectorstore.add_documents(chunks, ids=ids)
+        written_ids.extend(ids)
+        bm25.add(ids, [c.page_content for c in chunks])
+        counts["embedded"] += len(chunks)
+        report_progress()
+
+    if to_parse:
+        if streaming is None:
+            # Very large uploads switch to streaming automatically
+            streaming = any(os.path.getsize(path) > STREAMING_THRESHOLD_MB * 1024 * 1024 for _, path in to_parse)
+        print(f"Loading {len(to_parse)} new or changed PDFs from {data_dir}{' (streaming)' if streaming else ''}...")
+        try:
+            if streaming:
+                run_pipeline(to_parse, split_window, write_batch, parse_workers=1, page_window=STREAMING_PAGE_WINDOW,
+                             batch_size=STREAMING_BATCH_SIZE, max_memory_mb=max_memory_mb or STREAMING_MAX_MEMORY_MB)
+            else:
+                run_pipeline(to_parse, split_window, write_batch, max_memory_mb=max_memory_mb)
+            # Last chance to cancel: after this the run is committed
+            check_stop()
+        except BaseException:
+            # Nothing was committed: remove what this run added so searches don't find half a document
+            added = [cid for cid in dict.fromkeys(written_ids) if cid not in committed_ids]
+            if added:
+                print(f"Ingestion stopped, removing {len(added)} uncommitted chunks.")
+                vectorstore.delete(ids=added)
+            raise
+
+    if prune_missing and files is None:
+        for name in list(manifest["files"]):
+            if name not in pdf_files:
+                print(f"{name} was removed, deleting its chunks.")
+                stale_ids.extend(all_chunk_ids(manifest["files"].pop(name)))
+
+    print(f"Loaded {counts['pages']} document pages, stored {counts['chunks']} new or changed chunks, removing {len(stale_ids)} stale chunks.")
+
+    if not counts["chunks"] and not stale_ids and not bm25:
+        print("Nothing new to ingest.")
+        save_manifest(manifest, changed=False, directory=directory)
+        return vectorstore
+
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        bm25.delete(stale_ids)
+
+    bm25.commit()
+    save_manifest(manifest, directory=directory)
+
+    # Readers re-open the store on their next query so they see the new chunks,
+    # and cached document answers are now out of date
+    resources.invalidate(namespace)
+    get_response_cache().invalidate("document_agent")
+
     print("Ingestion complete!")
     return vectorstore
 
 if __name__ == "__main__":
-    ingest_documents()
+    import argparse
+    from src.rag import embeddings
+
+    parser = argparse.ArgumentParser(description="Ingests the PDFs in data/ into the vector store.")
+    parser.add_argument("--namespace", help="ingest the PDFs uploaded to this namespace (see src/rag/namespaces.py) into its own collection, instead of data/")
+    parser.add_argument("--embedding-backend", choices=embeddings.EMBEDDING_BACKENDS, default=embeddings.EMBEDDING_BACKEND,
+                        help="full precision (torch) or int8; the app must use the same one (IRA_EMBEDDING_BACKEND)")
+    args = parser.parse_args()
+    embeddings.EMBEDDING_BACKEND = args.embedding_backend
+    ingest_documents(namespace=args.namespace)
@@ -0,0 +1,313 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from src.rag import namespaces
+from src.rag.resources import collection_dir
+
+INGEST_JOBS_PATH = os.getenv("IRA_INGEST_JOBS_PATH", os.path.join(".cache", "ingest_jobs.sqlite"))
+# A running job whose process hasn't checked in for this long (seconds) died; the job is run again
+STALE_AFTER = 60
+# ...but a job whose runs keep dying (a PDF that crashes the process) is marked failed after this many
+MAX_ATTEMPTS = 3
+HEARTBEAT_INTERVAL = 5
+# Progress is written to the database at most this often (seconds)
+PROGRESS_INTERVAL = 0.5
+# How often an idle worker looks for jobs queued by another process (seconds)
+IDLE_POLL = 5
+# A worker that found nothing to do for this long (seconds) exits; the next job for its collection starts
+# a new one. With a collection per session, workers would otherwise pile up for every session ever seen.
+WORKER_IDLE_EXIT = 60
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def run_ingest_job(job, progress, should_stop):
+    """The default job runner: ingests the job's uploaded files into its namespace's (or the shared) vector store."""
+    from src.rag.ingest import ingest_documents
+    # Other uploaded files belong to other jobs, so nothing is pruned here
+    ingest_documents(prune_missing=False, files=job["files"], progress=progress, should_stop=should_stop,
+                     namespace=namespaces.namespace_of(job["collection"]))
+
+
+class IngestJobs:
+    """
+    A persistent queue of ingestion jobs (one SQLite file) and the background threads that run them,
+    so uploading a PDF never blocks the chat.
+
+    - Jobs survive restarts: queued jobs run when the app starts again, and a job whose process died
+      while it was running is run again (ingestion is idempotent, nothing half-done is ever committed),
+      up to MAX_ATTEMPTS times in all.
+    - Only one job per collection (vector store directory: the shared one or a namespace's) runs at a
+      time, also across processes, so two ingests never write to the same database at once, while
+      different namespaces ingest in parallel. Jobs run in the order they came. Each collection's
+      worker thread only lives while it has work (and WORKER_IDLE_EXIT seconds after).
+    - Progress (pages parsed, chunks embedded) is stored with the job, so any session can show it.
+    - cancel() stops a job at its next batch; uploaded files are deleted (from data/ or the namespace's
+      uploads) only once their job has committed (or was cancelled), never while it may still need them.
+    """
+
+    def __init__(self, path=INGEST_JOBS_PATH, runner=run_ingest_job, data_dir=None):
+        self.path = path
+        self.runner = runner
+        self.data_dir = data_dir
+        self.owner = uuid.uuid4().hex[:12]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._workers = {}   # collection -> (thread, wake-up event, stop event)
+        self._cancel = {}    # job id -> threading.Event, for jobs running in this process
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, collection TEXT, files TEXT, status TEXT, progress TEXT, error TEXT,
+                created_at REAL, started_at REAL, finished_at REAL, heartbeat REAL, owner TEXT,
+                cancel_requested INTEGER DEFAULT 0, attempts INTEGER DEFAULT 0)"""
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (collection, status, created_at)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        keys = ("id", "collection", "files", "status", "progress", "error", "created_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        job["files"] = json.loads(job["files"])
+        job["progress"] = json.loads(job["progress"] or "{}")
+        return job
+
+    # --- what sessions call ---
+
+    def submit(self, files, namespace=None):
+        """Queues the ingestion of these uploaded file names (in namespaces.data_dir(namespace)) and returns the job ID."""
+        job_id = uuid.uuid4().hex[:16]
+        collection = collection_dir(namespace)
+        namespaces.touch(namespace)
+        self._conn().execute(
+            "INSERT INTO jobs (id, collection, files, status, progress, created_at) VALUES (?, ?, ?, 'queued', '{}', ?)",
+            (job_id, collection, json.dumps(list(files)), time.time()),
+        )
+        self._wake(collection)
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, collection, files, status, progress, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return self._row_to_job(row)
+
+    def recent(self, limit=20):
+        rows = self._conn().execute(
+            "SELECT id, collection, files, status, progress, error, created_at, started_at, finished_at FROM jobs "
+            "ORDER BY created_at DESC LIMIT ?", (limit,),
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def active_files(self, namespace=None, exclude=None):
+        """Uploaded file names of the namespace that a queued or running job still needs."""
+        rows = self._conn().execute(
+            "SELECT id, files FROM jobs WHERE collection = ? AND status IN (?, ?)",
+            (collection_dir(namespace), *ACTIVE_STATUSES)).fetchall()
+        return {name for job_id, files in rows if job_id != exclude for name in json.loads(files)}
+
+    def cancel(self, job_id):
+        """Cancels a job: a queued one at once, a running one at its next batch. Returns False if it already ended."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] not in ACTIVE_STATUSES:
+                conn.execute("COMMIT")
+                return False
+            if row[0] == "queued":
+                conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (time.time(), job_id))
+            else:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row[0] == "queued":
+            self._clean_up(self.get(job_id))
+        elif job_id in self._cancel:
+            self._cancel[job_id].set()
+        return True
+
+    def start(self):
+        """Starts workers for every collection that has unfinished jobs (for example from before a restart)."""
+        rows = self._conn().execute(
+            "SELECT DISTINCT collection FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES).fetchall()
+        for (collection,) in rows:
+            self._wake(collection)
+
+    # --- the workers ---
+
+    def _wake(self, collection):
+        """Wakes the collection's worker, starting one if it has none."""
+        with self._lock:
+            if collection not in self._workers:
+                wake, stop = threading.Event(), threading.Event()
+                thread = threading.Thread(target=self._work, args=(collection, wake, stop), name=f"ingest-{collection}", daemon=True)
+                self._workers[collection] = (thread, wake, stop)
+                thread.start()
+            # Set under the lock, so a worker deciding to exit (which checks it under the lock) can't miss it
+            self._workers[collection][1].set()
+
+    def stop_worker(self, collection):
+        """Lets the collection's worker exit (after the job it is running, if any), e.g. when the namespace is deleted."""
+        with self._lock:
+            entry = self._workers.pop(collection, None)
+        if entry is not None:
+            entry[2].set()
+            entry[1].set()
+
+    def workers(self):
+        """The collections that have a worker thread right now."""
+        with self._lock:
+            return list(self._workers)
+
+    def _claim(self, collection):
+        """
+        Takes the oldest queued job of the collection, unless a job of that collection is already running
+        (here or in another process). Returns the job, or None.
+        """
+        conn = self._conn()
+        now = time.time()
+        # BEGIN IMMEDIATE takes SQLite's write lock, so two processes can't claim at the same time
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Stale jobs that already had all their attempts are given up on instead of being run again
+            gave_up = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE collection = ? AND status = 'running' AND heartbeat <= ? AND attempts >= ?",
+                (f"Stopped after {MAX_ATTEMPTS} attempts: the ingestion kept dying before it finished", now,
+                 collection, now - STALE_AFTER, MAX_ATTEMPTS)).rowcount
+            busy = conn.execute(
+                "SELECT 1 FROM jobs WHERE collection = ? AND status = 'running' AND heartbeat > ?",
+                (collection, now - STALE_AFTER)).fetchone()
+            row = None if busy else conn.execute(
+                "SELECT id FROM jobs WHERE collection = ? AND (status = 'queued' OR (status = 'running' AND heartbeat <= ?)) "
+                "ORDER BY created_at LIMIT 1", (collection, now - STALE_AFTER)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat = ?, owner = ?, attempts = attempts + 1 WHERE id = ?",
+                    (now, now, self.owner, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if gave_up:
+            print(f"Gave up on {gave_up} ingestion jobs after {MAX_ATTEMPTS} attempts.")
+        return self.get(row[0]) if row else None
+
+    def _work(self, collection, wake, stop):
+        idle_since = time.monotonic()
+        while not stop.is_set():
+            # Cleared before looking, so a job submitted from now on either gets claimed or leaves it set
+            wake.clear()
+            job = self._claim(collection)
+            if job is not None:
+                self._run(job)
+                idle_since = time.monotonic()
+                continue
+            if time.monotonic() - idle_since >= WORKER_IDLE_EXIT:
+                with self._lock:
+                    if not wake.is_set():
+                        if self._workers.get(collection, (None,))[0] is threading.current_thread():
+                            del self._workers[collection]
+                        return
+            wake.wait(IDLE_POLL)
+
+    def _run(self, job):
+        job_id = job["id"]
+        stop = self._cancel[job_id] = threading.Event()
+        finished = threading.Event()
+        latest = {"progress": None, "written": 0.0}
+
+        def heartbeat():
+            # Keeps the job marked as alive, and notices cancellations made from another process
+            conn = self._conn()
+            while not finished.wait(HEARTBEAT_INTERVAL):
+                conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+                if conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+                    stop.set()
+
+        def progress(update):
+            latest["progress"] = update
+            now = time.monotonic()
+            if now - latest["written"] >= PROGRESS_INTERVAL:
+                latest["written"] = now
+                self._conn().execute("UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ?",
+                                     (json.dumps(update), time.time(), job_id))
+
+        threading.Thread(target=heartbeat, name=f"ingest-heartbeat-{job_id}", daemon=True).start()
+        from src.rag.ingest import IngestCancelled
+        status, error = "done", None
+        try:
+            self.runner(job, progress, stop.is_set)
+        except IngestCancelled:
+            status = "cancelled"
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+            print(f"Ingestion job {job_id} failed: {error}")
+        finally:
+            finished.set()
+            self._cancel.pop(job_id, None)
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, progress = ? WHERE id = ?",
+            (status, error, time.time(), json.dumps(latest["progress"] or job["progress"]), job_id))
+        if status != "failed":
+            # A failed job keeps its files, so the user can simply try again
+            self._clean_up(self.get(job_id))
+
+    def _clean_up(self, job):
+        """Deletes the job's uploads, unless another queued or running job still needs them."""
+        from src.rag.manifest import file_hash, load_manifest
+        namespace = namespaces.namespace_of(job["collection"])
+        data_dir = self.data_dir or namespaces.data_dir(namespace)
+        still_needed = self.active_files(namespace, exclude=job["id"])
+        committed = load_manifest(job["collection"])["files"] if job["status"] == "done" else {}
+        for name in job["files"]:
+            path = os.path.join(data_dir, name)
+            if name in still_needed or not os.path.isfile(path):
+                continue
+            # After a successful job, only delete the file if what is on disk is exactly what was committed
+            if job["status"] == "done" and committed.get(name, {}).get("hash") != file_hash(path):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Could not delete {path}: {e}")
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_ingest_jobs():
+    """Returns the shared job queue, starting its workers (which resume jobs left from an earlier run)."""
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                _jobs = IngestJobs()
+                _jobs.start()
+    return _jobs
+
+
+def stop_worker(namespace):
+    """Stops the ingestion worker of a namespace in this process, if there is one (its namespace is being deleted)."""
+    if _jobs is not None:
+        _jobs.stop_worker(collection_dir(namespace))
@@ -0,0 +1,94 @@
+import os
+import json
+import uuid
+import hashlib
+from src.rag.resources import DB_DIR
+
+# Both files live in the collection's directory (DB_DIR, or a namespace's, see resources.collection_dir)
+MANIFEST_NAME = "ingest_manifest.json"
+# A tiny file rewritten only when the store contents change, so checking the revision is one stat call
+REVISION_NAME = "revision"
+
+# The manifest remembers what has already been embedded, so re-ingesting only touches what changed:
+# {
+#   "revision": "...",            # changes every time the vector store is modified
+#   "files": {
+#     "report.pdf": {
+#       "hash": "<sha256 of the file bytes>",
+#       "pages": {"0": {"hash": "<sha256 of the page text>", "chunk_ids": ["...", ...]}, ...}
+#     }
+#   }
+# }
+
+
+def empty_manifest():
+    return {"revision": None, "files": {}}
+
+
+def load_manifest(directory=DB_DIR):
+    """Reads the manifest from disk, or returns an empty one if there isn't one yet."""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return empty_manifest()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable ingest manifest ({e}), doing a full ingest.")
+        return empty_manifest()
+    manifest.setdefault("files", {})
+    manifest.setdefault("revision", None)
+    return manifest
+
+
+def save_manifest(manifest, changed=True, directory=DB_DIR):
+    """Writes the manifest atomically. A new revision is stamped when the store contents changed."""
+    if changed:
+        manifest["revision"] = uuid.uuid4().hex
+    path = os.path.join(directory, MANIFEST_NAME)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    # os.replace is atomic, so a crash mid-write never leaves a half-written manifest behind
+    os.replace(tmp_path, path)
+    if changed:
+        with open(os.path.join(directory, REVISION_NAME), "w", encoding="utf-8") as f:
+            f.write(manifest["revision"])
+
+
+def file_hash(path, block_size=1024 * 1024):
+    """Hashes a file in 1 MB blocks so large PDFs are never fully loaded into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def chunk_id(source, page, index, text):
+    """
+    A stable ID for a chunk: the same file, page, position and text always get the same ID,
+    so writing it again overwrites the old copy instead of creating a duplicate.
+    """
+    key = f"{source}\x00{page}\x00{index}\x00{text}"
+    return hashlib.sha256(key.encode("utf-8", errors="ignore")).hexdigest()[:32]
+
+
+def all_chunk_ids(file_entry):
+    return [cid for page in file_entry.get("pages", {}).values() for cid in page.get("chunk_ids", [])]
+
+
+def store_revision(directory=DB_DIR):
+    """
+    A cheap marker that changes whenever ingestion modifies the collection's vector store
+    (the revision file's modification time - one stat call, works across processes).
+    """
+    try:
+        return str(os.stat(os.path.join(directory, REVISION_NAME)).st_mtime_ns)
+    except OSError:
+        return None
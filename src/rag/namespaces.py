@@ -0,0 +1,119 @@
+import os
+import shutil
+import threading
+import time
+from src.rag import resources
+
+# Namespaces nobody used for this long (seconds) are deleted from disk: their chunks, index and uploads.
+# The default matches how long conversations are kept (src/graph/checkpointer.py)
+NAMESPACE_TTL = float(os.getenv("IRA_NAMESPACE_TTL", str(7 * 24 * 3600)))
+# The last-use time is written at most this often per namespace (seconds)
+TOUCH_EVERY = 60
+# How often (seconds) idle namespaces are looked for
+SWEEP_EVERY = 3600
+LAST_USED_NAME = "last_used"
+# With IRA_SESSION_NAMESPACES=1 every app session uploads into and searches its own namespace; by default
+# they all use the one shared collection
+SESSION_NAMESPACES = os.getenv("IRA_SESSION_NAMESPACES", "0").lower() in ("1", "true", "yes")
+
+# A namespace is a folder in resources.NAMESPACE_DIR:
+#   <namespace>/index/      its collection (vector store, ingest manifest, keyword index)
+#   <namespace>/uploads/    PDFs waiting to be ingested (deleted once they are stored)
+#   <namespace>/last_used   empty file whose modification time says when it was last used
+
+_lock = threading.Lock()
+_touched = {}   # namespace -> when this process last wrote its last-use time
+_last_sweep = 0.0
+
+
+def from_config(config):
+    """The namespace a graph run searches (None: the shared collection), from its run config."""
+    return (config or {}).get("configurable", {}).get("namespace")
+
+
+def namespace_dir(namespace):
+    return os.path.dirname(resources.collection_dir(namespace))
+
+
+def data_dir(namespace=None):
+    """Where the PDFs of a namespace are uploaded before they are ingested (data/ for the shared collection)."""
+    if namespace is None:
+        from src.rag.ingest import DATA_DIR
+        return DATA_DIR
+    return os.path.join(namespace_dir(namespace), "uploads")
+
+
+def namespace_of(collection):
+    """The namespace whose collection is in this directory (None for the shared one)."""
+    if os.path.normpath(collection) == os.path.normpath(resources.DB_DIR):
+        return None
+    return os.path.basename(os.path.dirname(os.path.normpath(collection)))
+
+
+def touch(namespace):
+    """Marks a namespace as used now (which keeps it from expiring), and now and then deletes idle ones."""
+    if namespace is None:
+        return
+    now = time.time()
+    with _lock:
+        if now - _touched.get(namespace, 0.0) < TOUCH_EVERY:
+            return
+        _touched[namespace] = now
+    os.makedirs(namespace_dir(namespace), exist_ok=True)
+    path = os.path.join(namespace_dir(namespace), LAST_USED_NAME)
+    with open(path, "a"):
+        os.utime(path)
+    expire_idle_maybe()
+
+
+def last_used(namespace):
+    """When the namespace was last used (seconds since the epoch), or None if it doesn't exist."""
+    directory = namespace_dir(namespace)
+    for path in (os.path.join(directory, LAST_USED_NAME), directory):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            continue
+    return None
+
+
+def expire_idle(ttl=None):
+    """
+    Deletes every namespace that wasn't used for ttl seconds (NAMESPACE_TTL by default), closing its
+    collection first. Namespaces an ingest is writing to are kept. Returns the deleted namespaces.
+    """
+    ttl = NAMESPACE_TTL if ttl is None else ttl
+    try:
+        names = os.listdir(resources.NAMESPACE_DIR)
+    except FileNotFoundError:
+        return []
+    deleted = []
+    cutoff = time.time() - ttl
+    for namespace in names:
+        if not resources.NAMESPACE_PATTERN.fullmatch(namespace):
+            continue
+        used = last_used(namespace)
+        if used is None or used >= cutoff:
+            continue
+        # A namespace an ingest is writing to right now is in use, whatever its last-use time says
+        if not resources.retire(namespace, lambda: shutil.rmtree(namespace_dir(namespace), ignore_errors=True)):
+            continue
+        from src.rag import jobs
+        jobs.stop_worker(namespace)
+        with _lock:
+            _touched.pop(namespace, None)
+        deleted.append(namespace)
+    if deleted:
+        print(f"Deleted {len(deleted)} namespaces unused for {ttl / 3600:g} hours.")
+    return deleted
+
+
+def expire_idle_maybe():
+    """Runs expire_idle() if it didn't run in the last SWEEP_EVERY seconds."""
+    global _last_sweep
+    now = time.time()
+    with _lock:
+        if now - _last_sweep < SWEEP_EVERY:
+            return
+        _last_sweep = now
+    expire_idle()
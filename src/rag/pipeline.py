@@ -0,0 +1,250 @@
+import gc
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from langchain_core.documents import Document
+from src.utils.memory import current_rss_mb, peak_rss_mb
+
+# How many processes parse PDFs at the same time (parsing is pure CPU work)
+PARSE_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+# How many items may wait between two stages before the earlier stage pauses
+QUEUE_SIZE = 8
+# How many chunks are embedded and written to the vector store in one go
+EMBED_BATCH_SIZE = 256
+# PDFs are parsed a few pages at a time, so a huge file never sits in memory all at once
+PAGE_WINDOW = 32
+
+# Put on a queue to tell the next stage that nothing more is coming
+_DONE = object()
+
+
+def count_pages(path):
+    from pypdf import PdfReader
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def parse_pdf(path, start=0, end=None):
+    """
+    Extracts the text of pages [start, end) of a PDF. Runs inside a worker process, so it only
+    uses pypdf (cheap to import) and returns plain strings instead of LangChain objects.
+    """
+    from pypdf import PdfReader
+    # Given a file object (not a path) pypdf seeks around the file instead of reading all of it into memory
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        end = len(reader.pages) if end is None else min(end, len(reader.pages))
+        return [reader.pages[number].extract_text() or "" for number in range(start, end)]
+
+
+def iter_pdf_windows(path, page_window=PAGE_WINDOW):
+    """
+    Lazily walks a PDF window by window, yielding (start, texts, total).
+    pypdf only reads a page from disk when we ask for it, but it caches every object it has
+    read (decoded page contents included), so that cache is emptied after each window.
+    """
+    from pypdf import PdfReader
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        total = len(reader.pages)
+        if total == 0:
+            yield 0, [], 0
+            return
+        for start in range(0, total, page_window):
+            end = min(start + page_window, total)
+            texts = [reader.pages[number].extract_text() or "" for number in range(start, end)]
+            reader.resolved_objects.clear()
+            yield start, texts, total
+
+
+def pages_to_documents(path, texts, start=0):
+    """
+    Turns parse_pdf() output into page Documents with the same "source" and "page" metadata PyPDFLoader uses.
+    (No "total_pages": unchanged pages keep their old chunks, so it would go stale when a file grows.)
+    """
+    return [
+        Document(page_content=text, metadata={"source": path, "page": start + offset})
+        for offset, text in enumerate(texts)
+    ]
+
+
+class StageStats:
+    """Counts how much work one stage did and for how long it was busy."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.count = 0
+        self.busy = 0.0
+
+    def add(self, count, seconds):
+        self.count += count
+        self.busy += seconds
+
+    def report(self):
+        # Throughput while the stage was actually working (for the parse stage this is per worker)
+        rate = self.count / self.busy if self.busy > 0 else 0.0
+        return {"stage": self.name, self.unit: self.count, "busy_s": round(self.busy, 3), f"{self.unit}_per_s": round(rate, 1)}
+
+
+def run_pipeline(files, split_window, write_batch, parse_workers=PARSE_WORKERS, queue_size=QUEUE_SIZE,
+                 batch_size=EMBED_BATCH_SIZE, page_window=PAGE_WINDOW, max_memory_mb=None):
+    """
+    Runs ingestion as three stages connected by bounded queues:
+
+        parse (process pool, window by window) -> split (thread) -> embed + write (this thread, in batches)
+
+    files is a list of (name, path). split_window(name, pages, final) turns one window of parsed
+    page Documents into chunks; final is True for the last window of a file. write_batch(chunks)
+    embeds and stores one batch.
+
+    With parse_workers=1 the PDFs are read lazily in this process (streaming mode). If
+    max_memory_mb is set, parsing pauses and batches are flushed early whenever the process
+    uses more memory than that, so peak memory no longer depends on the document size.
+    Returns a throughput report per stage.
+    """
+    parsed_q = queue.Queue(maxsize=queue_size)
+    chunk_q = queue.Queue(maxsize=queue_size)
+    errors = []
+    stats = {
+        "parse": StageStats("parse", "pages"),
+        "split": StageStats("split", "chunks"),
+        "embed": StageStats("embed", "chunks"),
+    }
+    throttled = {"seconds": 0.0}
+    started = time.perf_counter()
+
+    def over_memory():
+        return max_memory_mb is not None and current_rss_mb() > max_memory_mb
+
+    def wait_for_memory():
+        """Pauses parsing while we are over the ceiling and later stages still have work to drain."""
+        if not over_memory():
+            return
+        t0 = time.perf_counter()
+        gc.collect()
+        while over_memory() and not errors and (parsed_q.qsize() or chunk_q.qsize()):
+            time.sleep(0.05)
+        throttled["seconds"] += time.perf_counter() - t0
+
+    def parse_stage():
+        try:
+            workers = min(parse_workers, len(files))
+            if workers <= 1:
+                # Streaming mode: one lazy reader per file, no worker processes
+                for name, path in files:
+                    t0 = time.perf_counter()
+                    for start, texts, total in iter_pdf_windows(path, page_window):
+                        stats["parse"].add(len(texts), time.perf_counter() - t0)
+                        final = start + len(texts) >= total
+                        parsed_q.put((name, pages_to_documents(path, texts, start), final))
+                        if errors:
+                            return
+                        wait_for_memory()
+                        t0 = time.perf_counter()
+                return
+
+            # Break every file into page windows and parse them across the pool
+            tasks = []
+            windows_left = {}
+            for name, path in files:
+                total = count_pages(path)
+                starts = list(range(0, total, page_window)) or [0]
+                windows_left[name] = len(starts)
+                tasks.extend((name, path, start, start + page_window) for start in starts)
+
+            # "spawn" instead of "fork": forking a process that already runs threads (Streamlit does) can deadlock
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                pending = {}
+                tasks.reverse()
+                while (tasks or pending) and not errors:
+                    # Keep at most 2 windows per worker in flight, so parsed pages can't pile up in memory
+                    while tasks and len(pending) < workers * 2:
+                        wait_for_memory()
+                        name, path, start, end = tasks.pop()
+                        pending[pool.submit(parse_pdf, path, start, end)] = (name, path, start, time.perf_counter())
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name, path, start, t0 = pending.pop(future)
+                        texts = future.result()
+                        stats["parse"].add(len(texts), time.perf_counter() - t0)
+                        windows_left[name] -= 1
+                        parsed_q.put((name, pages_to_documents(path, texts, start), windows_left[name] == 0))
+                for future in pending:
+                    future.cancel()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            parsed_q.put(_DONE)
+
+    def split_stage():
+        try:
+            while True:
+                item = parsed_q.get()
+                if item is _DONE:
+                    break
+                if errors:
+                    continue  # keep draining so the parse stage never blocks forever
+                name, pages, final = item
+                t0 = time.perf_counter()
+                chunks = split_window(name, pages, final)
+                stats["split"].add(len(chunks), time.perf_counter() - t0)
+                for start in range(0, len(chunks), batch_size):
+                    chunk_q.put(chunks[start:start + batch_size])
+        except Exception as e:
+            errors.append(e)
+            # Drain whatever the parse stage still sends
+            while parsed_q.get() is not _DONE:
+                pass
+        finally:
+            chunk_q.put(_DONE)
+
+    threads = [threading.Thread(target=parse_stage, daemon=True), threading.Thread(target=split_stage, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    # Embed stage: collect chunks into full batches and write them
+    batch = []
+
+    def flush():
+        t0 = time.perf_counter()
+        write_batch(batch)
+        stats["embed"].add(len(batch), time.perf_counter() - t0)
+        batch.clear()
+
+    while True:
+        item = chunk_q.get()
+        if item is _DONE:
+            break
+        if errors:
+            continue
+        try:
+            batch.extend(item)
+            # Over the memory ceiling we write what we have instead of waiting for a full batch
+            if len(batch) >= batch_size or over_memory():
+                flush()
+        except Exception as e:
+            errors.append(e)
+    if batch and not errors:
+        flush()
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    wall_time = time.perf_counter() - started
+    report = [stage.report() for stage in stats.values()]
+    report.append({
+        "stage": "total",
+        "wall_s": round(wall_time, 3),
+        "pages_per_s": round(stats["parse"].count / wall_time, 1) if wall_time > 0 else 0.0,
+        "throttled_s": round(throttled["seconds"], 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+    for line in report:
+        print(f"[ingest] {line}")
+    return report
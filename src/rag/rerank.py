@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import OrderedDict
+from src.utils import telemetry
+
+# A small (about 80 MB) cross-encoder that runs fine on a CPU
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Set IRA_RERANK=1 to turn the rerank stage on
+RERANK_ENABLED = os.getenv("IRA_RERANK", "").lower() in ("1", "true", "yes")
+# How many fused candidates are scored before keeping the best k
+RERANK_CANDIDATES = 20
+RERANK_BATCH_SIZE = 32
+MAX_CACHED_SCORES = 20_000
+
+
+class Reranker:
+    """
+    Re-orders retrieved chunks with a cross-encoder, which reads the question and the chunk together
+    and judges relevance much better than comparing two separately made embeddings.
+
+    All candidates are scored in one batched pass, and scores are cached per (question, chunk ID),
+    so asking the same question again (or a follow-up that retrieves the same chunks) costs nothing.
+    """
+
+    def __init__(self, score_pairs, max_cached=MAX_CACHED_SCORES):
+        # score_pairs([(question, text), ...]) -> list of floats, higher = more relevant
+        self.score_pairs = score_pairs
+        self.max_cached = max_cached
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rerank(self, query, docs, keys, k):
+        """Returns the k best of docs; keys are their chunk IDs (used for the score cache)."""
+        scores = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if (query, key) in self._scores:
+                    self._scores.move_to_end((query, key))
+                    scores[key] = self._scores[(query, key)]
+                elif key not in scores:
+                    missing.append(key)
+                    scores[key] = None
+
+        telemetry.cache_event("rerank", "scores", "hit", len(scores) - len(missing))
+        telemetry.cache_event("rerank", "scores", "miss", len(missing))
+        if missing:
+            texts = {key: doc.page_content for key, doc in zip(keys, docs)}
+            with telemetry.span("rerank", kind="retrieval", pairs=len(missing)):
+                fresh = self.score_pairs([(query, texts[key]) for key in missing])
+            with self._lock:
+                for key, score in zip(missing, fresh):
+                    scores[key] = float(score)
+                    self._scores[(query, key)] = float(score)
+                while len(self._scores) > self.max_cached:
+                    self._scores.popitem(last=False)
+
+        order = sorted(range(len(docs)), key=lambda i: scores[keys[i]], reverse=True)
+        return [docs[i] for i in order[:k]]
+
+
+def cross_encoder_scorer(model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE):
+    """Loads a sentence-transformers cross-encoder on the CPU and returns a batched scoring function."""
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name, device="cpu")
+
+    def score_pairs(pairs):
+        if not pairs:
+            return []
+        return model.predict(pairs, batch_size=batch_size, show_progress_bar=False).tolist()
+
+    return score_pairs
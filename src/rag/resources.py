@@ -0,0 +1,247 @@
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+# "chroma" (the default) or "flat", the memory-mapped store in src/rag/flat_store.py.
+# Each backend has its own directory, with its own ingest manifest and keyword index, so switching
+# between them never mixes chunks up (the first start with a new backend needs a fresh ingest).
+VECTOR_STORE = os.getenv("IRA_VECTOR_STORE", "chroma").lower()
+DB_DIRS = {"chroma": "chroma_db", "flat": "vector_db"}
+DB_DIR = DB_DIRS.get(VECTOR_STORE, "chroma_db")
+# Namespaces (one per chat session or tenant, see src/rag/namespaces.py) each get their own collection
+# (vector store, manifest and keyword index) in a folder under here; no namespace means DB_DIR
+NAMESPACE_DIR = os.getenv("IRA_NAMESPACE_DIR", f"{DB_DIR}_namespaces")
+NAMESPACE_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Collections kept open at once; the least recently used one is closed beyond this (it is re-opened
+# from disk when its namespace asks again), so memory doesn't grow with the number of users. Set it
+# above the number of sessions active at the same time: re-opening a Chroma collection costs ~50ms,
+# while keeping one open costs a few MB (about 3 MB for 500 chunks).
+MAX_OPEN_COLLECTIONS = int(os.getenv("IRA_MAX_OPEN_COLLECTIONS", "32"))
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# One lock guards the shared objects below. Loading the embedding model takes
+# seconds, so we make sure only one thread ever does it.
+_lock = threading.RLock()
+_embeddings = None
+# None is a valid value for the BM25 index (nothing ingested yet), so "not loaded" needs its own marker
+_NOT_LOADED = object()
+_reranker = _NOT_LOADED
+# Open collections, least recently used first: directory -> {"vectorstore": ..., "bm25": ...}
+_collections = OrderedDict()
+# Collections being written to (directory -> number of writers); these are never closed to make room
+_pinned = Counter()
+
+
+def collection_dir(namespace=None):
+    """The directory of a namespace's collection (DB_DIR for the shared one, namespace None)."""
+    if namespace is None:
+        return DB_DIR
+    if not isinstance(namespace, str) or not NAMESPACE_PATTERN.fullmatch(namespace):
+        raise ValueError("A namespace is 1 to 64 letters, digits, '-' or '_'")
+    return os.path.join(NAMESPACE_DIR, namespace, "index")
+
+
+def get_embeddings():
+    """
+    Returns the process-wide embedding model, loading it on first use. Ingestion and retrieval both
+    use this one, with the backend from IRA_EMBEDDING_BACKEND and the persistent vector cache in front
+    (see src/rag/embeddings.py).
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from src.rag.embeddings import EMBEDDING_BACKEND, EMBEDDING_CACHE_ENABLED, CachedEmbeddings, load_model
+                print(f"Loading embedding model {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})...")
+                model = load_model(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+                _embeddings = CachedEmbeddings(model, f"{EMBEDDING_MODEL}@{EMBEDDING_BACKEND}") if EMBEDDING_CACHE_ENABLED else model
+    return _embeddings
+
+
+def _open_chroma(directory, embeddings):
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=directory, embedding_function=embeddings)
+
+
+def _close_chroma(vectorstore):
+    # Chroma's public API has no way to close one client: a client has no close(), and the public
+    # SharedSystemClient.clear_system_cache() forgets every system, while open clients look theirs up
+    # there on each call (the other namespaces' collections would break). So this stops the client's
+    # database and index components (System.stop()) and forgets only that system, through Chroma
+    # internals checked against chromadb 1.5.1 (pinned in requirements.txt). If a Chroma version
+    # doesn't have them, the handle is just dropped: memory then isn't freed until exit, but nothing breaks.
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except ImportError:
+        return
+    client = getattr(vectorstore, "_client", None)
+    systems = getattr(SharedSystemClient, "_identifier_to_system", None)
+    if not (hasattr(client, "_system") and hasattr(client, "_identifier") and isinstance(systems, dict)):
+        return
+    system = systems.get(client._identifier)
+    if system is None or not hasattr(system, "stop"):
+        return
+    try:
+        system.stop()
+    except Exception as e:
+        print(f"Could not stop the Chroma client of {client._identifier}: {e}")
+    # Otherwise Chroma would hand the stopped system out again when the collection is re-opened
+    if systems.get(client._identifier) is system:
+        del systems[client._identifier]
+
+
+def _open_flat(directory, embeddings):
+    from src.rag.flat_store import FlatVectorStore
+    return FlatVectorStore(directory, embeddings)
+
+
+# Vector store backends, by IRA_VECTOR_STORE name. A backend is opened with (directory, embeddings) and
+# has to offer what the app calls: the LangChain VectorStore methods (add_documents, delete,
+# similarity_search, as_retriever) and Chroma-style get(ids=..., include=..., limit=..., offset=...).
+VECTOR_STORES = {"chroma": _open_chroma, "flat": _open_flat}
+# Backends that need more than dropping the handle to free a closed store
+VECTOR_STORE_CLOSERS = {"chroma": _close_chroma}
+
+
+def _collection(directory):
+    """The cache entry of an open collection, marked as just used (call with _lock held)."""
+    entry = _collections.get(directory)
+    if entry is None:
+        entry = _collections[directory] = {"vectorstore": None, "bm25": _NOT_LOADED}
+    else:
+        _collections.move_to_end(directory)
+    # Close the least recently used collections beyond the limit (never one that is being written to)
+    extra = len(_collections) - MAX_OPEN_COLLECTIONS
+    if extra > 0:
+        for evicted in [d for d in _collections if d != directory and not _pinned[d]][:extra]:
+            _close(_collections.pop(evicted))
+    return entry
+
+
+def _close(entry):
+    # Called with _lock held
+    closer = VECTOR_STORE_CLOSERS.get(VECTOR_STORE)
+    if entry["vectorstore"] is not None and closer is not None:
+        closer(entry["vectorstore"])
+
+
+def get_vectorstore(create=False, namespace=None):
+    """
+    Returns the vector store (IRA_VECTOR_STORE) of a namespace, or the shared one in DB_DIR.
+    If the database does not exist yet it returns None, unless create=True (used by ingestion).
+    """
+    directory = collection_dir(namespace)
+    with _lock:
+        entry = _collections.get(directory)
+        if entry is None or entry["vectorstore"] is None:
+            if VECTOR_STORE not in VECTOR_STORES:
+                raise ValueError(f"Unknown vector store {VECTOR_STORE!r}, use one of {', '.join(VECTOR_STORES)}")
+            if not os.path.exists(directory) and not create:
+                return None
+        entry = _collection(directory)
+        if entry["vectorstore"] is None:
+            entry["vectorstore"] = VECTOR_STORES[VECTOR_STORE](directory, get_embeddings())
+        return entry["vectorstore"]
+
+
+def get_bm25_index(namespace=None):
+    """Returns the keyword (BM25) index of a namespace (or the shared one), memory-mapped from disk, or None if there isn't one."""
+    directory = collection_dir(namespace)
+    with _lock:
+        entry = _collection(directory)
+        if entry["bm25"] is _NOT_LOADED:
+            from src.rag.bm25 import BM25_NAME, BM25Index
+            entry["bm25"] = BM25Index.load(os.path.join(directory, BM25_NAME))
+        return entry["bm25"]
+
+
+def get_reranker():
+    """Returns the shared cross-encoder reranker, or None when reranking is turned off (IRA_RERANK)."""
+    global _reranker
+    if _reranker is _NOT_LOADED:
+        with _lock:
+            if _reranker is _NOT_LOADED:
+                from src.rag.rerank import RERANK_ENABLED, RERANK_MODEL, Reranker, cross_encoder_scorer
+                if RERANK_ENABLED:
+                    print(f"Loading reranker {RERANK_MODEL}...")
+                    _reranker = Reranker(cross_encoder_scorer())
+                else:
+                    _reranker = None
+    return _reranker
+
+
+def warm_up(load_vectorstore=True):
+    """
+    Loads the embedding model, the reranker if it is turned on, and the vector store
+    if it exists ahead of time and runs one tiny embedding so the first real question doesn't pay for it.
+    """
+    embeddings = get_embeddings()
+    # Straight to the model: a cached vector for "warm up" would leave the model itself cold
+    getattr(embeddings, "inner", embeddings).embed_query("warm up")
+    get_reranker()
+    if load_vectorstore:
+        get_vectorstore()
+        get_bm25_index()
+
+
+@contextmanager
+def pinned(namespace=None):
+    """Keeps a namespace's collection from being closed to make room while the block writes to it."""
+    directory = collection_dir(namespace)
+    with _lock:
+        _pinned[directory] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _pinned[directory] -= 1
+            if not _pinned[directory]:
+                del _pinned[directory]
+
+
+def invalidate(namespace=None):
+    """
+    Closes the cached vector store and BM25 index handles of a collection so the next caller re-opens them.
+    Called after re-ingesting documents. The embedding model is kept, it never changes.
+    """
+    close(namespace)
+
+
+def close(namespace=None):
+    """Closes a namespace's collection and frees its memory (before its files are deleted)."""
+    with _lock:
+        entry = _collections.pop(collection_dir(namespace), None)
+        if entry is not None:
+            _close(entry)
+
+
+def retire(namespace, remove):
+    """
+    Closes a namespace's collection and calls remove() (which deletes its files), both with the lock
+    held so no ingest can start writing in between. Does nothing and returns False if an ingest is
+    writing to it right now.
+    """
+    directory = collection_dir(namespace)
+    with _lock:
+        if _pinned[directory]:
+            return False
+        entry = _collections.pop(directory, None)
+        if entry is not None:
+            _close(entry)
+        remove()
+        return True
+
+
+def open_collections():
+    """How many collections are open right now."""
+    return len(_collections)
+
+
+def store_is_empty(namespace=None):
+    """True if nothing has been ingested yet (no database, or a database without chunks)."""
+    vectorstore = get_vectorstore(namespace=namespace)
+    if vectorstore is None:
+        return True
+    return len(vectorstore.get(limit=1, include=[])["ids"]) == 0
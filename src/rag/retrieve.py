@@ -1,17 +1,97 @@
-import os
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from typing import Any
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.rag.resources import get_vectorstore, get_bm25_index, get_reranker
+from src.rag.rerank import RERANK_CANDIDATES
+from src.utils import telemetry
 
-DB_DIR = "chroma_db"
+# How many chunks the document agent gets
+TOP_K = 3
+# How many candidates each ranking (vector and keyword) contributes before fusion
+CANDIDATES = 20
+# The usual reciprocal rank fusion constant: higher values flatten the difference between ranks
+RRF_K = 60
 
-def get_retriever():
-    """Initializes and returns the Chroma document retriever."""
-    if not os.path.exists(DB_DIR):
-        print("Creating an empty Chroma DB. Please run ingest.py later.")
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges several ranked lists of IDs into one: every list gives an ID 1 / (k + rank) points.
+    IDs that several rankings agree on float to the top, and raw scores never need to be comparable.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _doc_key(doc):
+    # Chunks ingested with stable IDs carry them in their metadata; older ones fall back to their text
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Vector search (good at meaning) plus BM25 keyword search (good at exact terms like part numbers,
+    identifiers and names), fused with reciprocal rank fusion. Either half can be missing.
+
+    With a reranker, the best rerank_candidates fused chunks are re-scored by a cross-encoder
+    and only the top k of those are returned.
+    """
+
+    vectorstore: Any
+    bm25_index: Any = None
+    reranker: Any = None
+    k: int = TOP_K
+    candidates: int = CANDIDATES
+    rerank_candidates: int = RERANK_CANDIDATES
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        pool_size = self.rerank_candidates if self.reranker is not None else self.k
+        per_ranking = max(self.candidates, pool_size)
+
+        # The dense search includes embedding the question
+        with telemetry.span("retrieve:vector", kind="retrieval"):
+            dense = self.vectorstore.similarity_search(query, k=per_ranking)
+        rankings = [[_doc_key(doc) for doc in dense]]
+        if self.bm25_index is not None:
+            with telemetry.span("retrieve:bm25", kind="retrieval"):
+                rankings.append([cid for cid, _ in self.bm25_index.search(query, k=per_ranking)])
+
+        docs = {_doc_key(doc): doc for doc in dense}
+        fused = reciprocal_rank_fusion(rankings)[:pool_size]
+
+        # Keyword-only hits still need their text, fetched from the vector store in one call
+        missing = [key for key in fused if key not in docs]
+        if missing:
+            found = self.vectorstore.get(ids=missing, include=["documents", "metadatas"])
+            for cid, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+                docs[cid] = Document(page_content=text or "", metadata=metadata or {})
+        keys = [key for key in fused if key in docs]
+
+        if self.reranker is not None:
+            return self.reranker.rerank(query, [docs[key] for key in keys], keys, self.k)
+        return [docs[key] for key in keys[:self.k]]
+
+
+def get_retriever(k=TOP_K, namespace=None):
+    """
+    Returns a retriever over the namespace's vector store (or the shared one) that returns k chunks,
+    or None if nothing has been ingested there.
+    When the BM25 keyword index exists the retriever is hybrid (vector + keyword), and when
+    reranking is turned on (IRA_RERANK=1) a cross-encoder picks the final chunks.
+    """
+    vectorstore = get_vectorstore(namespace=namespace)
+    if vectorstore is None:
+        print("No vector store yet. Please run ingest.py later.")
         return None
-    
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectorstore = Chroma(persist_directory=DB_DIR, embedding_function=embeddings)
-    
-    # Return a retriever that fetches the top 3 most relevant chunks
-    return vectorstore.as_retriever(search_kwargs={"k": 3})
+
+    bm25_index = get_bm25_index(namespace)
+    if bm25_index is not None and not len(bm25_index):
+        bm25_index = None
+    reranker = get_reranker()
+    if bm25_index is not None or reranker is not None:
+        return HybridRetriever(vectorstore=vectorstore, bm25_index=bm25_index, reranker=reranker, k=k)
+
+    # Return a retriever that fetches the top k most relevant chunks
+    return vectorstore.as_retriever(search_kwargs={"k": k})
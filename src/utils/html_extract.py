@@ -0,0 +1,106 @@
+import re
+import lxml.html
+from lxml import etree
+
+# Tags whose content is never useful text for the AI (code, styling, menus, forms...)
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "nav", "aside", "footer", "form", "button", "select", "option", "dialog",
+}
+# Tags that start a new line in the extracted text
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "h1", "h2", "h3", "h4", "h5", "h6",
+    "li", "ul", "ol", "dl", "dt", "dd", "tr", "table", "thead", "tbody", "blockquote", "pre",
+    "figure", "figcaption", "br", "hr", "title", "address", "details", "summary",
+}
+# class / id names that usually mean "not the article" (sidebars, cookie banners, share buttons...)
+BOILERPLATE_PATTERN = re.compile(
+    r"(?:^|[\s_-])(?:nav|navbar|menu|sidebar|footer|cookies?|banner|advert|ads?|promo|share|social|"
+    r"comments?|related|breadcrumbs?|popup|modal|subscribe|newsletter|skip-link)(?:$|[\s_-])"
+)
+# A <main>/<article> with less text than this is probably not the real content
+MIN_MAIN_CHARS = 200
+
+# One parser for everything: lxml's C parser, which also drops comments and processing instructions
+_PARSER = lxml.html.HTMLParser(remove_comments=True, remove_pis=True, no_network=True)
+
+
+def _is_boilerplate(element):
+    names = f"{element.get('class', '')} {element.get('id', '')}".lower()
+    return bool(names.strip()) and BOILERPLATE_PATTERN.search(names) is not None
+
+
+def _main_content(document):
+    """Picks the element holding the page's main content, falling back to <body>."""
+    for xpath in ("//main", "//*[@role='main']", "//article"):
+        candidates = document.xpath(xpath)
+        if not candidates:
+            continue
+        best = max(candidates, key=lambda el: len(el.text_content()))
+        if len(best.text_content().strip()) >= MIN_MAIN_CHARS:
+            return best
+    body = document.find("body")
+    return body if body is not None else document
+
+
+def extract_text(content, limit=8000):
+    """
+    Extracts the readable text of an HTML page (bytes or str), at most `limit` characters.
+
+    Navigation, sidebars, footers, scripts and similar boilerplate are skipped, and the
+    page's <main>/<article> is preferred when it has one. The tree is walked in document
+    order and the walk stops as soon as the character budget is filled.
+    """
+    if not content:
+        return ""
+    try:
+        document = lxml.html.document_fromstring(content, parser=_PARSER)
+    except (etree.ParserError, ValueError):
+        return ""
+
+    root = _main_content(document)
+    # A page-level <header> is site chrome, but inside an article it usually holds the headline
+    skip_tags = SKIP_TAGS if root.tag in ("main", "article") or root.get("role") == "main" else SKIP_TAGS | {"header"}
+
+    lines, used, current = [], 0, []
+    title = document.findtext(".//title")
+    if title and title.strip():
+        lines.append(" ".join(title.split()))
+        used += len(lines[0]) + 1
+
+    # Depth-first walk with an explicit stack (deeply nested pages would overflow recursion).
+    # Strings on the stack are text to emit, "\n" ends the current line.
+    stack = [root]
+    while stack and used < limit:
+        item = stack.pop()
+        if isinstance(item, str):
+            if item == "\n":
+                line = " ".join(" ".join(current).split())
+                current = []
+                if line:
+                    lines.append(line)
+                    used += len(line) + 1
+            else:
+                current.append(item)
+            continue
+
+        # Elements like entities have no string tag; only their tail text matters
+        tag = item.tag if isinstance(item.tag, str) else None
+        if item is not root and item.tail:
+            stack.append(item.tail)
+        if tag is None or tag in skip_tags or (item is not root and _is_boilerplate(item)):
+            continue
+        block = tag in BLOCK_TAGS
+        if block:
+            stack.append("\n")
+        stack.extend(reversed(item))
+        if item.text:
+            stack.append(item.text)
+        if block:
+            stack.append("\n")
+
+    if current:
+        line = " ".join(" ".join(current).split())
+        if line:
+            lines.append(line)
+    return "\n".join(lines)[:limit]
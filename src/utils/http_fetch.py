@@ -0,0 +1,136 @@
+import asyncio
+import atexit
+import threading
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+import httpx
+
+# Limits for the shared connection pool
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE = 20
+# At most this many requests to the same website at once (be polite, avoid getting blocked)
+PER_HOST_LIMIT = 4
+TIMEOUT_SECONDS = 10
+
+# We pretend to be a normal web browser (Chrome) so websites don't block us for being a bot
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    headers: dict = field(default_factory=dict)
+    content: bytes = b""
+    error: str = None
+    # True if the body was cut off at max_bytes
+    truncated: bool = False
+
+    @property
+    def ok(self):
+        return self.error is None and 200 <= self.status < 400
+
+
+class AsyncFetcher:
+    """
+    Fetches web pages concurrently over one shared, keep-alive connection pool.
+
+    The async client lives on its own event loop in a background thread, so the same pool
+    (and its open TCP/TLS connections) is reused by every caller, including plain synchronous
+    code like LangChain tools: fetch() and fetch_many() block until the results are in.
+    """
+
+    def __init__(self, per_host_limit=PER_HOST_LIMIT, max_connections=MAX_CONNECTIONS, timeout=TIMEOUT_SECONDS):
+        self.per_host_limit = per_host_limit
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-fetcher", daemon=True)
+        self._thread.start()
+        self._host_limits = {}
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=MAX_KEEPALIVE)
+
+        async def make_client():
+            return httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True, headers=BROWSER_HEADERS)
+
+        self._client = self._run(make_client())
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _host_limit(self, url):
+        # Only touched from the fetcher's own loop thread, so no lock is needed
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def request(self, method, url, max_bytes=None, **kwargs):
+        """
+        Makes one request; never raises, errors are returned in FetchResult.error.
+        With max_bytes the body is streamed and the download stops once that many bytes have arrived.
+        """
+        try:
+            truncated = False
+            async with self._host_limit(url):
+                if max_bytes is None:
+                    response = await self._client.request(method, url, **kwargs)
+                    content = response.content
+                else:
+                    async with self._client.stream(method, url, **kwargs) as response:
+                        chunks, size = [], 0
+                        async with aclosing(response.aiter_bytes()) as body:
+                            async for chunk in body:
+                                chunks.append(chunk)
+                                size += len(chunk)
+                                if size >= max_bytes:
+                                    # Stop reading; the rest of the page is never downloaded
+                                    truncated = True
+                                    break
+                        content = b"".join(chunks)[:max_bytes]
+            # 304 Not Modified is not an error: it means our cached copy is still good
+            return FetchResult(url=url, status=response.status_code, headers=dict(response.headers), content=content,
+                               error=None if response.status_code < 400 else f"HTTP {response.status_code}", truncated=truncated)
+        except Exception as e:
+            return FetchResult(url=url, error=str(e) or type(e).__name__)
+
+    async def gather(self, urls, headers=None, **kwargs):
+        # headers may be a list with separate headers for every URL (e.g. for conditional requests)
+        per_url = headers if isinstance(headers, list) else [headers] * len(urls)
+        return await asyncio.gather(*(self.request("GET", url, headers=h, **kwargs) for url, h in zip(urls, per_url)))
+
+    def fetch(self, url, method="GET", **kwargs):
+        """Fetches one URL and waits for the result."""
+        return self._run(self.request(method, url, **kwargs))
+
+    def fetch_many(self, urls, headers=None, **kwargs):
+        """
+        Fetches several URLs at the same time and returns the results in the same order.
+        headers is either one dict for all requests or a list with one dict (or None) per URL.
+        """
+        return self._run(self.gather(urls, headers=headers, **kwargs))
+
+    def close(self):
+        if self._loop.is_running():
+            self._run(self._client.aclose())
+            # Finish closing body streams that were abandoned at max_bytes
+            self._run(self._loop.shutdown_asyncgens())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Returns the process-wide fetcher, starting it on first use."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = AsyncFetcher()
+                atexit.register(_fetcher.close)
+    return _fetcher
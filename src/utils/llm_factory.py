@@ -1,22 +1,137 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+
+# How many different (model, temperature, key) clients we keep alive at once
+MAX_CACHED_CLIENTS = 32
+
+# Built clients, most recently used last. The dictionary key never contains an API key, only a fingerprint of it.
+_clients = OrderedDict()
+_lock = threading.Lock()
+# A random secret for this process only, so key fingerprints can't be matched against anything outside it
+_FINGERPRINT_SECRET = os.urandom(32)
+# One HTTP connection pool shared by every OpenAI client, so repeat calls skip the TCP + TLS handshake.
+# Gemini clients are left out on purpose: langchain-google-genai talks gRPC, not httpx, and only takes
+# the name of a transport, not one to share. Each Gemini client keeps its own gRPC channel (one HTTP/2
+# connection, with the API key built in) open for as long as it is cached, and all of its calls reuse it.
+_openai_http_client = None
+# Extra providers registered at runtime (for example the local stand-in model used by the benchmarks):
+# provider -> builder(model, temperature, api_key), and UI name -> (provider, model id)
+_extra_builders = {}
+_extra_models = {}
+
+
+def _key_fingerprint(api_key):
+    """Returns a one-way fingerprint of an API key (the key itself is never stored in the cache key or logged)."""
+    if not api_key:
+        return None
+    return hmac.new(_FINGERPRINT_SECRET, api_key.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+def _shared_openai_http_client():
+    global _openai_http_client
+    if _openai_http_client is None:
+        # Two first calls at the same time must not each build (and leak) a connection pool
+        with _lock:
+            if _openai_http_client is None:
+                import httpx
+                _openai_http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                )
+    return _openai_http_client
+
+
+def _resolve(model_choice):
+    """Maps the name shown in the UI to (provider, model id)."""
+    if model_choice in _extra_models:
+        return _extra_models[model_choice]
+    if model_choice == "GPT-4o Mini":
+        return "openai", "gpt-4o-mini"
+    elif model_choice == "GPT-4o":
+        return "openai", "gpt-4o"
+    return "google", "gemini-2.5-flash"
+
+
+def _build_llm(provider, model, temperature, api_key):
+    if provider in _extra_builders:
+        return _extra_builders[provider](model, temperature, api_key)
+    from src.utils.llm_scheduler import SCHEDULER_ENABLED
+    # The scheduler retries throttled calls itself, and it has to see the 429s to slow down
+    retries = {"max_retries": 0} if SCHEDULER_ENABLED else {}
+    # The provider SDKs take seconds to import, so only the one that is used gets loaded
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, temperature=temperature, api_key=api_key, http_client=_shared_openai_http_client(), **retries)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # No shared pool here: the client opens its own gRPC channel (see _openai_http_client above)
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=api_key, **retries)
+
+
+def _schedule(llm, provider, api_key):
+    """Wraps a client so its calls go through the shared LLM scheduler (rate limits, retries, coalescing)."""
+    from src.utils.llm_scheduler import SCHEDULER_ENABLED, ScheduledChatModel
+    if not SCHEDULER_ENABLED:
+        return llm
+    return ScheduledChatModel(inner=llm, provider=provider, key_id=_key_fingerprint(api_key) or "no-key")
+
 
 def get_llm(model_choice="Gemini 2.5 Flash", temperature=0.0, google_api_key=None, openai_api_key=None):
     """
     Returns the appropriate LLM (Large Language Model) instance based on the user's choice and provided keys.
     Think of this as a 'vending machine' for AI models - you tell it which model you want, and it hands you the right one!
+
+    The vending machine keeps the models it has already handed out: asking again for the same model,
+    temperature and key returns the same object (and its open connections) instead of building a new one.
+    Every model it hands out sends its calls through the LLM scheduler (src/utils/llm_scheduler.py),
+    which keeps all callers together under the provider's rate limits.
     """
-    # Check if the user selected the smaller, faster OpenAI model
-    if model_choice == "GPT-4o Mini":
-        # Return the GPT-4o Mini model, passing in the user's OpenAI API key
-        return ChatOpenAI(model="gpt-4o-mini", temperature=temperature, api_key=openai_api_key)
-    
-    # Check if the user selected the more powerful OpenAI model
-    elif model_choice == "GPT-4o":
-        # Return the standard GPT-4o model
-        return ChatOpenAI(model="gpt-4o", temperature=temperature, api_key=openai_api_key)
-    
-    # If neither OpenAI model was chosen, we default to using Google's Gemini model
-    else:
-        # Return the Gemini 2.5 Flash model, passing in the user's Google API key
-        return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temperature, google_api_key=google_api_key)
+    # Figure out which company's model was picked (OpenAI for the GPT models, Google's Gemini otherwise)
+    provider, model = _resolve(model_choice)
+    api_key = openai_api_key if provider == "openai" else google_api_key
+    cache_key = (provider, model, float(temperature), _key_fingerprint(api_key))
+
+    with _lock:
+        llm = _clients.get(cache_key)
+        if llm is not None:
+            _clients.move_to_end(cache_key)
+            return llm
+
+    # Build outside the lock so a slow constructor doesn't block other threads
+    llm = _schedule(_build_llm(provider, model, temperature, api_key), provider, api_key)
+
+    with _lock:
+        # Another thread may have built the same client meanwhile - keep the first one
+        llm = _clients.setdefault(cache_key, llm)
+        _clients.move_to_end(cache_key)
+        while len(_clients) > MAX_CACHED_CLIENTS:
+            _clients.popitem(last=False)  # forget the least recently used client
+    return llm
+
+
+def preload_providers():
+    """Imports the OpenAI and Gemini SDKs ahead of time (from a background thread), so the first question doesn't wait for them."""
+    import langchain_openai  # noqa: F401
+    import langchain_google_genai  # noqa: F401
+
+
+def register_provider(provider, builder, model_choices):
+    """
+    Teaches get_llm() a new provider: builder(model, temperature, api_key) builds its chat models,
+    and model_choices maps the names callers pass as model_choice to that provider's model ids.
+    """
+    with _lock:
+        _extra_builders[provider] = builder
+        for choice, model in model_choices.items():
+            _extra_models[choice] = (provider, model)
+        # Clients built before under the same names are no longer what get_llm() would build
+        for key in [key for key in _clients if key[0] == provider]:
+            del _clients[key]
+
+
+def clear_llm_cache():
+    """Forgets every cached client (for example after a user changes their API key)."""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,453 @@
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.utils import telemetry
+
+# Set IRA_LLM_SCHEDULER=0 to call the providers directly (their SDKs then retry on their own)
+SCHEDULER_ENABLED = os.getenv("IRA_LLM_SCHEDULER", "1").lower() not in ("0", "false", "no")
+
+# Requests and tokens per minute allowed per provider and API key (the lowest paid tiers); None means
+# no limit. IRA_LLM_RPM_<PROVIDER> / IRA_LLM_TPM_<PROVIDER> override them, e.g. IRA_LLM_RPM_GOOGLE=10
+# for Gemini's free tier. Whatever these say, a 429 from the provider still slows us down (see below).
+PROVIDER_LIMITS = {
+    "google": {"rpm": 1000, "tpm": 1_000_000},
+    "openai": {"rpm": 500, "tpm": 200_000},
+}
+# Calls to one provider with one key at the same time: starts at INITIAL_CONCURRENCY, grows by about one
+# per round of successful calls, and halves on a 429 (AIMD, like TCP congestion control)
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.getenv("IRA_LLM_MAX_CONCURRENCY", "64"))
+BACKOFF_FACTOR = 0.5
+# A time to first token LATENCY_TOLERANCE times the fastest recent one means the provider is queueing
+# us: the limit shrinks a little (SLOW_FACTOR) instead of waiting for 429s. Only streamed calls give this
+# signal; how long a whole answer takes depends mostly on how long the answer is.
+LATENCY_TOLERANCE = 4.0
+SLOW_FACTOR = 0.9
+# Retries of throttled or failed calls, with full-jitter exponential backoff (or the provider's Retry-After)
+MAX_RETRIES = 4
+RETRY_BASE = 0.5
+RETRY_CAP = 20.0
+# Different (provider, key) limiters kept; the least recently used is forgotten beyond this
+MAX_LIMITERS = 256
+
+THROTTLE_NAMES = ("RateLimit", "ResourceExhausted", "TooManyRequests")
+_THROTTLE_TEXT = re.compile(r"\b429\b|RESOURCE_EXHAUSTED")
+TRANSIENT_NAMES = ("Timeout", "APIConnectionError", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded")
+TRANSIENT_STATUS = (500, 502, 503, 504, 529)
+
+
+def provider_limits(provider):
+    """(requests per minute, tokens per minute) for a provider, with the environment overrides applied."""
+    limits = PROVIDER_LIMITS.get(provider, {})
+    rpm = os.getenv(f"IRA_LLM_RPM_{provider.upper()}")
+    tpm = os.getenv(f"IRA_LLM_TPM_{provider.upper()}")
+    return (float(rpm) if rpm else limits.get("rpm")), (float(tpm) if tpm else limits.get("tpm"))
+
+
+def _status(error):
+    for value in (getattr(error, "status_code", None), getattr(getattr(error, "response", None), "status_code", None),
+                  getattr(error, "code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def classify(error):
+    """"throttled" for a 429 / quota error, "transient" for errors worth retrying, None otherwise."""
+    name, status = type(error).__name__, _status(error)
+    if status == 429 or any(part in name for part in THROTTLE_NAMES):
+        return "throttled"
+    # The message is only read when the error has no HTTP status (e.g. a wrapped gRPC error), and only a
+    # standalone 429, so a 500 that mentions "4290 tokens" or a request ID isn't taken for throttling
+    if status is None and _THROTTLE_TEXT.search(str(error)):
+        return "throttled"
+    if status in TRANSIENT_STATUS or any(part in name for part in TRANSIENT_NAMES):
+        return "transient"
+    return None
+
+
+def retry_after(error):
+    """The provider's Retry-After (seconds), if the error carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), RETRY_CAP)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Allows rate units per second on average and bursts of up to capacity. reserve() takes units right
+    away and says how long to wait before using them, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1.0):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single call bigger than the bucket would never fit; it just takes the whole bucket
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+class Limiter:
+    """The limits for one provider and API key: request and token buckets plus the adaptive concurrency limit."""
+
+    def __init__(self, provider, rpm=None, tpm=None):
+        self.provider = provider
+        # Bursts of up to a tenth of a minute's allowance (at least one request)
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 10)) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, max(1.0, tpm / 10)) if tpm else None
+        self.limit = float(min(INITIAL_CONCURRENCY, MAX_CONCURRENCY))
+        self.in_flight = 0
+        # Waiting calls take a ticket and get their slots in ticket order, so none of them starves
+        self.next_ticket = 0
+        self.serving = 0
+        self.fastest = None     # fastest recent time to first token
+        self.average = None     # moving average time to first token
+        self.last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens=0):
+        """Waits for the buckets and a free slot. Returns when the call got its slot (time.monotonic())."""
+        wait = self.requests.reserve() if self.requests else 0.0
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait:
+            time.sleep(wait)
+        with self._cond:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            while ticket != self.serving or self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.serving += 1
+            self.in_flight += 1
+            self._cond.notify_all()
+        return time.monotonic()
+
+    def release(self, admitted, outcome="ok", first_token=None):
+        """
+        Frees the slot and adjusts the limit: halves it on a 429 ("throttled"), shrinks it a little when
+        the first token is slow to come, and grows it by 1/limit (about one per round) on other successes.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "throttled":
+                self._decrease(admitted, BACKOFF_FACTOR)
+            elif outcome == "ok":
+                if first_token is not None and self._slow(first_token):
+                    self._decrease(admitted, SLOW_FACTOR)
+                else:
+                    self.limit = min(MAX_CONCURRENCY, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _slow(self, first_token):
+        fastest = first_token if self.fastest is None else self.fastest
+        # The fastest time drifts up slowly, so it follows a provider that got slower for good
+        self.fastest = min(first_token, fastest + (first_token - fastest) * 0.01)
+        self.average = first_token if self.average is None else self.average * 0.8 + first_token * 0.2
+        return self.average > LATENCY_TOLERANCE * self.fastest
+
+    def _decrease(self, admitted, factor):
+        # Calls let in before the last decrease were let in under the old limit: their 429s are the same
+        # signal again, so one burst of 429s halves the limit once (as TCP does once per round trip)
+        if admitted > self.last_decrease:
+            self.last_decrease = time.monotonic()
+            self.limit = max(MIN_CONCURRENCY, self.limit * factor)
+
+
+class _Flight:
+    """One call that identical concurrent calls wait for instead of making their own."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class LLMScheduler:
+    """
+    Every LLM call of the app goes through here (get_llm() wraps its models in ScheduledChatModel):
+      - token buckets per provider and API key keep us under the requests / tokens per minute limits,
+      - an AIMD concurrency limit per provider and key halves on 429s, shrinks when answers get slow
+        and grows back by about one per round of successful calls,
+      - throttled and transient errors are retried with jittered exponential backoff,
+      - identical calls made at the same time (same model, key, messages and tools) share one request.
+    """
+
+    def __init__(self):
+        self._limiters = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider, key_id):
+        with self._lock:
+            limiter = self._limiters.get((provider, key_id))
+            if limiter is None:
+                limiter = self._limiters[(provider, key_id)] = Limiter(provider, *provider_limits(provider))
+                while len(self._limiters) > MAX_LIMITERS:
+                    self._limiters.popitem(last=False)
+            else:
+                self._limiters.move_to_end((provider, key_id))
+            return limiter
+
+    def stats(self):
+        """{provider/key fingerprint: {"limit", "in_flight"}} for every limiter."""
+        with self._lock:
+            return {f"{provider}/{key_id}": {"limit": round(limiter.limit, 2), "in_flight": limiter.in_flight}
+                    for (provider, key_id), limiter in self._limiters.items()}
+
+    def _admit(self, limiter, tokens):
+        """Waits until the limiter lets the call in; returns when it did (time.monotonic())."""
+        start, queued = time.perf_counter(), time.monotonic()
+        admitted = limiter.acquire(tokens)
+        waited = admitted - queued
+        if waited > 0.001:
+            telemetry.record_span("llm:queue", "llm", start, waited, provider=limiter.provider)
+        telemetry.metrics.observe("ira_llm_queue_seconds", waited, "Time LLM calls waited for the rate limits", provider=limiter.provider)
+        return admitted
+
+    def _backoff(self, limiter, error, kind, attempt):
+        telemetry.record_retry(f"llm:{limiter.provider}")
+        if kind == "throttled":
+            telemetry.metrics.inc("ira_llm_throttled_total", 1, "429 / quota errors from LLM providers", provider=limiter.provider)
+        delay = retry_after(error)
+        time.sleep(delay if delay is not None else random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt)))
+
+    # --- single flight ---
+
+    def _join(self, flight_key):
+        """Returns (flight, True if this caller makes the call)."""
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            if flight is None:
+                flight = self._flights[flight_key] = _Flight()
+                return flight, True
+            return flight, False
+
+    def _land(self, flight_key, flight):
+        with self._lock:
+            self._flights.pop(flight_key, None)
+        flight.done.set()
+
+    def _follow(self, limiter, flight):
+        """Waits for the flight and returns its result (the flight must not be abandoned)."""
+        telemetry.metrics.inc("ira_llm_coalesced_total", 1, "LLM calls answered by an identical call in flight", provider=limiter.provider)
+        if flight.error is not None:
+            raise flight.error
+        # Every caller gets its own copy: LangChain writes run IDs into the messages it returns
+        return copy.deepcopy(flight.result)
+
+    # --- calls ---
+
+    def call(self, provider, key_id, fn, flight_key=None, tokens=0):
+        """Runs fn() under the provider's limits, with retries. Identical calls in flight (same flight_key) share one."""
+        limiter = self.limiter(provider, key_id)
+        if flight_key is None:
+            return self._call(limiter, fn, tokens)
+        flight, leader = self._join(flight_key)
+        if not leader:
+            flight.done.wait()
+            return self._follow(limiter, flight)
+        try:
+            result = self._call(limiter, fn, tokens)
+            flight.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(flight_key, flight)
+
+    def _call(self, limiter, fn, tokens):
+        for attempt in range(MAX_RETRIES + 1):
+            admitted = self._admit(limiter, tokens)
+            try:
+                result = fn()
+            except BaseException as e:
+                kind = classify(e)
+                limiter.release(admitted, kind or "failed")
+                if kind is None or attempt == MAX_RETRIES:
+                    raise
+                self._backoff(limiter, e, kind, attempt)
+                continue
+            limiter.release(admitted)
+            return result
+
+    def stream(self, provider, key_id, fn, flight_key=None, tokens=0):
+        """Like call() for a streaming fn(): yields its chunks. Once a chunk is out, a failure is not retried."""
+        limiter = self.limiter(provider, key_id)
+        if flight_key is None:
+            yield from self._stream(limiter, fn, tokens)
+            return
+        flight, leader = self._join(flight_key)
+        if not leader:
+            # The followers get the whole answer at once, when the first caller's stream ends
+            flight.done.wait()
+            yield from self._stream(limiter, fn, tokens) if flight.abandoned else self._follow(limiter, flight)
+            return
+        chunks = []
+        try:
+            for chunk in self._stream(limiter, fn, tokens):
+                chunks.append(copy.deepcopy(chunk))
+                yield chunk
+            flight.result = chunks
+        except GeneratorExit:
+            # Our caller stopped reading: whoever waits for us makes their own call
+            flight.abandoned = True
+            raise
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(flight_key, flight)
+
+    def _stream(self, limiter, fn, tokens):
+        for attempt in range(MAX_RETRIES + 1):
+            admitted = self._admit(limiter, tokens)
+            start = time.perf_counter()
+            first_chunk = None
+            released = False
+            try:
+                for chunk in fn():
+                    if first_chunk is None:
+                        # Time to the first chunk is what grows when the provider queues us
+                        first_chunk = time.perf_counter() - start
+                    yield chunk
+            except Exception as e:
+                kind = classify(e)
+                limiter.release(admitted, kind or "failed")
+                released = True
+                if kind is None or first_chunk is not None or attempt == MAX_RETRIES:
+                    raise
+                self._backoff(limiter, e, kind, attempt)
+                continue
+            finally:
+                if not released:
+                    limiter.release(admitted, first_token=first_chunk)
+            return
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide LLM scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def _message_key(message):
+    # Everything that decides the answer, but not the message ID (a fresh one every turn)
+    return [message.type, message.content, getattr(message, "name", None),
+            getattr(message, "tool_calls", None), getattr(message, "tool_call_id", None)]
+
+
+def _estimate_tokens(messages):
+    # About 4 characters per token is close enough for the tokens-per-minute bucket
+    return sum(len(message.content if isinstance(message.content, str) else json.dumps(message.content, default=str))
+               for message in messages) // 4 + 1
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    A chat model that sends every call of the model it wraps through the LLM scheduler. get_llm()
+    hands these out, so the supervisor, the workers, the merge step, the memory summary and the
+    researcher's tool loop all share the same limits. Tools bound with bind_tools() and structured
+    output work as with the wrapped model.
+    """
+
+    inner: Any
+    provider: str
+    key_id: str
+    bound: Any = None       # the wrapped model with tools bound, if any
+    tools_key: str = ""     # the bound tools, as part of the single-flight key
+
+    @property
+    def _llm_type(self):
+        return f"scheduled-{self.inner._llm_type}"
+
+    @property
+    def _identifying_params(self):
+        return self.inner._identifying_params
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self.inner._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        tools_key = json.dumps([convert_to_openai_tool(tool) for tool in tools] + [kwargs], sort_keys=True, default=str)
+        return self.model_copy(update={"bound": self.inner.bind_tools(tools, **kwargs), "tools_key": tools_key})
+
+    def with_structured_output(self, schema, **kwargs):
+        structured = self.inner.with_structured_output(schema, **kwargs)
+        schema_name = getattr(schema, "__name__", None) or json.dumps(schema, sort_keys=True, default=str)
+
+        def run(prompt, config=None):
+            messages = self._convert_input(prompt).to_messages()
+            return get_scheduler().call(
+                self.provider, self.key_id, lambda: structured.invoke(prompt, config),
+                tokens=_estimate_tokens(messages),
+                flight_key=self._flight_key("structured", schema_name, kwargs, [_message_key(m) for m in messages]),
+            )
+
+        return RunnableLambda(run)
+
+    def _flight_key(self, *parts):
+        key = json.dumps([self.provider, self.key_id, self._identifying_params, self.tools_key, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _runnable(self):
+        return self.bound if self.bound is not None else self.inner
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        # No callbacks for the inner call: the run is reported once, as this model's
+        config = {"callbacks": []}
+
+        def invoke():
+            return self._runnable().invoke(messages, config, stop=stop, **kwargs)
+
+        message = get_scheduler().call(
+            self.provider, self.key_id, invoke, tokens=_estimate_tokens(messages),
+            flight_key=self._flight_key("generate", [_message_key(m) for m in messages], stop, kwargs),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        config = {"callbacks": []}
+
+        def stream():
+            return self._runnable().stream(messages, config, stop=stop, **kwargs)
+
+        for message in get_scheduler().stream(
+            self.provider, self.key_id, stream, tokens=_estimate_tokens(messages),
+            flight_key=self._flight_key("stream", [_message_key(m) for m in messages], stop, kwargs),
+        ):
+            yield ChatGenerationChunk(message=message)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+def current_rss_mb():
+    """
+    Returns how much memory (resident set size, in MB) this process is using right now.
+    Reads /proc on Linux; elsewhere falls back to psutil, or to the peak usage if psutil isn't installed.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Returns the highest memory usage (in MB) this process has reached so far (0 if unknown)."""
+    try:
+        import resource # not available on Windows
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
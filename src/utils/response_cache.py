@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.utils import telemetry
+
+# Per-node settings: how long an answer stays valid, and how similar (cosine, 0-1) a new
+# question must be to an old one to reuse its answer. None turns the similarity tier off.
+NAMESPACE_SETTINGS = {
+    "supervisor": {"ttl": 24 * 3600, "similarity": 0.90},
+    "document_agent": {"ttl": 24 * 3600, "similarity": 0.95},
+    # Web answers go stale quickly ("what is the news today?"), so only exact repeats, and not for long
+    "researcher_agent": {"ttl": 15 * 60, "similarity": None},
+}
+DEFAULT_SETTINGS = {"ttl": 3600, "similarity": None}
+MAX_ENTRIES = 2000
+
+# Set this to a file path to keep cached answers across restarts (SQLite); otherwise they live in memory
+CACHE_PATH_ENV = "IRA_RESPONSE_CACHE_PATH"
+
+
+def _exact_key(namespace, context, text):
+    raw = json.dumps([namespace, context, text.strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class InMemoryBackend:
+    """Keeps entries in a dictionary ordered from least to most recently used."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def candidates(self, namespace, context, tag):
+        """Returns (key, embedding) of live entries that the similarity tier may match."""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, entry["embedding"]) for key, entry in self._entries.items()
+                if entry["namespace"] == namespace and entry["context"] == context and entry["tag"] == tag
+                and entry["embedding"] is not None and entry["expires_at"] >= now
+            ]
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, e in self._entries.items() if e["namespace"] == namespace]:
+                    del self._entries[key]
+
+
+class SQLiteBackend:
+    """Keeps entries in a SQLite file, so they survive restarts and can be shared by several processes."""
+
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, namespace TEXT, context TEXT, tag TEXT, value TEXT,
+                embedding BLOB, expires_at REAL, last_used REAL)"""
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS responses_lookup ON responses (namespace, context, tag)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT namespace, context, tag, value, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[4] < time.time():
+            self._conn().execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        self.touch(key)
+        return {"namespace": row[0], "context": row[1], "tag": row[2], "value": row[3], "expires_at": row[4]}
+
+    def put(self, key, entry):
+        embedding = entry["embedding"]
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, entry["namespace"], entry["context"], entry["tag"], entry["value"], blob, entry["expires_at"], time.time()),
+        )
+        # Drop expired rows, then the least recently used ones above the size limit
+        conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def touch(self, key):
+        self._conn().execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    def candidates(self, namespace, context, tag):
+        rows = self._conn().execute(
+            "SELECT key, embedding FROM responses WHERE namespace = ? AND context = ? AND tag IS ? AND embedding IS NOT NULL AND expires_at >= ?",
+            (namespace, context, tag, time.time()),
+        ).fetchall()
+        return [(key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows]
+
+    def clear(self, namespace=None):
+        if namespace is None:
+            self._conn().execute("DELETE FROM responses")
+        else:
+            self._conn().execute("DELETE FROM responses WHERE namespace = ?", (namespace,))
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM answers:
+      1. exact tier - the same question (with the same context) was asked before
+      2. similarity tier - a question that means the same thing, found by comparing MiniLM embeddings
+
+    namespace is the node asking ("supervisor", "document_agent", ...). context holds everything
+    else the answer depends on (model, recent conversation), and must match exactly. tag is an
+    extra version marker, e.g. the vector store revision for document answers: entries with an
+    old tag are simply never matched again.
+    """
+
+    def __init__(self, backend=None, embed_fn=None, settings=None):
+        self.backend = backend or InMemoryBackend()
+        self.settings = settings or NAMESPACE_SETTINGS
+        self._embed_fn = embed_fn
+        self.hits = {"exact": 0, "semantic": 0, "miss": 0}
+
+    def _settings(self, namespace):
+        return self.settings.get(namespace, DEFAULT_SETTINGS)
+
+    def _embed(self, text):
+        if self._embed_fn is None:
+            # Reuse the warm MiniLM model from the RAG resource pool instead of loading another one
+            from src.rag.resources import get_embeddings
+            self._embed_fn = get_embeddings().embed_query
+        with telemetry.span("embed:response_cache", kind="embedding"):
+            vector = np.asarray(self._embed_fn(text.strip()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, namespace, text, context="", tag=None):
+        """Returns the cached answer for this question, or None."""
+        key = _exact_key(namespace, context, text)
+        entry = self.backend.get(key)
+        if entry is not None and entry["tag"] == tag:
+            self.hits["exact"] += 1
+            telemetry.cache_event("response", namespace, "exact")
+            return entry["value"]
+
+        threshold = self._settings(namespace)["similarity"]
+        if threshold is not None:
+            candidates = self.backend.candidates(namespace, context, tag)
+            if candidates:
+                query = self._embed(text)
+                matrix = np.stack([vector for _, vector in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= threshold:
+                    entry = self.backend.get(candidates[best][0])
+                    if entry is not None:
+                        self.hits["semantic"] += 1
+                        telemetry.cache_event("response", namespace, "semantic")
+                        return entry["value"]
+
+        self.hits["miss"] += 1
+        telemetry.cache_event("response", namespace, "miss")
+        return None
+
+    def store(self, namespace, text, value, context="", tag=None):
+        settings = self._settings(namespace)
+        embedding = self._embed(text) if settings["similarity"] is not None else None
+        self.backend.put(_exact_key(namespace, context, text), {
+            "namespace": namespace,
+            "context": context,
+            "tag": tag,
+            "value": value,
+            "embedding": embedding,
+            "expires_at": time.time() + settings["ttl"],
+        })
+
+    def invalidate(self, namespace=None):
+        """Forgets every cached answer of one namespace (or all of them)."""
+        self.backend.clear(namespace)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Returns the shared response cache: SQLite if IRA_RESPONSE_CACHE_PATH is set, in-memory otherwise."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.environ.get(CACHE_PATH_ENV)
+                _cache = ResponseCache(SQLiteBackend(path) if path else InMemoryBackend())
+    return _cache
+
+
+def set_response_cache(cache):
+    """Plugs in a different cache (for example one with a custom backend)."""
+    global _cache
+    _cache = cache
@@ -0,0 +1,345 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# A trace keeps at most this many spans (a runaway tool loop must not eat memory)
+MAX_SPANS_PER_TRACE = 500
+
+# Set IRA_TELEMETRY_LOG to a file path (or "-" for stderr) to get one JSON line per finished request
+TELEMETRY_LOG = os.getenv("IRA_TELEMETRY_LOG")
+
+logger = logging.getLogger("ira.telemetry")
+if TELEMETRY_LOG:
+    _handler = logging.StreamHandler() if TELEMETRY_LOG == "-" else logging.FileHandler(TELEMETRY_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Trace:
+    """Everything recorded while answering one request: timed spans and cache lookups."""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, kind, start, duration, attrs):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append({"name": name, "kind": kind, "start_ms": round((start - self.started) * 1e3, 2),
+                                   "duration_ms": round(duration * 1e3, 2), **attrs})
+
+    def add_cache_event(self, cache, result, count=1):
+        with self._lock:
+            key = f"{cache}:{result}"
+            self.cache[key] = self.cache.get(key, 0) + count
+
+    def breakdown(self):
+        """The spans in the order they started, for showing to a person."""
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span["start_ms"])
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0.0) * 1e3, 2),
+            **self.attrs,
+            "spans": self.breakdown(),
+            "cache": dict(self.cache),
+        }
+
+
+class _Metrics:
+    """Counters and latency histograms in Prometheus' data model, kept in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # (metric, labels) -> value
+        self.histograms = {}  # (metric, labels) -> [bucket counts..., +Inf count, sum]
+        self.help = {}
+
+    def inc(self, metric, value=1, help_text="", **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.help.setdefault(metric, help_text)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, metric, seconds, help_text="", **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.help.setdefault(metric, help_text)
+            row = self.histograms.get(key)
+            if row is None:
+                row = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    row[i] += 1
+            row[len(BUCKETS)] += 1
+            row[-1] += seconds
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+metrics = _Metrics()
+_current_trace = contextvars.ContextVar("ira_trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(name, **attrs):
+    """
+    Starts a trace for one request. Spans recorded anywhere below it (also in LangGraph's worker
+    threads, which copy the context) are attached to it. When it ends, its total duration is
+    recorded and, if IRA_TELEMETRY_LOG is set, it is written out as one JSON line.
+    """
+    current = Trace(name, **attrs)
+    token = _current_trace.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_trace.reset(token)
+        current.duration = time.perf_counter() - current.started
+        metrics.observe("ira_request_duration_seconds", current.duration, "End-to-end request latency", request=name)
+        metrics.inc("ira_requests_total", 1, "Requests handled", request=name, status="error" if error else "ok")
+        if error:
+            current.attrs["error"] = error
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(current.to_dict(), default=str))
+
+
+def record_span(name, kind, start, duration, error=None, **attrs):
+    """Records a finished span: into the latency histogram, and into the current trace if there is one."""
+    metrics.observe("ira_span_duration_seconds", duration, "Duration of graph nodes, tools, LLM calls and retrieval steps", span=name, kind=kind)
+    if error:
+        metrics.inc("ira_span_errors_total", 1, "Spans that ended with an error", span=name, kind=kind)
+        attrs["error"] = error
+    current = _current_trace.get()
+    if current is not None:
+        current.add_span(name, kind, start, duration, attrs)
+
+
+@contextmanager
+def span(name, kind="step", **attrs):
+    """Times a block of code. The yielded dict can be filled with extra attributes (counts, sizes...)."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record_span(name, kind, start, time.perf_counter() - start, error, **attrs)
+
+
+def cache_event(cache, namespace, result, count=1):
+    """Counts a cache lookup: result is "hit"/"miss" (or which tier hit, e.g. "exact", "semantic")."""
+    if count <= 0:
+        return
+    metrics.inc("ira_cache_requests_total", count, "Cache lookups by cache, namespace and result", cache=cache, namespace=namespace, result=result)
+    current = _current_trace.get()
+    if current is not None:
+        current.add_cache_event(f"{cache}/{namespace}", result, count)
+
+
+def record_tokens(model, input_tokens=0, output_tokens=0):
+    if input_tokens:
+        metrics.inc("ira_llm_tokens_total", input_tokens, "LLM tokens by model and direction", model=model, direction="input")
+    if output_tokens:
+        metrics.inc("ira_llm_tokens_total", output_tokens, "LLM tokens by model and direction", model=model, direction="output")
+
+
+def record_retry(name):
+    metrics.inc("ira_retries_total", 1, "Retried calls", span=name)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_prometheus():
+    """Returns every metric in the Prometheus text exposition format (what a /metrics endpoint serves)."""
+    with metrics._lock:
+        counters = dict(metrics.counters)
+        histograms = {key: list(row) for key, row in metrics.histograms.items()}
+        help_texts = dict(metrics.help)
+
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {metric} {help_texts.get(metric, '')}")
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{_labels(labels)} {value}")
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {metric} {help_texts.get(metric, '')}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), row in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for bound, count in zip(BUCKETS, row):
+                lines.append(f"{metric}_bucket{_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{metric}_bucket{_labels(labels, [('le', '+Inf')])} {row[len(BUCKETS)]}")
+            lines.append(f"{metric}_sum{_labels(labels)} {row[-1]:.6f}")
+            lines.append(f"{metric}_count{_labels(labels)} {row[len(BUCKETS)]}")
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serves render_prometheus() at http://host:port/metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain / LangGraph callbacks into spans: every graph node (including the steps inside the
+    researcher's own agent graph), every tool call, every LLM call (with its token usage) and every
+    retriever call. Retries are counted. Only a perf_counter() call and a dict entry per event.
+    """
+
+    def __init__(self):
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, name, kind, **attrs):
+        with self._lock:
+            self._open[run_id] = (name, kind, time.perf_counter(), attrs)
+
+    def _end(self, run_id, error=None, **extra):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is not None:
+            name, kind, start, attrs = opened
+            record_span(name, kind, start, time.perf_counter() - start, error, **attrs, **extra)
+
+    # --- graph nodes ---
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and name == node:
+            # Steps inside the researcher's own graph are reported as "researcher_agent/<step>"
+            namespace = metadata.get("langgraph_checkpoint_ns", "")
+            parent = namespace.split(":", 1)[0] if "|" in namespace else None
+            self._start(run_id, f"{parent}/{node}" if parent and parent != node else node, "node")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    # --- tools ---
+    def on_tool_start(self, serialized, input_str, *, run_id, name=None, **kwargs):
+        self._start(run_id, f"tool:{name or (serialized or {}).get('name', 'tool')}", "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    # --- LLM calls ---
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "llm")
+        self._start(run_id, "llm", "llm", model=model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "llm")
+        self._start(run_id, "llm", "llm", model=model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not (input_tokens or output_tokens):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            input_tokens = usage.get("prompt_tokens", 0)
+            output_tokens = usage.get("completion_tokens", 0)
+        with self._lock:
+            opened = self._open.get(run_id)
+        if opened is not None:
+            record_tokens(opened[3].get("model", "llm"), input_tokens, output_tokens)
+        self._end(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    # --- retrieval ---
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retriever", "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        with self._lock:
+            opened = self._open.get(run_id)
+        record_retry(opened[0] if opened else "unknown")
+
+
+_handler_instance = TelemetryCallbackHandler()
+
+
+def callback_handler():
+    """The shared callback handler; add it to a graph run's config callbacks."""
+    return _handler_instance
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from src.utils import telemetry
+
+WEB_CACHE_PATH = os.getenv("IRA_WEB_CACHE_PATH", os.path.join(".cache", "web_cache.sqlite"))
+
+# How long (seconds) each kind of entry is used without asking the network again.
+# After that, pages that came with an ETag / Last-Modified are re-validated (a cheap 304 answer).
+# IRA_WEB_CACHE_TTL_<SOURCE> overrides one of them (e.g. IRA_WEB_CACHE_TTL_SEARCH=600), and
+# IRA_WEB_CACHE_TTL the one used for any other source.
+SOURCE_TTLS = {
+    "page": 6 * 3600,       # raw downloaded HTML
+    "text": 6 * 3600,       # text extracted from a page
+    "search": 3600,         # DuckDuckGo results
+    "leetcode": 3600,       # LeetCode profile data
+}
+SOURCE_TTLS = {source: float(os.getenv(f"IRA_WEB_CACHE_TTL_{source.upper()}", ttl)) for source, ttl in SOURCE_TTLS.items()}
+DEFAULT_TTL = float(os.getenv("IRA_WEB_CACHE_TTL", "3600"))
+# Total size of everything cached (IRA_WEB_CACHE_MAX_MB); the least recently used entries are dropped above it
+MAX_BYTES = int(float(os.getenv("IRA_WEB_CACHE_MAX_MB", "200")) * 1024 * 1024)
+# The running total of cached bytes is recounted from the table every this many writes, to pick up
+# what other processes (the app and the HTTP API share the file) added or deleted meanwhile
+RECOUNT_EVERY = 1000
+
+
+class WebCache:
+    """
+    A small on-disk cache (one SQLite file) for downloaded pages, extracted text and search results.
+    Entries are keyed by (source, key) - for example ("page", url) or ("search", query).
+    """
+
+    def __init__(self, path=WEB_CACHE_PATH, ttls=None, max_bytes=MAX_BYTES):
+        self.path = path
+        # ttls only needs the sources you want to change, the rest keep their defaults
+        self.ttls = {**SOURCE_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Guards the running total of cached bytes, so a write doesn't have to add up the whole table
+        self._size_lock = threading.Lock()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, source TEXT, value BLOB, etag TEXT, last_modified TEXT,
+                stored_at REAL, last_used REAL, size INTEGER)"""
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._total = self._count_bytes()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(source, key):
+        return source + ":" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def ttl(self, source):
+        return self.ttls.get(source, DEFAULT_TTL)
+
+    def get(self, source, key):
+        """
+        Returns {"value", "etag", "last_modified", "fresh"} or None.
+        Stale entries are still returned (fresh=False) so their ETag can be used to re-validate them.
+        """
+        row = self._conn().execute(
+            "SELECT value, etag, last_modified, stored_at FROM entries WHERE key = ?", (self._key(source, key),)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn().execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), self._key(source, key)))
+        return {"value": row[0], "etag": row[1], "last_modified": row[2], "fresh": time.time() - row[3] < self.ttl(source)}
+
+    def get_fresh(self, source, key):
+        """Returns the cached value if it is still within its TTL, otherwise None."""
+        entry = self.get(source, key)
+        fresh = entry is not None and entry["fresh"]
+        telemetry.cache_event("web", source, "hit" if fresh else "miss")
+        return entry["value"] if fresh else None
+
+    def put(self, source, key, value, etag=None, last_modified=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        now = time.time()
+        conn = self._conn()
+        with self._size_lock:
+            # The entry this one replaces (if any) no longer counts towards the total
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (self._key(source, key),)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(source, key), source, value, etag, last_modified, now, now, len(value)),
+            )
+            self._total += len(value) - (old[0] if old else 0)
+            self._writes += 1
+            if self._writes % RECOUNT_EVERY == 0:
+                self._total = self._count_bytes()
+            if self._total > self.max_bytes:
+                self._evict(conn)
+
+    def refresh(self, source, key):
+        """Marks an entry as fresh again (the server answered 304 Not Modified)."""
+        now = time.time()
+        self._conn().execute("UPDATE entries SET stored_at = ?, last_used = ? WHERE key = ?", (now, now, self._key(source, key)))
+
+    def _count_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self, conn):
+        # Called with _size_lock held. Walk from least to most recently used until enough space is freed
+        to_free = self._total - self.max_bytes
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            victims.append((key,))
+            to_free -= size
+            self._total -= size
+            if to_free <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def clear(self, source=None):
+        with self._size_lock:
+            if source is None:
+                self._conn().execute("DELETE FROM entries")
+            else:
+                self._conn().execute("DELETE FROM entries WHERE source = ?", (source,))
+            self._total = self._count_bytes()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_web_cache():
+    """Returns the shared on-disk web cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = WebCache()
+    return _cache